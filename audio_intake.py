@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+
+import filetype
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+import gemini_client
+
+logger = logging.getLogger(__name__)
+
+AUDIO_MAX_UPLOAD_BYTES = int(os.getenv("AUDIO_MAX_UPLOAD_BYTES", 25 * 1024 * 1024))
+# Uploads up to this size are kept in memory and sent inline; larger ones are
+# spooled to disk and handed to Gemini through the Files API.
+AUDIO_INLINE_MAX_BYTES = int(os.getenv("AUDIO_INLINE_MAX_BYTES", 8 * 1024 * 1024))
+READ_CHUNK_SIZE = 64 * 1024
+# filetype only looks at the first 261 bytes.
+SNIFF_BYTES = 261
+
+ALLOWED_AUDIO_TYPES = ["audio/wav", "audio/mp3", "audio/aiff", "audio/aac", "audio/ogg", "audio/flac", "audio/x-wav", "audio/mpeg"]
+AUDIO_UPLOAD_PATHS = {"/stt/", "/summarize_order_from_audio/", "/summarize_order_from_audio_new/"}
+
+
+class AudioUpload:
+    """A validated upload: small ones as one bytes object, large ones in a temp file.
+
+    The same object is given to Gemini and to the Telegram notifier, so the
+    audio is never copied again after intake.
+    """
+
+    def __init__(self, filename: str, mime_type: str, size: int, sha256: str,
+                 data: Optional[bytes] = None, file=None):
+        self.filename = filename
+        self.mime_type = mime_type
+        self.size = size
+        self.sha256 = sha256
+        self.data = data
+        self.file = file
+        self._gemini_file = None
+
+    def hand_off(self):
+        """Give the audio to the notifier, which now owns (and closes) the spooled file."""
+        payload = self.data if self.data is not None else self.file
+        self.file = None
+        return payload
+
+    async def gemini_part(self):
+        from google.genai import types
+
+        if self.data is not None:
+            return types.Part.from_bytes(data=self.data, mime_type=self.mime_type)
+        if self._gemini_file is None:
+            self.file.seek(0)
+            self._gemini_file = await gemini_client.get_client().aio.files.upload(
+                file=self.file, config={"mime_type": self.mime_type}
+            )
+            logger.info(f"Uploaded {self.size} byte audio to Gemini as {self._gemini_file.name}")
+        return types.Part.from_uri(file_uri=self._gemini_file.uri, mime_type=self.mime_type)
+
+    async def release(self):
+        """Delete the Gemini copy of a large upload; the local file stays for the notifier."""
+        if self._gemini_file is None:
+            return
+        name, self._gemini_file = self._gemini_file.name, None
+        try:
+            await gemini_client.get_client().aio.files.delete(name=name)
+        except Exception as e:
+            logger.info(f"Could not delete Gemini file {name}: {str(e)}")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def too_large_error() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Audio file is larger than {AUDIO_MAX_UPLOAD_BYTES} bytes")
+
+
+async def read_upload(upload: UploadFile, max_bytes: int = AUDIO_MAX_UPLOAD_BYTES,
+                      inline_max_bytes: int = AUDIO_INLINE_MAX_BYTES) -> AudioUpload:
+    """Read an upload in chunks, checking type, size and hash as it goes.
+
+    Raises 400 for an unknown type as soon as the first chunk is in and 413 as
+    soon as the size limit is passed.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    spool = None
+    size = 0
+    mime_type = None
+
+    try:
+        while True:
+            chunk = await upload.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large_error()
+
+            if mime_type is None:
+                kind = filetype.guess(chunk[:SNIFF_BYTES])
+                if kind is None or kind.mime not in ALLOWED_AUDIO_TYPES:
+                    raise HTTPException(status_code=400, detail=f"Invalid file type. Only following audio files are accepted {ALLOWED_AUDIO_TYPES}.")
+                mime_type = kind.mime
+
+            digest.update(chunk)
+            if spool is None and size > inline_max_bytes:
+                spool = tempfile.TemporaryFile()
+                for pending in chunks:
+                    spool.write(pending)
+                chunks = []
+            if spool is not None:
+                spool.write(chunk)
+            else:
+                chunks.append(chunk)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+        raise
+
+    if mime_type is None:
+        raise HTTPException(status_code=400, detail="Please upload a file!")
+
+    if spool is not None:
+        spool.seek(0)
+        return AudioUpload(upload.filename, mime_type, size, digest.hexdigest(), file=spool)
+    return AudioUpload(upload.filename, mime_type, size, digest.hexdigest(), data=b"".join(chunks))
+
+
+class UploadLimitMiddleware:
+    """Rejects oversized audio uploads before the multipart body is parsed.
+
+    A declared Content-Length over the limit is refused without reading the
+    body; uploads without one are cut off once they pass it.
+    """
+
+    def __init__(self, app, max_bytes: int = AUDIO_MAX_UPLOAD_BYTES, paths=AUDIO_UPLOAD_PATHS):
+        self.app = app
+        # Multipart framing adds a little on top of the file itself.
+        self.max_bytes = max_bytes + 64 * 1024
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        rejected = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    rejected = True
+                    # Stops FastAPI parsing the form; its error response is replaced by ours below.
+                    raise too_large_error()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if rejected and not started:
+                return
+            started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+        if rejected and not started:
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        # The same body the audio endpoints return for their own HTTPExceptions.
+        response = JSONResponse(status_code=413, content={"success": {}, "error": {"description": too_large_error().detail}})
+        await response(scope, receive, send)
@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import httpx
+from sqlalchemy import and_, or_, select, update
+from starlette.concurrency import run_in_threadpool
+
+import audio_intake
+import catalog_cache
+import order_extraction
+import prompt_builder
+import result_cache
+import telegram_notifier
+from database import SessionLocal
+from models import AudioJob
+
+logger = logging.getLogger(__name__)
+
+# Concurrent jobs processed inside each API process; set to 0 when running dedicated workers.
+AUDIO_JOB_WORKERS = int(os.getenv("AUDIO_JOB_WORKERS", 2))
+AUDIO_JOB_POLL_SECONDS = float(os.getenv("AUDIO_JOB_POLL_SECONDS", 1.0))
+AUDIO_JOB_MAX_ATTEMPTS = int(os.getenv("AUDIO_JOB_MAX_ATTEMPTS", 3))
+# A failed job waits this long before its next attempt, doubling each time up to the maximum.
+AUDIO_JOB_RETRY_BASE_SECONDS = float(os.getenv("AUDIO_JOB_RETRY_BASE_SECONDS", 30))
+AUDIO_JOB_RETRY_MAX_SECONDS = float(os.getenv("AUDIO_JOB_RETRY_MAX_SECONDS", 600))
+# A running job whose worker has not finished it within this time is claimed again.
+AUDIO_JOB_LEASE_SECONDS = int(os.getenv("AUDIO_JOB_LEASE_SECONDS", 600))
+AUDIO_JOB_WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("AUDIO_JOB_WEBHOOK_TIMEOUT_SECONDS", 10))
+AUDIO_JOB_WEBHOOK_RETRIES = int(os.getenv("AUDIO_JOB_WEBHOOK_RETRIES", 3))
+AUDIO_JOB_WEBHOOK_SECRET = os.getenv("AUDIO_JOB_WEBHOOK_SECRET", None)
+# Comma-separated hosts webhooks may target. When set, other hosts are refused; listed hosts may be internal.
+AUDIO_JOB_WEBHOOK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv("AUDIO_JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()
+}
+WEBHOOK_SIGNATURE_HEADER = "X-Webhook-Signature"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def enqueue(db, upload: audio_intake.AudioUpload, organization_id: Optional[int], user_id: int,
+            cache_keys: list, webhook_url: Optional[str] = None) -> AudioJob:
+    if upload.data is not None:
+        audio = upload.data
+    else:
+        upload.file.seek(0)
+        audio = upload.file.read()
+
+    job = AudioJob(
+        id=str(uuid.uuid4()),
+        organization_id=organization_id,
+        user_id=user_id,
+        status=QUEUED,
+        filename=upload.filename,
+        mime_type=upload.mime_type,
+        audio=audio,
+        cache_keys=json.dumps(cache_keys),
+        webhook_url=webhook_url,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db, job_id: str) -> Optional[AudioJob]:
+    return db.query(AudioJob).filter(AudioJob.id == job_id).first()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(AUDIO_JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), AUDIO_JOB_RETRY_MAX_SECONDS))
+
+
+def claim_job(worker_id: str) -> Optional[str]:
+    """Mark the oldest queued (or abandoned) job as running for ``worker_id`` and return its id.
+
+    Queued jobs waiting out a retry delay are skipped until their ``available_at``.
+
+    On PostgreSQL the candidate row is locked with SKIP LOCKED so concurrent
+    workers never wait on each other; SQLite serializes the update itself.
+    """
+    table = AudioJob.__table__
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        candidate = select(table.c.id).where(or_(
+            and_(table.c.status == QUEUED, or_(table.c.available_at.is_(None), table.c.available_at <= now)),
+            and_(table.c.status == RUNNING, table.c.started_at < now - timedelta(seconds=AUDIO_JOB_LEASE_SECONDS)),
+        )).order_by(table.c.created_at).limit(1)
+        if db.bind.dialect.name == "postgresql":
+            candidate = candidate.with_for_update(skip_locked=True)
+
+        job_id = db.execute(
+            update(table)
+            .where(table.c.id == candidate.scalar_subquery())
+            .values(status=RUNNING, locked_by=worker_id, started_at=now, attempts=table.c.attempts + 1)
+            .returning(table.c.id)
+        ).scalar()
+        db.commit()
+        return job_id
+    finally:
+        db.close()
+
+
+def _finish(job_id: str, worker_id: str, **values):
+    table = AudioJob.__table__
+    db = SessionLocal()
+    try:
+        # Only the worker holding the job may finish it; a reclaimed job belongs to someone else.
+        db.execute(update(table).where(table.c.id == job_id, table.c.locked_by == worker_id).values(**values))
+        db.commit()
+    finally:
+        db.close()
+
+
+class UnsafeWebhookUrl(ValueError):
+    pass
+
+
+def _is_public(address) -> bool:
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def resolve_webhook_url(url: str) -> Tuple[httpx.URL, str]:
+    """Resolve ``url`` and return it pinned to a vetted IP address, plus the original host.
+
+    Refuses loopback, private, link-local and reserved addresses unless the host is
+    in AUDIO_JOB_WEBHOOK_ALLOWED_HOSTS. Callers connect to the returned address, so a
+    DNS answer that changes after the check cannot redirect the request.
+    """
+    try:
+        parsed = httpx.URL(url)
+    except httpx.InvalidURL as e:
+        raise UnsafeWebhookUrl(f"Invalid webhook_url: {str(e)}")
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        raise UnsafeWebhookUrl("webhook_url must be an http or https URL")
+
+    host = parsed.host.lower()
+    if AUDIO_JOB_WEBHOOK_ALLOWED_HOSTS and host not in AUDIO_JOB_WEBHOOK_ALLOWED_HOSTS:
+        raise UnsafeWebhookUrl(f"webhook_url host {host} is not allowed")
+
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        addresses = [
+            ipaddress.ip_address(info[4][0].split("%")[0])
+            for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        ]
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeWebhookUrl(f"webhook_url host {host} cannot be resolved")
+
+    if host not in AUDIO_JOB_WEBHOOK_ALLOWED_HOSTS:
+        blocked = [address for address in addresses if not _is_public(address)]
+        if blocked:
+            raise UnsafeWebhookUrl(f"webhook_url host {host} resolves to a non-public address")
+    return parsed.copy_with(host=str(addresses[0])), host
+
+
+def _sign(body: bytes) -> Optional[str]:
+    if not AUDIO_JOB_WEBHOOK_SECRET:
+        return None
+    return hmac.new(AUDIO_JOB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+async def send_webhook(client: httpx.AsyncClient, url: str, payload: dict) -> bool:
+    # Checked again at send time: the host may resolve differently than when the job was queued.
+    try:
+        pinned_url, host = await run_in_threadpool(resolve_webhook_url, url)
+    except UnsafeWebhookUrl as e:
+        logger.warning(f"Webhook for job {payload['job_id']} not sent: {str(e)}")
+        return False
+
+    body = json.dumps(payload).encode()
+    original = httpx.URL(url)
+    headers = {"Content-Type": "application/json", "Host": original.netloc.decode("ascii")}
+    signature = _sign(body)
+    if signature:
+        headers[WEBHOOK_SIGNATURE_HEADER] = signature
+    # TLS still verifies the certificate against the original host name.
+    extensions = {"sni_hostname": host} if pinned_url.scheme == "https" else {}
+
+    for attempt in range(AUDIO_JOB_WEBHOOK_RETRIES + 1):
+        try:
+            response = await client.post(pinned_url, content=body, headers=headers, extensions=extensions,
+                                         follow_redirects=False)
+            if response.status_code < 400:
+                return True
+            error = f"status {response.status_code}"
+            if response.status_code < 500 and response.status_code != 429:
+                break
+        except httpx.HTTPError as e:
+            error = str(e)
+        if attempt < AUDIO_JOB_WEBHOOK_RETRIES:
+            await asyncio.sleep(2 ** attempt)
+    logger.warning(f"Webhook to {url} for job {payload['job_id']} failed: {error}")
+    return False
+
+
+class AudioJobWorker:
+    """Pool of ``concurrency`` loops that claim and process audio jobs."""
+
+    def __init__(self, concurrency: int = AUDIO_JOB_WORKERS, poll_interval: float = AUDIO_JOB_POLL_SECONDS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.transport = transport
+        self._client = None
+        self._tasks = []
+
+    async def start(self):
+        if self._tasks or self.concurrency <= 0:
+            return
+        self._client = httpx.AsyncClient(timeout=AUDIO_JOB_WEBHOOK_TIMEOUT_SECONDS, transport=self.transport)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        logger.info(f"Started {self.concurrency} audio job worker(s) as {self.worker_id}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self):
+        while True:
+            try:
+                job_id = await run_in_threadpool(claim_job, self.worker_id)
+            except Exception as e:
+                logger.error(f"Error claiming audio job: {str(e)}")
+                job_id = None
+            if job_id is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.process(job_id)
+            except Exception as e:
+                logger.error(f"Error processing audio job {job_id}: {str(e)}")
+
+    async def process(self, job_id: str):
+        db = SessionLocal()
+        try:
+            job = get_job(db, job_id)
+            if job is None:
+                return
+            if job.attempts > AUDIO_JOB_MAX_ATTEMPTS:
+                await self._complete(job, FAILED, error=job.error or "Gave up after repeated worker failures")
+                return
+
+            try:
+                orders_data = await self._extract(db, job)
+            except Exception as e:
+                logger.error(f"Audio job {job.id} failed on attempt {job.attempts}: {str(e)}")
+                if job.attempts < AUDIO_JOB_MAX_ATTEMPTS:
+                    await run_in_threadpool(_finish, job.id, self.worker_id, status=QUEUED, error=str(e),
+                                            available_at=datetime.utcnow() + retry_delay(job.attempts))
+                else:
+                    await self._complete(job, FAILED, error=str(e))
+                return
+
+            await self._complete(job, DONE, orders=orders_data)
+        finally:
+            db.close()
+
+    async def _extract(self, db, job: AudioJob) -> list:
+        upload = audio_intake.AudioUpload(job.filename, job.mime_type, len(job.audio),
+                                          hashlib.sha256(job.audio).hexdigest(), data=job.audio)
+        try:
+            catalog = await run_in_threadpool(catalog_cache.get_catalog, db, job.organization_id)
+            prefix = await prompt_builder.get_prefix(db, catalog, "audio")
+            orders_data = await order_extraction.extract_audio_orders(prefix, upload)
+        finally:
+            await upload.release()
+
+        await run_in_threadpool(result_cache.store, json.loads(job.cache_keys or "[]"), orders_data)
+        filename = f"{datetime.utcnow().isoformat()}_{job.filename}"
+        telegram_notifier.get_notifier().notify_order(
+            upload.hand_off(), filename, order_extraction.with_product_names(orders_data, catalog)
+        )
+        return orders_data
+
+    async def _complete(self, job: AudioJob, status: str, orders: Optional[list] = None, error: Optional[str] = None):
+        await run_in_threadpool(
+            _finish, job.id, self.worker_id, status=status, audio=None, finished_at=datetime.utcnow(),
+            result=json.dumps(orders) if orders is not None else None, error=error
+        )
+        if job.webhook_url:
+            await send_webhook(self._client, job.webhook_url, {
+                "job_id": job.id, "status": status, "orders": orders, "error": error,
+            })
+
+
+_worker = None
+
+
+def get_worker() -> AudioJobWorker:
+    global _worker
+    if _worker is None:
+        _worker = AudioJobWorker()
+    return _worker
+
+
+async def run_worker(concurrency: int):
+    """Run a dedicated worker pool until interrupted."""
+    notifier = telegram_notifier.get_notifier()
+    worker = AudioJobWorker(concurrency=concurrency)
+    await notifier.start()
+    await worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        await notifier.stop()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Process queued audio extraction jobs")
+    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
+    worker_parser = subparsers.add_parser("worker", help="Run a worker pool")
+    worker_parser.add_argument("--concurrency", type=int, default=max(AUDIO_JOB_WORKERS, 1))
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        try:
+            asyncio.run(run_worker(args.concurrency))
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
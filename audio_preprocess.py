@@ -0,0 +1,222 @@
+import io
+import logging
+import math
+import os
+import sys
+import wave
+from array import array
+
+import audio_intake
+
+# NumPy is optional and slow to import, so it is loaded on first use.
+np = None
+_numpy_checked = False
+
+try:
+    import aifc
+except ImportError:
+    # Removed from the standard library in Python 3.13; AIFF uploads then pass through untouched.
+    aifc = None
+
+logger = logging.getLogger(__name__)
+
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "false").lower() == "true"
+AUDIO_TARGET_SAMPLE_RATE = int(os.getenv("AUDIO_TARGET_SAMPLE_RATE", 16000))
+# Frames quieter than this fraction of full scale count as silence (0.01 is about -40 dBFS).
+AUDIO_SILENCE_THRESHOLD = float(os.getenv("AUDIO_SILENCE_THRESHOLD", 0.01))
+AUDIO_SILENCE_PAD_SECONDS = float(os.getenv("AUDIO_SILENCE_PAD_SECONDS", 0.2))
+FRAME_SECONDS = 0.02
+
+WAV_TYPES = {"audio/wav", "audio/x-wav"}
+AIFF_TYPES = {"audio/aiff"}
+
+
+class UnsupportedAudio(Exception):
+    pass
+
+
+def _load_numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+def _read_pcm(data: bytes, mime_type: str):
+    """Return (raw frames, channels, sample width, rate, big endian) for WAV or AIFF."""
+    if mime_type in WAV_TYPES:
+        module, big_endian = wave, False
+    elif mime_type in AIFF_TYPES and aifc is not None:
+        module, big_endian = aifc, True
+    else:
+        raise UnsupportedAudio(f"Cannot decode {mime_type}")
+
+    try:
+        with module.open(io.BytesIO(data), "rb") as reader:
+            params = reader.getparams()
+            frames = reader.readframes(params.nframes)
+    except (wave.Error, EOFError) as e:
+        raise UnsupportedAudio(str(e))
+    except Exception as e:
+        if aifc is not None and isinstance(e, aifc.Error):
+            raise UnsupportedAudio(str(e))
+        raise
+    if params.sampwidth not in (1, 2, 3, 4):
+        raise UnsupportedAudio(f"Unsupported sample width {params.sampwidth}")
+    return frames, params.nchannels, params.sampwidth, params.framerate, big_endian
+
+
+def _to_mono_numpy(frames: bytes, channels: int, width: int, big_endian: bool):
+    order = ">" if big_endian else "<"
+    if width == 1:
+        # 8-bit WAV is unsigned, 8-bit AIFF is signed.
+        samples = np.frombuffer(frames, dtype=np.int8 if big_endian else np.uint8).astype(np.float32)
+        samples = samples / 128.0 if big_endian else samples / 128.0 - 1.0
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        if big_endian:
+            raw = raw[:, ::-1]
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        samples = values.astype(np.float32) / float(1 << 23)
+    else:
+        dtype = np.dtype(f"{order}i{width}")
+        samples = np.frombuffer(frames, dtype=dtype).astype(np.float32) / float(1 << (8 * width - 1))
+    return samples.reshape(-1, channels).mean(axis=1)
+
+
+def _to_mono_pure(frames: bytes, channels: int, width: int, big_endian: bool) -> list:
+    if width == 1:
+        values = array("b", frames) if big_endian else [value - 128 for value in frames]
+    elif width == 3:
+        byteorder = "big" if big_endian else "little"
+        values = [int.from_bytes(frames[i:i + 3], byteorder, signed=True) for i in range(0, len(frames), 3)]
+    else:
+        values = array("h" if width == 2 else "i", frames)
+        if big_endian != (sys.byteorder == "big"):
+            values.byteswap()
+    scale = float(1 << (8 * width - 1))
+    if channels == 1:
+        return [value / scale for value in values]
+    return [sum(values[i:i + channels]) / (channels * scale) for i in range(0, len(values), channels)]
+
+
+def _resample_numpy(samples, rate: int, target: int):
+    if rate == target or len(samples) == 0:
+        return samples
+    if rate > target:
+        # Average over the decimation window first so high frequencies do not alias.
+        window = int(rate // target)
+        if window > 1:
+            samples = np.convolve(samples, np.ones(window, dtype=np.float32) / window, mode="same")
+    length = int(len(samples) * target / rate)
+    positions = np.arange(length, dtype=np.float64) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def _resample_pure(samples: list, rate: int, target: int) -> list:
+    if rate == target or not samples:
+        return samples
+    step = rate / target
+    last = len(samples) - 1
+    resampled = []
+    for i in range(int(len(samples) / step)):
+        position = i * step
+        index = int(position)
+        fraction = position - index
+        following = samples[index + 1] if index < last else samples[index]
+        resampled.append(samples[index] + (following - samples[index]) * fraction)
+    return resampled
+
+
+def _voiced_bounds(levels, frame: int, count: int, rate: int):
+    """Sample range from the first to the last frame above the threshold, with padding."""
+    voiced = [i for i, level in enumerate(levels) if level >= AUDIO_SILENCE_THRESHOLD]
+    if not voiced:
+        return 0, count
+    pad = int(AUDIO_SILENCE_PAD_SECONDS * rate)
+    return max(0, voiced[0] * frame - pad), min(count, (voiced[-1] + 1) * frame + pad)
+
+
+def _trim_numpy(samples, rate: int):
+    frame = max(1, int(rate * FRAME_SECONDS))
+    usable = len(samples) // frame * frame
+    if usable == 0:
+        return samples
+    levels = np.sqrt(np.mean(samples[:usable].reshape(-1, frame) ** 2, axis=1))
+    start, end = _voiced_bounds(levels.tolist(), frame, len(samples), rate)
+    return samples[start:end]
+
+
+def _trim_pure(samples: list, rate: int) -> list:
+    frame = max(1, int(rate * FRAME_SECONDS))
+    levels = [
+        math.sqrt(sum(value * value for value in samples[i:i + frame]) / frame)
+        for i in range(0, len(samples) - frame + 1, frame)
+    ]
+    if not levels:
+        return samples
+    start, end = _voiced_bounds(levels, frame, len(samples), rate)
+    return samples[start:end]
+
+
+def _encode_wav(pcm: bytes, rate: int) -> bytes:
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(pcm)
+    return output.getvalue()
+
+
+def preprocess_audio(data: bytes, mime_type: str, target_rate: int = AUDIO_TARGET_SAMPLE_RATE) -> bytes:
+    """Downmix to mono, resample to ``target_rate``, trim silence and encode as 16-bit WAV."""
+    frames, channels, width, rate, big_endian = _read_pcm(data, mime_type)
+    # Never upsample: it only makes the file bigger.
+    target_rate = min(target_rate, rate)
+
+    if _load_numpy() is not None:
+        samples = _to_mono_numpy(frames, channels, width, big_endian)
+        samples = _trim_numpy(_resample_numpy(samples, rate, target_rate), target_rate)
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    else:
+        samples = _to_mono_pure(frames, channels, width, big_endian)
+        samples = _trim_pure(_resample_pure(samples, rate, target_rate), target_rate)
+        pcm = array("h", (int(max(-1.0, min(1.0, value)) * 32767) for value in samples))
+        if sys.byteorder == "big":
+            pcm.byteswap()
+        pcm = pcm.tobytes()
+    return _encode_wav(pcm, target_rate)
+
+
+def maybe_preprocess(upload: audio_intake.AudioUpload) -> audio_intake.AudioUpload:
+    """Return a smaller in-memory WAV for ``upload`` when enabled and possible, else ``upload`` itself.
+
+    The original sha256 is kept so result cache keys still match the bytes the client sent.
+    """
+    if not AUDIO_PREPROCESS or upload.mime_type not in WAV_TYPES | AIFF_TYPES:
+        return upload
+
+    if upload.data is not None:
+        data = upload.data
+    else:
+        upload.file.seek(0)
+        data = upload.file.read()
+
+    try:
+        processed = preprocess_audio(data, upload.mime_type)
+    except UnsupportedAudio as e:
+        logger.info(f"Sending {upload.filename} unprocessed: {str(e)}")
+        return upload
+
+    if len(processed) >= upload.size:
+        return upload
+    logger.info(f"Preprocessed {upload.filename}: {upload.size} -> {len(processed)} bytes")
+    upload.close()
+    return audio_intake.AudioUpload(upload.filename, "audio/wav", len(processed), upload.sha256, data=processed)
@@ -1,3 +1,4 @@
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from datetime import datetime
 from auth_models import User, RefreshToken, get_password_hash
@@ -5,6 +6,10 @@ from auth_schemas import UserCreate, RefreshTokenCreate
 from models import Organization, Product
 from schemas import OrganizationCreate, ProductCreate
 from fastapi import HTTPException
+import user_cache
+import catalog_cache
+import money
+from pagination import keyset_columns, paginate
 
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
@@ -12,10 +17,13 @@ def get_user(db: Session, user_id: int):
 def get_user_by_username(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
+def get_user_summary(db: Session, username: str):
+    return db.query(User.id, User.username, User.email, User.organization_id, User.is_admin).filter(User.username == username).first()
+
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate):
+def create_user(db: Session, user: UserCreate, hashed_password: str = None):
     first_user = db.query(User).first() is None
     
     is_admin = True if first_user else user.is_admin
@@ -25,7 +33,8 @@ def create_user(db: Session, user: UserCreate):
     if get_user_by_email(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
         
-    hashed_password = get_password_hash(user.password)
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -36,10 +45,24 @@ def create_user(db: Session, user: UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(db_user.id)
+    return db_user
+
+def update_user(db: Session, user_id: int, **fields):
+    """Write ``fields`` to the user row and drop the cached summary. All user updates go through here."""
+    db_user = get_user(db, user_id)
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    for name, value in fields.items():
+        setattr(db_user, name, value)
+    db.commit()
+    db.refresh(db_user)
+    user_cache.invalidate(user_id)
     return db_user
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(User), keyset_columns(User), skip, limit, cursor).all()
 
 def create_refresh_token_db(db: Session, refresh_token: RefreshTokenCreate):
     db_refresh_token = RefreshToken(
@@ -59,25 +82,31 @@ def get_refresh_token_by_token(db: Session, token: str):
 def get_user_refresh_tokens(db: Session, user_id: int):
     return db.query(RefreshToken).filter(RefreshToken.user_id == user_id).all()
 
+def get_user_sessions(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(RefreshToken).filter(RefreshToken.user_id == user_id)
+    return paginate(query, keyset_columns(RefreshToken), skip, limit, cursor).all()
+
 def revoke_refresh_token_db(db: Session, token: str):
-    db_token = get_refresh_token_by_token(db, token)
-    if db_token:
-        db_token.revoked = True
-        db.commit()
-        return True
-    return False
+    revoked = db.query(RefreshToken).filter(RefreshToken.token == token).update({RefreshToken.revoked: True}, synchronize_session=False)
+    db.commit()
+    return revoked > 0
 
 def revoke_all_user_refresh_tokens(db: Session, user_id: int):
-    tokens = get_user_refresh_tokens(db, user_id)
-    for token in tokens:
-        token.revoked = True
+    db.query(RefreshToken).filter(RefreshToken.user_id == user_id, RefreshToken.revoked == False).update({RefreshToken.revoked: True}, synchronize_session=False)
     db.commit()
     return True
 
-def clean_expired_tokens(db: Session):
+def clean_expired_tokens(db: Session, batch_size: int = 1000):
+    """Delete expired and revoked tokens in batches so the table is never locked for long."""
     now = datetime.utcnow()
-    db.query(RefreshToken).filter(RefreshToken.expires_at < now).delete()
-    db.commit()
+    deleted = 0
+    while True:
+        batch = db.query(RefreshToken.id).filter(or_(RefreshToken.expires_at < now, RefreshToken.revoked == True)).limit(batch_size)
+        count = db.query(RefreshToken).filter(RefreshToken.id.in_(batch.scalar_subquery())).delete(synchronize_session=False)
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
 
 
 def get_organization(db: Session, organization_id: int):
@@ -102,16 +131,27 @@ def create_organization(db: Session, organization: OrganizationCreate):
     return db_organization
 
 
-def get_organizations(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Organization).offset(skip).limit(limit).all()
+def get_organizations(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Organization), keyset_columns(Organization), skip, limit, cursor).all()
 
 
 def get_product(db: Session, product_id: int):
     return db.query(Product).filter(Product.id == product_id).first()
 
 
-def get_products_by_organization(db: Session, organization_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Product).filter(Product.organization_id == organization_id).offset(skip).limit(limit).all()
+def get_products_by_ids(db: Session, product_ids):
+    if not product_ids:
+        return []
+    return db.query(Product).filter(Product.id.in_(product_ids)).all()
+
+
+def get_products_by_organization(db: Session, organization_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(Product).filter(Product.organization_id == organization_id)
+    return paginate(query, keyset_columns(Product), skip, limit, cursor).all()
+
+
+def get_catalog_rows(db: Session, organization_id: int):
+    return db.query(Product.id, Product.label_for_ai, Product.name).filter(Product.organization_id == organization_id).order_by(Product.id).all()
 
 
 def create_product(db: Session, product: ProductCreate):
@@ -130,7 +170,7 @@ def create_product(db: Session, product: ProductCreate):
     db_product = Product(
         name=product.name,
         organization_id=product.organization_id,
-        price=product.price,
+        price=money.to_decimal(product.price),
         label_for_ai=product.label_for_ai,
         size=product.size,
         category_id=product.category_id
@@ -138,6 +178,7 @@ def create_product(db: Session, product: ProductCreate):
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    catalog_cache.invalidate(db_product.organization_id)
     return db_product
 
 
@@ -158,15 +199,18 @@ def update_product(db: Session, product_id: int, product_data: ProductCreate):
         if category.organization_id != product_data.organization_id:
             raise HTTPException(status_code=400, detail=f"Category with ID {product_data.category_id} does not belong to the specified organization")
     
+    previous_organization_id = db_product.organization_id
     db_product.name = product_data.name
     db_product.organization_id = product_data.organization_id
-    db_product.price = product_data.price
+    db_product.price = money.to_decimal(product_data.price)
     db_product.label_for_ai = product_data.label_for_ai
     db_product.size = product_data.size
     db_product.category_id = product_data.category_id
     
     db.commit()
     db.refresh(db_product)
+    catalog_cache.invalidate(previous_organization_id)
+    catalog_cache.invalidate(db_product.organization_id)
     return db_product
 
 
@@ -175,21 +219,19 @@ def delete_product(db: Session, product_id: int):
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    organization_id = db_product.organization_id
     db.delete(db_product)
     db.commit()
+    catalog_cache.invalidate(organization_id)
     return {"message": f"Product {product_id} deleted successfully"}
 
 
 def update_user_organization(db: Session, user_id: int, organization_id: int):
-    db_user = get_user(db, user_id)
-    if not db_user:
+    if not get_user(db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
     
     db_organization = get_organization(db, organization_id)
     if not db_organization:
         raise HTTPException(status_code=404, detail="Organization not found")
     
-    db_user.organization_id = organization_id
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return update_user(db, user_id, organization_id=organization_id)
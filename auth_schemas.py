@@ -27,14 +27,32 @@ class RefreshToken(RefreshTokenBase):
     class Config:
         orm_mode = True
 
+class Session(BaseModel):
+    id: int
+    created_at: datetime
+    expires_at: datetime
+    revoked: bool = False
+
+    class Config:
+        orm_mode = True
+
 class User(UserBase):
     id: int
-    refresh_tokens: List[RefreshToken] = []
     organization: Optional[Organization] = None
 
     class Config:
         orm_mode = True
 
+class UserSummary(BaseModel):
+    id: int
+    username: str
+    email: Optional[str] = None
+    organization_id: Optional[int] = None
+    is_admin: bool = False
+
+    class Config:
+        orm_mode = True
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str
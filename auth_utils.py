@@ -6,7 +6,9 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from database import get_db
 from auth_models import User, RefreshToken
-from auth_schemas import TokenData
+from auth_schemas import TokenData, UserSummary
+import auth_crud
+import user_cache
 import os
 from dotenv import load_dotenv
 import secrets
@@ -16,7 +18,11 @@ load_dotenv()
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
-REFRESH_TOKEN_EXPIRE_HOURS = os.getenv("REFRESH_TOKEN_EXPIRE_HOURS", 720)
+REFRESH_TOKEN_EXPIRE_HOURS = int(os.getenv("REFRESH_TOKEN_EXPIRE_HOURS", 720))
+# When enabled, access tokens carry the user's id, organization and admin flag and
+# get_current_user trusts them without a database lookup. Changes to those fields
+# then apply once the user's current access token expires.
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "false").lower() == "true"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -30,6 +36,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def access_token_claims(user: User) -> dict:
+    claims = {"sub": user.username}
+    if TRUST_TOKEN_CLAIMS:
+        claims.update({"uid": user.id, "email": user.email, "org": user.organization_id, "adm": bool(user.is_admin)})
+    return claims
+
 def create_refresh_token(db: Session, user_id: int) -> Tuple[str, datetime]:
     token = secrets.token_hex(32)
     
@@ -47,16 +59,17 @@ def create_refresh_token(db: Session, user_id: int) -> Tuple[str, datetime]:
     
     return token, expires_at
 
-def verify_token(token: str, credentials_exception) -> TokenData:
+def decode_token(token: str, credentials_exception) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-        return token_data
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def verify_token(token: str, credentials_exception) -> TokenData:
+    return TokenData(username=decode_token(token, credentials_exception)["sub"])
 
 def get_refresh_token(db: Session, token: str):
     return db.query(RefreshToken).filter(RefreshToken.token == token).first()
@@ -71,33 +84,76 @@ def is_valid_refresh_token(db: Session, token: str) -> bool:
         
     return True
 
-def revoke_refresh_token(db: Session, token: str) -> bool:
+def rotate_refresh_token(db: Session, token: str) -> Optional[Tuple[str, int]]:
+    """Swap a valid refresh token for a new one in place, so refreshing never adds rows.
+
+    Returns the new token and its user id, or None if the old token is unknown,
+    revoked, expired or was rotated concurrently.
+    """
     db_token = get_refresh_token(db, token)
-    if not db_token:
-        return False
+    now = datetime.utcnow()
+    if not db_token or db_token.revoked or db_token.expires_at < now:
+        return None
     
-    db_token.revoked = True
+    new_token = secrets.token_hex(32)
+    rotated = db.query(RefreshToken).filter(
+        RefreshToken.id == db_token.id,
+        RefreshToken.token == token,
+        RefreshToken.revoked == False
+    ).update({
+        RefreshToken.token: new_token,
+        RefreshToken.expires_at: now + timedelta(hours=REFRESH_TOKEN_EXPIRE_HOURS),
+        RefreshToken.created_at: now
+    }, synchronize_session=False)
     db.commit()
-    return True
+    
+    if not rotated:
+        return None
+    return new_token, db_token.user_id
+
+def revoke_refresh_token(db: Session, token: str) -> bool:
+    revoked = db.query(RefreshToken).filter(RefreshToken.token == token).update({RefreshToken.revoked: True}, synchronize_session=False)
+    db.commit()
+    return revoked > 0
 
 def revoke_all_user_tokens(db: Session, user_id: int) -> bool:
-    db_tokens = db.query(RefreshToken).filter(RefreshToken.user_id == user_id).all()
-    for token in db_tokens:
-        token.revoked = True
-    
+    db.query(RefreshToken).filter(RefreshToken.user_id == user_id, RefreshToken.revoked == False).update({RefreshToken.revoked: True}, synchronize_session=False)
     db.commit()
     return True
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserSummary:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    token_data = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.username == token_data.username).first()
-    if user is None:
+    payload = decode_token(token, credentials_exception)
+    username = payload["sub"]
+
+    if TRUST_TOKEN_CLAIMS and "uid" in payload:
+        return UserSummary(
+            id=payload["uid"],
+            username=username,
+            email=payload.get("email"),
+            organization_id=payload.get("org"),
+            is_admin=payload.get("adm", False)
+        )
+
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+
+    db_user = auth_crud.get_user_summary(db, username)
+    if db_user is None:
         raise credentials_exception
+    user = UserSummary(
+        id=db_user.id,
+        username=db_user.username,
+        email=db_user.email,
+        organization_id=db_user.organization_id,
+        is_admin=db_user.is_admin
+    )
+    user_cache.put(user)
     return user
 
 def get_user_from_refresh_token(db: Session, refresh_token: str) -> Optional[User]:
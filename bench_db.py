@@ -0,0 +1,118 @@
+"""Load test GET /orders/ with the blocking session and with the AsyncSession.
+
+Runs against a throwaway SQLite database by default:
+
+    python bench_db.py --clients 200 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare sync and async database sessions under concurrent load")
+    parser.add_argument("--clients", type=int, default=200, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per mode")
+    parser.add_argument("--orders", type=int, default=500, help="Orders to seed")
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite file")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url is None:
+    args.database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("TRUST_TOKEN_CLAIMS", "true")
+
+import httpx  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+import models  # noqa: E402
+from auth_models import User  # noqa: E402
+from auth_utils import access_token_claims, create_access_token  # noqa: E402
+
+
+def seed(order_count: int) -> str:
+    db = database.SessionLocal()
+    try:
+        organization = models.Organization(name="Benchmark")
+        db.add(organization)
+        db.flush()
+        product = models.Product(name="Tea", label_for_ai="tea", price=2.5, organization_id=organization.id)
+        user = User(username=f"bench-{time.time_ns()}", email=None, hashed_password="x", organization_id=organization.id)
+        db.add_all([product, user])
+        db.flush()
+        for _ in range(order_count):
+            order = models.Order(organization_id=organization.id, total_price=5.0)
+            order.items = [models.OrderItem(item_id=product.id, quantity=2, price=2.5)]
+            db.add(order)
+        db.commit()
+        return create_access_token(access_token_claims(user))
+    finally:
+        db.close()
+
+
+async def run_mode(use_async: bool, token: str) -> dict:
+    database.DB_ASYNC = use_async
+    transport = httpx.ASGITransport(app=main.app)
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    lag = [0.0]
+    remaining = [args.requests]
+
+    async def client(http):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            response = await http.get("/orders/", params={"limit": 50}, headers=headers)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    async def watch_loop():
+        # How late a 10 ms timer fires shows how long the event loop was blocked.
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag[0] = max(lag[0], time.perf_counter() - started - 0.01)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await http.get("/orders/", params={"limit": 1}, headers=headers)
+        watcher = asyncio.create_task(watch_loop())
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - started
+        watcher.cancel()
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "lag": lag[0] * 1000,
+    }
+
+
+def main_bench():
+    models.Base.metadata.create_all(bind=database.engine)
+    token = seed(args.orders)
+    print(f"Database: {args.database_url} | clients: {args.clients} | requests: {args.requests} | "
+          f"pool: {database.DB_POOL_SIZE}+{database.DB_MAX_OVERFLOW}")
+    for use_async in (False, True):
+        try:
+            result = asyncio.run(run_mode(use_async, token))
+        except ImportError as e:
+            print(f"{'async' if use_async else 'sync'}: skipped, driver not installed ({e})")
+            continue
+        print(f"{'async' if use_async else 'sync '}: {result['throughput']:.0f} req/s | p50 {result['p50']:.1f} ms | "
+              f"p95 {result['p95']:.1f} ms | max loop lag {result['lag']:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+import gemini_client
+
+
+class BlockingFakeModels:
+    """The synchronous ``client.models`` the endpoints used to call directly from ``async def``."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency)
+        return gemini_client.FakeResponse("ok")
+
+
+def build_app(latency: float) -> FastAPI:
+    app = FastAPI()
+    blocking_models = BlockingFakeModels(latency)
+
+    @app.post("/blocking")
+    async def blocking(upload: int):
+        # The old code path: a sync Gemini call inside the endpoint holds the event loop.
+        response = blocking_models.generate_content(model=gemini_client.GEMINI_MODEL, contents=["prompt", f"upload {upload}"])
+        return {"text": response.text}
+
+    @app.post("/async")
+    async def non_blocking(upload: int):
+        response = await gemini_client.generate_content(contents=["prompt", f"upload {upload}"])
+        return {"text": response.text}
+
+    return app
+
+
+async def run_concurrent(app: FastAPI, path: str, count: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post(path, params={"upload": i}) for i in range(count)))
+        elapsed = time.perf_counter() - started
+    for response in responses:
+        response.raise_for_status()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Gemini calls against the fake client")
+    parser.add_argument("--uploads", type=int, default=50, help="Number of concurrent uploads")
+    parser.add_argument("--latency", type=float, default=1.0, help="Simulated Gemini latency in seconds")
+    args = parser.parse_args()
+
+    gemini_client.set_client(gemini_client.FakeGeminiClient(latency=args.latency, response_text="ok"))
+    app = build_app(args.latency)
+
+    blocking = asyncio.run(run_concurrent(app, "/blocking", args.uploads))
+    elapsed = asyncio.run(run_concurrent(app, "/async", args.uploads))
+
+    print(f"Uploads: {args.uploads} | latency: {args.latency:.2f}s | concurrency limit: {gemini_client.GEMINI_MAX_CONCURRENCY}")
+    print(f"Blocking client in async endpoint: {blocking:.2f}s, {args.uploads / blocking:.2f} req/s")
+    print(f"Async client: {elapsed:.2f}s, {args.uploads / elapsed:.2f} req/s")
+
+
+if __name__ == "__main__":
+    main()
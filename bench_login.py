@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+import time
+
+import password_hashing
+
+
+async def verify_concurrently(password: str, hashed_password: str, count: int):
+    await asyncio.gather(*(password_hashing.verify_and_update(password, hashed_password) for _ in range(count)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt login throughput inline vs. on the hashing executor")
+    parser.add_argument("--logins", type=int, default=32, help="Number of concurrent logins")
+    args = parser.parse_args()
+
+    hashed_password = password_hashing.hash_password_sync("benchmark-password")
+
+    started = time.perf_counter()
+    for _ in range(args.logins):
+        password_hashing.verify_and_update_sync("benchmark-password", hashed_password)
+    inline = time.perf_counter() - started
+
+    password_hashing.get_executor()
+    started = time.perf_counter()
+    asyncio.run(verify_concurrently("benchmark-password", hashed_password, args.logins))
+    pooled = time.perf_counter() - started
+    password_hashing.shutdown()
+
+    print(f"Logins: {args.logins} | rounds: {password_hashing.BCRYPT_ROUNDS} | "
+          f"executor: {password_hashing.PASSWORD_HASH_EXECUTOR} x {password_hashing.PASSWORD_HASH_WORKERS}")
+    print(f"Inline on the event loop: {inline:.2f}s, {args.logins / inline:.1f} logins/s")
+    print(f"Hashing executor: {pooled:.2f}s, {args.logins / pooled:.1f} logins/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Measure cold start of the API in fresh interpreters and fail when it exceeds a budget.
+
+    python bench_startup.py --runs 5 --budget 2.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 2.0))
+
+# Runs in a child process so every measurement pays the full import cost.
+PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def start_and_stop():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(start_and_stop())
+print(json.dumps({"import": imported - started, "ready": ready - started}))
+"""
+
+
+def measure() -> dict:
+    env = {**os.environ, "AUDIO_JOB_WORKERS": os.getenv("AUDIO_JOB_WORKERS", "0"),
+           "TOKEN_REAPER_INTERVAL_SECONDS": os.getenv("TOKEN_REAPER_INTERVAL_SECONDS", "0")}
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start of main.py against a time budget")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS, help="Budget in seconds for the median time to ready")
+    args = parser.parse_args()
+
+    results = [measure() for _ in range(args.runs)]
+    imported = statistics.median(result["import"] for result in results)
+    ready = statistics.median(result["ready"] for result in results)
+
+    print(f"Runs: {args.runs} | median import: {imported:.3f}s | median ready: {ready:.3f}s | budget: {args.budget:.3f}s")
+    if ready > args.budget:
+        print("Cold start is over budget. Find the slow imports with: python -X importtime -c 'import main'")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import codecs
+import json
+import logging
+import os
+import tempfile
+from array import array
+from typing import Iterator
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import models
+import money
+import order_analytics
+import schemas
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+BULK_ORDER_BATCH_SIZE = int(os.getenv("BULK_ORDER_BATCH_SIZE", 500))
+BULK_ORDER_SPOOL_MAX_MEMORY = int(os.getenv("BULK_ORDER_SPOOL_MAX_MEMORY", 8 * 1024 * 1024))
+BULK_ORDER_MAX_BODY_BYTES = int(os.getenv("BULK_ORDER_MAX_BODY_BYTES", 100 * 1024 * 1024))
+# A single order in a JSON array body may not be larger than this.
+BULK_ORDER_MAX_ORDER_BYTES = int(os.getenv("BULK_ORDER_MAX_ORDER_BYTES", 1024 * 1024))
+READ_CHUNK_SIZE = 64 * 1024
+# Longest JSON token that can be cut off at a chunk boundary (e.g. "-Infinity").
+_TOKEN_TAIL = 16
+
+
+def too_large_error(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Request body is larger than {max_bytes} bytes")
+
+
+async def spool_request_body(request: Request, max_bytes: int = None):
+    """Copy the request body into a spooled temp file so it can be parsed lazily.
+
+    Raises 413 without reading when the declared Content-Length is over the
+    limit, and as soon as the body read so far passes it otherwise.
+    """
+    max_bytes = max_bytes or BULK_ORDER_MAX_BODY_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise too_large_error(max_bytes)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=BULK_ORDER_SPOOL_MAX_MEMORY)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large_error(max_bytes)
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _needs_more_input(error: json.JSONDecodeError, buffer: str) -> bool:
+    """Whether a decode error may just be the buffer ending mid-value rather than malformed JSON."""
+    return error.msg.startswith("Unterminated string") or error.pos >= len(buffer) - _TOKEN_TAIL
+
+
+def _iter_json_array(text) -> Iterator:
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    expect_value = True
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = text.read(READ_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    fill()
+    position = buffer.index("[") + 1
+
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            fill()
+            continue
+
+        if buffer[position] == "]":
+            return
+        if not expect_value:
+            if buffer[position] != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {buffer[position]!r}")
+            position += 1
+            expect_value = True
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            # Stop at the first malformed order instead of buffering the rest of the stream.
+            if eof or not _needs_more_input(e, buffer):
+                raise
+            if len(buffer) - position > BULK_ORDER_MAX_ORDER_BYTES:
+                raise ValueError(f"An order in the JSON array is larger than {BULK_ORDER_MAX_ORDER_BYTES} bytes") from e
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            fill()
+            continue
+
+        yield value
+        position = end
+        expect_value = False
+
+
+def _first_significant_byte(body) -> bytes:
+    byte = body.read(1)
+    while byte and byte.isspace():
+        byte = body.read(1)
+    body.seek(0)
+    return byte
+
+
+def iter_order_payloads(body) -> Iterator:
+    """Yield decoded orders from an NDJSON or JSON array body without loading it whole."""
+    first = _first_significant_byte(body)
+    text = codecs.getreader("utf-8")(body)
+
+    if first == b"[":
+        yield from _iter_json_array(text)
+        return
+
+    while True:
+        line = text.readline(BULK_ORDER_MAX_ORDER_BYTES + 1)
+        if not line:
+            return
+        if len(line) > BULK_ORDER_MAX_ORDER_BYTES:
+            # Skip the rest of the line rather than buffering it.
+            while line and not line.endswith("\n"):
+                line = text.readline(BULK_ORDER_MAX_ORDER_BYTES + 1)
+            yield ValueError(f"Line is longer than {BULK_ORDER_MAX_ORDER_BYTES} bytes")
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield e
+
+
+class PriceMap:
+    """An organization's prices, both as shared Decimals for storage and as integer cents for summing."""
+
+    def __init__(self, rows):
+        self.prices = {}
+        self.cents = {}
+        for product_id, price in rows:
+            price = price if price is not None else money.ZERO
+            self.prices[product_id] = price
+            self.cents[product_id] = money.to_cents(price)
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self.prices
+
+
+def load_price_map(db: Session, organization_id: int) -> PriceMap:
+    return PriceMap(db.query(models.Product.id, models.Product.price).filter(models.Product.organization_id == organization_id))
+
+
+class OrderBatch:
+    """Orders waiting to be written, packed into integer arrays.
+
+    Totals are summed in cents, so a large import allocates one Decimal per
+    order (when it is stored) rather than one per item.
+    """
+
+    def __init__(self):
+        self.indexes = array("q")
+        self.totals = array("q")
+        self.item_ids = array("q")
+        self.quantities = array("q")
+        # Offset in item_ids/quantities where each order's items end.
+        self.ends = array("q")
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def add(self, index: int, order: schemas.OrderCreate, prices: PriceMap):
+        total = 0
+        for item in order.items:
+            self.item_ids.append(item.item_id)
+            self.quantities.append(item.quantity)
+            total += prices.cents[item.item_id] * item.quantity
+        self.indexes.append(index)
+        self.totals.append(total)
+        self.ends.append(len(self.item_ids))
+
+    def items(self, position: int) -> range:
+        return range(self.ends[position - 1] if position else 0, self.ends[position])
+
+
+def _write_batch(db: Session, organization_id: int, batch: OrderBatch, prices: PriceMap) -> Iterator[dict]:
+    db_orders = [models.Order(total_price=money.from_cents(total), organization_id=organization_id) for total in batch.totals]
+    try:
+        db.add_all(db_orders)
+        db.flush()
+        db.execute(insert(models.OrderItem), [
+            {"order_id": db_order.id, "item_id": batch.item_ids[i], "quantity": batch.quantities[i],
+             "price": prices.prices[batch.item_ids[i]]}
+            for position, db_order in enumerate(db_orders)
+            for i in batch.items(position)
+        ])
+        order_analytics.add_orders(db, [
+            order_analytics.snapshot(db_order, [
+                (batch.item_ids[i], batch.quantities[i], prices.prices[batch.item_ids[i]]) for i in batch.items(position)
+            ])
+            for position, db_order in enumerate(db_orders)
+        ])
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error writing bulk order batch: {str(e)}")
+        for index in batch.indexes:
+            yield {"index": index, "error": f"Database error: {str(e)}"}
+        return
+
+    for db_order, index, total in zip(db_orders, batch.indexes, batch.totals):
+        yield {"index": index, "order_id": db_order.id, "total_price": str(money.from_cents(total))}
+    db.expunge_all()
+
+
+def ingest_orders(db: Session, organization_id: int, payloads, batch_size: int = BULK_ORDER_BATCH_SIZE) -> Iterator[dict]:
+    """Validate and insert orders in batches, yielding one result per input order."""
+    prices = load_price_map(db, organization_id)
+    batch = OrderBatch()
+
+    try:
+        for index, payload in enumerate(payloads):
+            if isinstance(payload, Exception):
+                yield {"index": index, "error": f"Invalid JSON: {str(payload)}"}
+                continue
+            if not isinstance(payload, dict):
+                yield {"index": index, "error": f"Expected an order object, got {type(payload).__name__}"}
+                continue
+            try:
+                order = schemas.OrderCreate(**payload)
+            except ValidationError as e:
+                yield {"index": index, "error": str(e)}
+                continue
+
+            missing = [item.item_id for item in order.items if item.item_id not in prices]
+            if missing:
+                yield {"index": index, "error": f"Products not found in your organization: {missing}"}
+                continue
+
+            batch.add(index, order, prices)
+
+            if len(batch) >= batch_size:
+                yield from _write_batch(db, organization_id, batch, prices)
+                batch = OrderBatch()
+    except ValueError:
+        # The body stopped parsing: store the orders read before the error so each of them still gets a result.
+        if len(batch):
+            yield from _write_batch(db, organization_id, batch, prices)
+        raise
+
+    if len(batch):
+        yield from _write_batch(db, organization_id, batch, prices)
+
+
+def stream_results(body, organization_id: int, batch_size: int) -> Iterator[str]:
+    db = SessionLocal()
+    try:
+        for result in ingest_orders(db, organization_id, iter_order_payloads(body), batch_size):
+            yield json.dumps(result) + "\n"
+    except ValueError as e:
+        yield json.dumps({"error": f"Invalid request body: {str(e)}"}) + "\n"
+    finally:
+        db.close()
+        body.close()
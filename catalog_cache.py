@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import auth_crud
+import context_cache
+import prompt_builder
+
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", 300))
+
+
+class Catalog:
+    """An organization's full product list, indexed by id and pre-rendered for prompts."""
+
+    def __init__(self, organization_id: int, products: list):
+        self.organization_id = organization_id
+        self.products = products
+        self.by_id = {product["id"]: product for product in products}
+        # Derived from the content, so every worker computes the same version for the same menu.
+        self.version = hashlib.sha1(json.dumps(products, sort_keys=True).encode()).hexdigest()[:12]
+        self.prompt_text = prompt_builder.render_catalog(products)
+        self.loaded_at = time.monotonic()
+
+
+_catalogs = {}
+_lock = threading.Lock()
+
+
+def load_catalog(db: Session, organization_id: int) -> Catalog:
+    products = [
+        {"id": product_id, "label_for_ai": label_for_ai, "name": name}
+        for product_id, label_for_ai, name in auth_crud.get_catalog_rows(db, organization_id)
+    ]
+    return Catalog(organization_id, products)
+
+
+def get_catalog(db: Session, organization_id: Optional[int]) -> Catalog:
+    if not organization_id:
+        return Catalog(organization_id, [])
+
+    with _lock:
+        catalog = _catalogs.get(organization_id)
+    if catalog is not None and time.monotonic() - catalog.loaded_at < CATALOG_CACHE_TTL_SECONDS:
+        return catalog
+
+    catalog = load_catalog(db, organization_id)
+    with _lock:
+        _catalogs[organization_id] = catalog
+    return catalog
+
+
+def invalidate(organization_id: Optional[int]):
+    with _lock:
+        _catalogs.pop(organization_id, None)
+    context_cache.invalidate_organization(organization_id)
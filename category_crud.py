@@ -3,15 +3,17 @@ from fastapi import HTTPException
 from models import Category
 from schemas import CategoryCreate
 import auth_crud
+from pagination import keyset_columns, paginate
 
 def get_category(db: Session, category_id: int):
     return db.query(Category).filter(Category.id == category_id).first()
 
-def get_categories_by_organization(db: Session, organization_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Category).filter(Category.organization_id == organization_id).offset(skip).limit(limit).all()
+def get_categories_by_organization(db: Session, organization_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(Category).filter(Category.organization_id == organization_id)
+    return paginate(query, keyset_columns(Category), skip, limit, cursor).all()
 
-def get_all_categories(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Category).offset(skip).limit(limit).all()
+def get_all_categories(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Category), keyset_columns(Category), skip, limit, cursor).all()
 
 def create_category(db: Session, category: CategoryCreate):
     # Check if organization exists
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from fastapi import Request
+
+import gemini_client
+
+logger = logging.getLogger(__name__)
+
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", 3600))
+# Gemini rejects cached contents below a model-specific minimum size.
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024))
+# Stop using a cache this long before its TTL runs out rather than race the expiry.
+GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_SECONDS", 60))
+# After a failed create, send the prefix inline for this long before trying again.
+GEMINI_CONTEXT_CACHE_RETRY_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_RETRY_SECONDS", 300))
+
+
+class ContextCache:
+    """Keeps one Gemini cached content per prompt prefix.
+
+    Prefix keys carry the catalog and organization prompt versions, so a changed
+    menu or prompt gets a new cache and the previous one for the same
+    organization and kind is deleted.
+    """
+
+    def __init__(self, ttl_seconds: int = GEMINI_CONTEXT_CACHE_TTL_SECONDS, min_tokens: int = GEMINI_CONTEXT_CACHE_MIN_TOKENS):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._entries = {}
+        self._current_keys = {}
+        self._stale = []
+        self._locks = {}
+
+    def _usable(self, key: tuple) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        name, expires_at = entry
+        if time.monotonic() < expires_at - GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_SECONDS:
+            return name
+        return None
+
+    async def get_name(self, prefix) -> Optional[str]:
+        """Cache name for ``prefix``, creating the cache if needed; None means send it inline."""
+        if prefix.tokens < self.min_tokens:
+            return None
+
+        entry = self._entries.get(prefix.key)
+        if entry is not None and entry[0] is None and time.monotonic() < entry[1]:
+            return None
+        name = self._usable(prefix.key)
+        if name:
+            return name
+
+        lock = self._locks.setdefault(prefix.key, asyncio.Lock())
+        async with lock:
+            name = self._usable(prefix.key)
+            if name:
+                return name
+            await self._delete_stale()
+            return await self._create(prefix)
+
+    async def _create(self, prefix) -> Optional[str]:
+        organization_id, _, _, kind = prefix.key
+        try:
+            cached = await gemini_client.get_client().aio.caches.create(
+                model=gemini_client.GEMINI_MODEL,
+                config={
+                    "contents": [prefix.text],
+                    "ttl": f"{self.ttl_seconds}s",
+                    "display_name": f"org-{organization_id}-{kind}",
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Could not create Gemini context cache for organization {organization_id}: {str(e)}")
+            self._entries[prefix.key] = (None, time.monotonic() + GEMINI_CONTEXT_CACHE_RETRY_SECONDS)
+            return None
+
+        self._entries[prefix.key] = (cached.name, time.monotonic() + self.ttl_seconds)
+        previous = self._current_keys.get((organization_id, kind))
+        if previous is not None and previous != prefix.key:
+            self._drop(previous)
+        self._current_keys[(organization_id, kind)] = prefix.key
+        logger.info(f"Created Gemini context cache {cached.name} for organization {organization_id} ({kind})")
+        return cached.name
+
+    def _drop(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        self._locks.pop(key, None)
+        if entry is not None and entry[0] is not None:
+            self._stale.append(entry[0])
+
+    async def _delete_stale(self):
+        while self._stale:
+            name = self._stale.pop()
+            try:
+                await gemini_client.get_client().aio.caches.delete(name=name)
+            except Exception as e:
+                # Gemini removes it anyway once the TTL runs out.
+                logger.info(f"Could not delete Gemini context cache {name}: {str(e)}")
+
+    def forget(self, key: tuple):
+        """Drop a cache Gemini no longer has, without trying to delete it."""
+        self._entries.pop(key, None)
+
+    def invalidate_organization(self, organization_id: Optional[int]):
+        for key in [key for key in self._entries if key[0] == organization_id]:
+            self._drop(key)
+
+
+_context_cache = None
+
+
+def get_context_cache() -> ContextCache:
+    global _context_cache
+    if _context_cache is None:
+        _context_cache = ContextCache()
+    return _context_cache
+
+
+def invalidate_organization(organization_id: Optional[int]):
+    if _context_cache is not None:
+        _context_cache.invalidate_organization(organization_id)
+
+
+def _is_missing_cache(error, name: str) -> bool:
+    """Gemini answers 404 for an expired or deleted cache, and 403 when the cache itself is no longer accessible."""
+    if error.code == 404:
+        return True
+    return error.code == 403 and (name in str(error) or "cachedcontent" in str(error.message).lower())
+
+
+async def generate_content(prefix, contents: list, config: Optional[dict] = None, request: Optional[Request] = None):
+    """Generate with ``prefix`` followed by ``contents``.
+
+    With GEMINI_CONTEXT_CACHE enabled the prefix is referenced by cache name;
+    when that cache has expired or is missing the call is repeated with the
+    prefix inline.
+    """
+    if GEMINI_CONTEXT_CACHE:
+        cache = get_context_cache()
+        name = await cache.get_name(prefix)
+        if name:
+            from google.genai import errors
+
+            try:
+                return await gemini_client.generate_content(
+                    contents=contents, config={**(config or {}), "cached_content": name}, request=request
+                )
+            except errors.ClientError as e:
+                if not _is_missing_cache(e, name):
+                    raise
+                logger.warning(f"Gemini context cache {name} is gone, sending the prompt inline: {str(e)}")
+                cache.forget(prefix.key)
+
+    return await gemini_client.generate_content(contents=[prefix.text, *contents], config=config, request=request)
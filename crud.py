@@ -1,87 +1,16 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 import models
-import schemas
 from typing import List
+from pagination import keyset_columns, paginate
 
-def create_order(db: Session, order: schemas.OrderCreate):
-    total_price = order.total_price if order.total_price else 0.0
-    
-    db_order = models.Order(total_price=total_price)
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    
-    if total_price == 0.0:
-        for item_data in order.items:
-            db_item = models.OrderItem(
-                order_id=db_order.id,
-                item_id=item_data.item_id,
-                quantity=item_data.quantity,
-                size=item_data.size,
-                price=item_data.price
-            )
-            db.add(db_item)
-            total_price += item_data.price * item_data.quantity
-    else:
-        for item_data in order.items:
-            db_item = models.OrderItem(
-                order_id=db_order.id,
-                item_id=item_data.item_id,
-                quantity=item_data.quantity,
-                size=item_data.size,
-                price=item_data.price
-            )
-            db.add(db_item)
-    
-    if total_price != order.total_price:
-        db_order.total_price = total_price
-    
-    db.commit()
-    db.refresh(db_order)
-    return db_order
-
-def get_orders(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Order).offset(skip).limit(limit).all()
+def get_orders(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(models.Order).options(selectinload(models.Order.items))
+    return paginate(query, keyset_columns(models.Order), skip, limit, cursor).all()
 
 def get_order(db: Session, order_id: int):
-    return db.query(models.Order).filter(models.Order.id == order_id).first()
-
-def update_order(db: Session, order_id: int, order: schemas.OrderCreate):
-    db_order = get_order(db, order_id)
-    if db_order is None:
-        return None
-    
-    db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).delete()
-    
-    total_price = order.total_price if order.total_price else 0.0
-    
-    if total_price == 0.0:
-        for item_data in order.items:
-            db_item = models.OrderItem(
-                order_id=db_order.id,
-                item_id=item_data.item_id,
-                quantity=item_data.quantity,
-                size=item_data.size,
-                price=item_data.price
-            )
-            db.add(db_item)
-            total_price += item_data.price * item_data.quantity
-    else:
-        for item_data in order.items:
-            db_item = models.OrderItem(
-                order_id=db_order.id,
-                item_id=item_data.item_id,
-                quantity=item_data.quantity,
-                size=item_data.size,
-                price=item_data.price
-            )
-            db.add(db_item)
-    
-    db_order.total_price = total_price
-    
-    db.commit()
-    db.refresh(db_order)
-    return db_order
+    return db.query(models.Order).options(selectinload(models.Order.items)).filter(models.Order.id == order_id).first()
 
 def delete_order(db: Session, order_id: int):
     db_order = get_order(db, order_id)
@@ -91,3 +20,21 @@ def delete_order(db: Session, order_id: int):
     db.delete(db_order)
     db.commit()
     return True
+
+def compute_order_totals(db: Session, db_orders: List[models.Order]):
+    """Set each order's total_price to the sum of its items with one UPDATE in the database."""
+    db.flush()
+    orders = models.Order.__table__
+    items = models.OrderItem.__table__
+    # ROUND is a no-op on PostgreSQL NUMERIC and keeps SQLite's REAL arithmetic to whole cents.
+    item_total = select(func.round(func.coalesce(func.sum(items.c.price * items.c.quantity), 0), 2)).where(
+        items.c.order_id == orders.c.id
+    ).scalar_subquery()
+    totals = dict(db.execute(
+        update(orders)
+        .where(orders.c.id.in_([db_order.id for db_order in db_orders]))
+        .values(total_price=item_total)
+        .returning(orders.c.id, orders.c.total_price)
+    ).all())
+    for db_order in db_orders:
+        set_committed_value(db_order, "total_price", totals[db_order.id])
@@ -1,13 +1,13 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
 import logging
 
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DB_USER = os.getenv("DB_USER", "postgres")
@@ -18,18 +18,115 @@ DB_NAME = os.getenv("DB_NAME", "order_automation")
 CHAT_ID = os.getenv("CHAT_ID", "chatid")
 BOT_TOKEN = os.getenv("BOT_TOKEN", "bot_token")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Recycle connections before server or proxy idle timeouts close them; -1 disables.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+# Serve the hot read endpoints from an AsyncSession instead of the blocking session; writes always use SessionLocal.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
 
-logger.info(f"Connecting to PostgreSQL database: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+def async_database_url(url: str) -> str:
+    """The same database through an asyncio driver: asyncpg for PostgreSQL, aiosqlite for SQLite."""
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("postgresql"):
+        return f"postgresql+asyncpg://{rest}"
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(SQLALCHEMY_DATABASE_URL))
+
+
+def pool_options(url: str) -> dict:
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:")):
+        # In-memory SQLite lives in a single connection; there is no pool to size.
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+logger.info(f"Connecting to database: {SQLALCHEMY_DATABASE_URL.split('@')[-1]}")
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    """Created on first use so the async driver is only needed when DB_ASYNC is on."""
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_sessionmaker = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker()
+
+
 def get_db():
+    """Session for the write routes. These stay on the blocking session even with DB_ASYNC on:
+    their crud, analytics and cache helpers are synchronous, so only the read endpoints use get_read_db.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_read_db():
+    """Session for read-only endpoints: async when DB_ASYNC is on, otherwise the regular one."""
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+async def fetch_all(db, statement) -> list:
+    """Run a select on either kind of session without blocking the event loop."""
+    if isinstance(db, Session):
+        return await run_in_threadpool(lambda: db.execute(statement).scalars().all())
+    return (await db.execute(statement)).scalars().all()
+
+
+async def fetch_rows(db, statement) -> list:
+    """Like fetch_all, but returns whole rows for multi-column selects."""
+    if isinstance(db, Session):
+        return await run_in_threadpool(lambda: db.execute(statement).all())
+    return (await db.execute(statement)).all()
+
+
+async def fetch_first(db, statement):
+    rows = await fetch_all(db, statement.limit(1))
+    return rows[0] if rows else None
@@ -0,0 +1,58 @@
+"""Local stand-in for the Telegram Bot API.
+
+Run it with ``uvicorn fake_telegram:app --port 8081`` and point the app at it
+with ``TELEGRAM_API_URL=http://localhost:8081``, or mount it in-process with
+``TelegramNotifier(transport=httpx.ASGITransport(app=fake_telegram.app))``.
+"""
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Every Nth request is answered with 429 to exercise the retry path; 0 disables it.
+FAKE_TELEGRAM_THROTTLE_EVERY = int(os.getenv("FAKE_TELEGRAM_THROTTLE_EVERY", 0))
+FAKE_TELEGRAM_RETRY_AFTER = int(os.getenv("FAKE_TELEGRAM_RETRY_AFTER", 1))
+# Requests made with this token are rejected like a revoked bot token.
+INVALID_TOKEN = "invalid"
+
+app = FastAPI(title="Fake Telegram Bot API")
+
+received = []
+# Set by tests to answer the next N requests with 429.
+throttle_next = 0
+
+
+def reset():
+    global throttle_next
+    received.clear()
+    throttle_next = 0
+
+
+@app.post("/bot{token}/{method}")
+async def bot_method(token: str, method: str, request: Request):
+    global throttle_next
+    if token == INVALID_TOKEN:
+        received.append({"method": method, "rejected": True, "at": time.monotonic()})
+        return JSONResponse(status_code=401, content={"ok": False, "error_code": 401, "description": "Unauthorized"})
+
+    if throttle_next or (FAKE_TELEGRAM_THROTTLE_EVERY and (len(received) + 1) % FAKE_TELEGRAM_THROTTLE_EVERY == 0):
+        throttle_next = max(throttle_next - 1, 0)
+        received.append({"method": method, "throttled": True, "at": time.monotonic()})
+        return JSONResponse(status_code=429, content={
+            "ok": False, "error_code": 429, "parameters": {"retry_after": FAKE_TELEGRAM_RETRY_AFTER}
+        })
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        payload = await request.json()
+    else:
+        form = await request.form()
+        payload = {key: (value.filename if hasattr(value, "filename") else value) for key, value in form.items()}
+
+    received.append({"method": method, "token": token, "payload": payload, "at": time.monotonic()})
+    return {"ok": True, "result": {"message_id": len(received)}}
+
+
+@app.get("/received")
+async def list_received():
+    return received
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", None)
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 60))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 16))
+GEMINI_FAKE = os.getenv("GEMINI_FAKE", "false").lower() == "true"
+FAKE_GEMINI_LATENCY_SECONDS = float(os.getenv("FAKE_GEMINI_LATENCY_SECONDS", 1.0))
+FAKE_GEMINI_RESPONSE = os.getenv("FAKE_GEMINI_RESPONSE", None)
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class GeminiTimeoutError(Exception):
+    pass
+
+
+class ClientDisconnectedError(Exception):
+    pass
+
+
+class FakeResponse:
+    def __init__(self, text, parsed=None):
+        self.text = text
+        self.parsed = parsed
+
+
+def _not_found(message: str):
+    from google.genai import errors
+
+    return errors.ClientError(404, {"error": {"code": 404, "message": message, "status": "NOT_FOUND"}})
+
+
+class FakeCaches:
+    """Offline stand-in for ``client.aio.caches`` that keeps cached contents in memory."""
+
+    def __init__(self):
+        self.entries = {}
+        self.created = 0
+        self.deleted = 0
+
+    async def create(self, model, config):
+        name = f"cachedContents/{uuid.uuid4().hex}"
+        ttl = float(str(config.get("ttl", "3600s")).rstrip("s"))
+        self.entries[name] = (config.get("contents"), time.monotonic() + ttl)
+        self.created += 1
+        return type("FakeCachedContent", (), {"name": name})()
+
+    async def delete(self, name, config=None):
+        if self.entries.pop(name, None) is None:
+            raise _not_found(f"CachedContent {name} not found")
+        self.deleted += 1
+
+    def lookup(self, name: str):
+        entry = self.entries.get(name)
+        if entry is None or entry[1] <= time.monotonic():
+            self.entries.pop(name, None)
+            raise _not_found(f"CachedContent {name} not found or expired")
+        return entry[0]
+
+    def expire(self, name: Optional[str] = None):
+        """Expire one cache, or all of them, as if their TTL had run out."""
+        for key in [name] if name else list(self.entries):
+            self.entries.pop(key, None)
+
+
+class FakeFiles:
+    """Offline stand-in for ``client.aio.files``; remembers uploads by name."""
+
+    def __init__(self):
+        self.uploads = {}
+
+    async def upload(self, file, config=None):
+        name = f"files/{uuid.uuid4().hex}"
+        data = file.read() if hasattr(file, "read") else open(file, "rb").read()
+        self.uploads[name] = data
+        mime_type = config.get("mime_type") if isinstance(config, dict) else None
+        return type("FakeFile", (), {"name": name, "uri": f"https://fake.gemini/{name}", "mime_type": mime_type})()
+
+    async def delete(self, name, config=None):
+        if self.uploads.pop(name, None) is None:
+            raise _not_found(f"File {name} not found")
+
+
+class FakeModels:
+    """Offline stand-in for ``client.aio.models`` that sleeps instead of calling Gemini."""
+
+    def __init__(self, latency: float, response_text: Optional[str], caches: Optional[FakeCaches] = None):
+        self.latency = latency
+        self.response_text = response_text
+        self.caches = caches
+        self.calls = 0
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        cached_content = config.get("cached_content") if isinstance(config, dict) else None
+        if cached_content and self.caches is not None:
+            self.caches.lookup(cached_content)
+        await asyncio.sleep(self.latency)
+        return self._build_response(config)
+
+    async def count_tokens(self, model, contents, config=None):
+        text = contents if isinstance(contents, str) else " ".join(str(part) for part in contents)
+        return type("FakeCountTokensResponse", (), {"total_tokens": (len(text) + 3) // 4})()
+
+    def _build_response(self, config):
+        schema = config.get("response_schema") if isinstance(config, dict) else None
+        if schema is None:
+            return FakeResponse(self.response_text or "fake transcription")
+
+        from pydantic import TypeAdapter
+
+        text = self.response_text or "[]"
+        return FakeResponse(text, TypeAdapter(schema).validate_python(json.loads(text)))
+
+
+class FakeGeminiClient:
+    def __init__(self, latency: float = FAKE_GEMINI_LATENCY_SECONDS, response_text: Optional[str] = FAKE_GEMINI_RESPONSE):
+        self.aio = type("FakeAio", (), {})()
+        self.aio.caches = FakeCaches()
+        self.aio.files = FakeFiles()
+        self.aio.models = FakeModels(latency, response_text, self.aio.caches)
+
+
+_client = None
+_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        if GEMINI_FAKE:
+            logger.info("Using fake Gemini client")
+            _client = FakeGeminiClient()
+        else:
+            # Imported here because google.genai takes about half a second to import.
+            from google import genai
+
+            _client = genai.Client(api_key=GOOGLE_API_KEY)
+    return _client
+
+
+def set_client(client):
+    global _client
+    _client = client
+
+
+async def _wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def generate_content(contents, config=None, request: Optional[Request] = None, timeout: Optional[float] = None):
+    """Run a Gemini call on the async client, bounded by the concurrency limit.
+
+    The call is cancelled when it exceeds ``timeout`` or when ``request`` is
+    given and its client disconnects before the response is ready.
+    """
+    timeout = GEMINI_TIMEOUT_SECONDS if timeout is None else timeout
+
+    async with _semaphore:
+        call = asyncio.ensure_future(
+            get_client().aio.models.generate_content(model=GEMINI_MODEL, contents=contents, config=config)
+        )
+        waiters = {call}
+        watcher = None
+        if request is not None:
+            watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+            waiters.add(watcher)
+
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in waiters:
+                if not task.done():
+                    task.cancel()
+
+        if call in done:
+            return call.result()
+        if watcher is not None and watcher in done:
+            logger.info("Client disconnected, cancelled Gemini call")
+            raise ClientDisconnectedError("Client disconnected before the response was ready")
+        raise GeminiTimeoutError(f"Gemini did not respond within {timeout} seconds")
+
+
+async def count_tokens(contents, timeout: Optional[float] = None) -> int:
+    """Ask Gemini how many tokens ``contents`` takes for the configured model."""
+    timeout = GEMINI_TIMEOUT_SECONDS if timeout is None else timeout
+    async with _semaphore:
+        try:
+            response = await asyncio.wait_for(
+                get_client().aio.models.count_tokens(model=GEMINI_MODEL, contents=contents), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            raise GeminiTimeoutError(f"Gemini did not count tokens within {timeout} seconds")
+    return response.total_tokens
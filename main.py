@@ -1,150 +1,101 @@
 import io
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Form, BackgroundTasks, Request, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, File, UploadFile, Form, BackgroundTasks, Request, Response, Query, Header, status
 import os
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import filetype
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 import re
 from fastapi import BackgroundTasks
-from datetime import datetime
+from datetime import date, datetime
 import json
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, selectinload
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import timedelta
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import logging
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 import crud, models, schemas
+import gemini_client
 import auth_crud, auth_models, auth_schemas
 import prompt_crud, category_crud
-from auth_utils import (create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES,
-                       create_refresh_token, is_valid_refresh_token, get_user_from_refresh_token,
-                       revoke_refresh_token, revoke_all_user_tokens)
-
-from database import SessionLocal, engine, get_db, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, CHAT_ID, BOT_TOKEN
+import bulk_orders
+import pagination
+import transcription_store
+import telegram_notifier
+import password_hashing
+import token_reaper
+import catalog_cache
+import prompt_builder
+import context_cache
+import result_cache
+import audio_intake
+import audio_preprocess
+import order_extraction
+import audio_jobs
+import order_analytics
+import order_export
+from auth_utils import (create_access_token, access_token_claims, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES,
+                       create_refresh_token, rotate_refresh_token, revoke_refresh_token, revoke_all_user_tokens)
+
+from database import SessionLocal, engine, get_db, get_read_db, fetch_all, fetch_first, fetch_rows
 
 from pydantic import BaseModel
 
 
-def send_to_telegram(contents: bytes, filename: str, orders_data: list):
-    import requests
-
-    # message = f"🧾 New Order Extracted:\n\n{json.dumps(orders_data, indent=2)}"
-    message = f"🧾 New Order Extracted:\n\n{json.dumps(orders_data, indent=2, ensure_ascii=False)}" 
-
-    try:
-        requests.post(
-            f"https://api.telegram.org/bot{BOT_TOKEN}/sendAudio",
-            data={"chat_id": CHAT_ID},
-            files={"audio": (filename, io.BytesIO(contents))}
-        )
-
-        requests.post(
-            f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage",
-            json={"chat_id": CHAT_ID, "text": message, "parse_mode": "HTML"}
-        )
-
-    except Exception as e:
-        print("Telegram send error:", e)
-
-
-class Item(BaseModel):
-    id: int
-    quantity: int
-
-def ensure_database_exists():
-    logger = logging.getLogger("database_init")
-    logger.setLevel(logging.INFO)
-    
-    try:
-        logger.info(f"Checking if database {DB_NAME} exists...")
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT,
-            database="postgres"  
-        )
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        
-        cursor = conn.cursor()
-        
-        cursor.execute(f"SELECT 1 FROM pg_catalog.pg_database WHERE datname = '{DB_NAME}'")
-        exists = cursor.fetchone()
-        
-        if not exists:
-            logger.info(f"Creating database '{DB_NAME}'...")
-            cursor.execute(f"CREATE DATABASE {DB_NAME}")
-            logger.info("Database created successfully!")
-        else:
-            logger.info(f"Database '{DB_NAME}' already exists.")
-        
-        cursor.close()
-        conn.close()
-        
-        return True
-    except Exception as e:
-        logger.error(f"Error creating database: {str(e)}")
-        return False
-
-ensure_database_exists()
-
-models.Base.metadata.create_all(bind=engine)
-auth_models.Base.metadata.create_all(bind=engine)
+from order_extraction import Item
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", None)
-
-client = genai.Client(api_key=GOOGLE_API_KEY)
-
-pending_transcriptions = {}
-
 class PromptRequest(BaseModel):
     text: str
 
-def process_audio(audio_bytes, mime_type, prompt):
-    response = client.models.generate_content(
-            model='gemini-2.0-flash',
+async def process_audio(upload: audio_intake.AudioUpload, prompt, request: Optional[Request] = None):
+    response = await gemini_client.generate_content(
             contents = [
                 prompt,
-                types.Part.from_bytes(
-                    data=audio_bytes,
-                    mime_type=mime_type
-                )
-            ]
+                await upload.gemini_part()
+            ],
+            request=request
         )
 
     return response.text
 
-def summarize_order(prompt):
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt
-    )
+async def summarize_order(prompt, request: Optional[Request] = None):
+    response = await gemini_client.generate_content(contents=prompt, request=request)
 
     return response.text
 
 
-app = FastAPI(title="Order Automation API", root_path="")
+def gemini_error_response(exc: Exception):
+    if isinstance(exc, gemini_client.GeminiTimeoutError):
+        return JSONResponse(status_code=504, content={"success": {}, "error": {"description": str(exc)}})
+    return JSONResponse(status_code=499, content={"success": {}, "error": {"description": str(exc)}})
+
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origin_regex=r"https?://.*",
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+router = APIRouter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging.basicConfig(level=logging.INFO)
+    await telegram_notifier.get_notifier().start()
+    token_reaper.start()
+    await audio_jobs.get_worker().start()
+    try:
+        yield
+    finally:
+        await audio_jobs.get_worker().stop()
+        await telegram_notifier.get_notifier().stop()
+        await token_reaper.stop()
+        password_hashing.shutdown()
 
-@app.exception_handler(SQLAlchemyError)
 async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
     error_message = str(exc)
     
@@ -166,123 +117,99 @@ async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
         content={"detail": f"Database error: {error_message}"})
 
 
-allowed_file_types = ["audio/wav", "audio/mp3", "audio/aiff", "audio/aac", "audio/ogg", "audio/flac", "audio/x-wav", "audio/mpeg"]
+def set_next_cursor(response: Response, rows, model, limit: int):
+    cursor = pagination.next_cursor(rows, pagination.keyset_columns(model), limit)
+    if cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = cursor
+
 
-@app.post("/stt/")
-async def transcribe_audio(audio: UploadFile = File(None), current_user: auth_models.User = Depends(get_current_user)):
+@router.post("/stt/")
+async def transcribe_audio(request: Request, audio: UploadFile = File(None), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    upload = None
     try:
         if audio is None:
             return JSONResponse(status_code=400, content={"success": {}, "error": {"description": {"Please upload a file!"}}})
         
-        contents = await audio.read()
-        kind = filetype.guess(contents)
-        print(kind.mime, "file type")
+        upload = await audio_intake.read_upload(audio)
+        print(upload.mime_type, "file type")
         print("file name", audio.filename)
-
-        if kind is None or kind.mime not in allowed_file_types:
-            return JSONResponse(status_code=400, content={"success": {}, "error": {"description": f"Invalid file type. Only following audio files are accepted {allowed_file_types}."}})
+        upload = await run_in_threadpool(audio_preprocess.maybe_preprocess, upload)
         
         prompt = "Extract text from audio, conversation might happen only in three language uzbek, english, and russian. Print text in uzbek"
 
-        extracted_text = process_audio(contents, kind.mime, prompt)
+        extracted_text = await process_audio(upload, prompt, request=request)
         
         return JSONResponse(status_code=200, content={"success": {"result": extracted_text}, "error": {}})
     
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"success": {}, "error": {"description": e.detail}})
+    except (gemini_client.GeminiTimeoutError, gemini_client.ClientDisconnectedError) as e:
+        return gemini_error_response(e)
     except Exception as e:
         return JSONResponse(status_code=400, content={"success": {}, "error": {"description": str(e)}})
+    finally:
+        if upload is not None:
+            await upload.release()
+            upload.close()
 
 
-@app.post("/summarize_order_from_audio/")
-async def process_audio_file(background_tasks: BackgroundTasks, audio: UploadFile = File(None), current_user: auth_models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.post("/summarize_order_from_audio/")
+async def process_audio_file(request: Request, audio: UploadFile = File(None), webhook_url: Optional[str] = Form(None, max_length=2000), async_mode: bool = Query(False, alias="async"), idempotency_key: Optional[str] = Header(None, max_length=200), current_user: auth_schemas.UserSummary = Depends(get_current_user), db: Session = Depends(get_db)):
+    upload = None
     try:
         if audio is None:
             return JSONResponse(status_code=400, content={"success": {}, "error": {"description": {"Please upload a file!"}}})
         
-        contents = await audio.read()
-        kind = filetype.guess(contents)
+        upload = await audio_intake.read_upload(audio)
         print("file name", audio.filename)
-
-        if kind is None or kind.mime not in allowed_file_types:
-            return JSONResponse(status_code=400, content={"success": {}, "error": {"description": f"Invalid file type. Only following audio files are accepted {allowed_file_types}."}})
         
-        if current_user.organization_id:
-            products = auth_crud.get_products_by_organization(db, current_user.organization_id)
-            # products_data = {product.label_for_ai: product.id for product in products}
-            products_data = [{"id": product.id, "label_for_ai": product.label_for_ai, "name": product.name} for product in products]
-            # products_data = [{"id": product.id, "name": product.name} for product in products]
-            print(products_data)
-        else:
-            products_data = list()
+        catalog = catalog_cache.get_catalog(db, current_user.organization_id)
 
         filename = f"{datetime.utcnow().isoformat()}_{audio.filename}"
         
-        mime_type = kind.mime
-        instruction = """
-            Rules:
-            - Analyze the conversation and return only the final confirmed orders.
-            - Include ONLY products present in the list above.
-            - Exclude any item not in the list, even if it's mentioned.
-            - Do NOT include items that were canceled, changed, or rejected.
-            - The conversation may be in Uzbek, Russian, Tajik, or English. Match appropriately.
-            - Tajik translations: Small - Xutarak, Medium - Sredniy, Large - Kalun.
-            - If no valid items are confirmed, return: []
-            """
-
-        if current_user.organization_id:
-            org_prompt = prompt_crud.get_prompt_by_organization(db, current_user.organization_id)
-            if org_prompt:
-                instruction = instruction + "\t" + org_prompt.prompt_text
-                
-        prompt = f"""
-            You are an expert assistant that extracts confirmed product orders from conversation audio.
-
-            Here is a list of valid products you must match against:
-            {products_data}
-
-
-            {instruction}
-
-            Return a JSON list with no extra explanation, in this exact format:
-            [
-                {{"id": 1, "quantity": 1}},
-                {{"id": 2, "quantity": 2}}
-            ]
-            """
-        print(instruction)
-
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            # model = "gemini-2.5-flash-preview-05-20",
-            contents=[prompt, types.Part.from_bytes(
-                    data=contents,
-                    mime_type=mime_type
-                )],
-
-            config={
-                "response_mime_type": "application/json",
-                "response_schema": list[Item],
-            }
-        )
-
-        # print(response.text)
-
-        orders: list[Item] = response.parsed
-        orders_data = [{"item_id": dict(item)["id"], "quantity": dict(item)["quantity"]} for item in orders]
-        orders_data_for_bot = [{"item_id": dict(item)["id"], "quantity": dict(item)["quantity"]} for item in orders]
-        for order in orders_data_for_bot:
-            for product in products_data:
-                if product["id"] == order["item_id"]:
-                    order["label_for_ai"] = product["label_for_ai"]
-                    order["name"] = product["name"]
-
-        background_tasks.add_task(send_to_telegram, contents, filename, orders_data_for_bot)
+        prefix = await prompt_builder.get_prefix(db, catalog, "audio")
+
+        cache_keys = [
+            result_cache.idempotency_key("audio", current_user.organization_id, current_user.id, idempotency_key) if idempotency_key else None,
+            result_cache.content_key("audio", upload.sha256, prefix),
+        ]
+        cached_orders = await run_in_threadpool(result_cache.lookup, cache_keys)
+        if cached_orders is not None:
+            return JSONResponse(status_code=200, content={"success": cached_orders, "error": {}}, headers={result_cache.RESULT_CACHE_HEADER: "hit"})
+
+        upload = await run_in_threadpool(audio_preprocess.maybe_preprocess, upload)
+
+        if async_mode:
+            if webhook_url:
+                try:
+                    await run_in_threadpool(audio_jobs.resolve_webhook_url, webhook_url)
+                except audio_jobs.UnsafeWebhookUrl as e:
+                    return JSONResponse(status_code=400, content={"success": {}, "error": {"description": str(e)}})
+            job = await run_in_threadpool(audio_jobs.enqueue, db, upload, current_user.organization_id, current_user.id, cache_keys, webhook_url)
+            return JSONResponse(
+                status_code=202,
+                content={"success": {"job_id": job.id, "status": job.status}, "error": {}},
+                headers={"Location": f"/jobs/{job.id}"}
+            )
+
+        orders_data = await order_extraction.extract_audio_orders(prefix, upload, request=request)
+        orders_data_for_bot = order_extraction.with_product_names(orders_data, catalog)
+
+        await run_in_threadpool(result_cache.store, cache_keys, orders_data)
+
+        telegram_notifier.get_notifier().notify_order(upload.hand_off(), filename, orders_data_for_bot)
         return JSONResponse(
             status_code=200,
             content={
                 "success": orders_data,
                 "error": {} 
-            }
+            },
+            headers={result_cache.RESULT_CACHE_HEADER: "miss"}
         )
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"success": {}, "error": {"description": e.detail}})
+    except (gemini_client.GeminiTimeoutError, gemini_client.ClientDisconnectedError) as e:
+        return gemini_error_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -291,131 +218,117 @@ async def process_audio_file(background_tasks: BackgroundTasks, audio: UploadFil
                 "error": str(e)
             }
         )
+    finally:
+        if upload is not None:
+            await upload.release()
+            upload.close()
         
     
-@app.post("/summarize_order_from_audio_new/")
-async def process_audio_file(background_tasks: BackgroundTasks, audio: UploadFile = File(None), current_user: auth_models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.post("/summarize_order_from_audio_new/")
+async def process_audio_file(request: Request, audio: UploadFile = File(None), conversation_id: Optional[str] = Form(None, max_length=100), incremental: bool = Form(False), idempotency_key: Optional[str] = Header(None, max_length=200), current_user: auth_schemas.UserSummary = Depends(get_current_user), db: Session = Depends(get_db)):
+    upload = None
     try:
         if audio is None:
             return JSONResponse(status_code=400, content={"success": {}, "error": {"description": {"Please upload a file!"}}})
         
-        contents = await audio.read()
-        kind = filetype.guess(contents)
+        upload = await audio_intake.read_upload(audio)
         print("file name", audio.filename)
-
-        if kind is None or kind.mime not in allowed_file_types:
-            return JSONResponse(status_code=400, content={"success": {}, "error": {"description": f"Invalid file type. Only following audio files are accepted {allowed_file_types}."}})
         
-        if current_user.organization_id:
-            products = auth_crud.get_products_by_organization(db, current_user.organization_id)
-            products_data = [{"id": product.id, "label_for_ai": product.label_for_ai, "name": product.name} for product in products]
-        else:
-            products_data = list()
+        catalog = catalog_cache.get_catalog(db, current_user.organization_id)
 
         filename = f"{datetime.utcnow().isoformat()}_{audio.filename}"
         
-        mime_type = kind.mime
+        prefix = await prompt_builder.get_prefix(db, catalog, "conversation")
+
+        # A retried chunk must not be appended to the conversation a second time.
+        conversation_key = transcription_store.session_key(current_user.organization_id, current_user.id, conversation_id)
+        cache_keys = [
+            result_cache.idempotency_key("conversation", current_user.organization_id, current_user.id, idempotency_key) if idempotency_key else None,
+            result_cache.content_key("conversation", upload.sha256, prefix, conversation_key),
+        ]
+        cached_orders = await run_in_threadpool(result_cache.lookup, cache_keys)
+        if cached_orders is not None:
+            return JSONResponse(
+                status_code=200,
+                content={"success": cached_orders, "conversation_id": conversation_id, "error": {}},
+                headers={result_cache.RESULT_CACHE_HEADER: "hit"}
+            )
+
+        upload = await run_in_threadpool(audio_preprocess.maybe_preprocess, upload)
         
         transcription_prompt = f"""
             Transcribe the audio content accurately. Return only the transcription, no explanations or formatting. The conversation may be in Uzbek, Russian, Tajik, or English.
         """
         
-        transcription_response = client.models.generate_content(
-            model="gemini-2.0-flash",
+        transcription_response = await gemini_client.generate_content(
             contents=[
                 transcription_prompt, 
-                types.Part.from_bytes(data=contents, mime_type=mime_type)
-            ]
+                await upload.gemini_part()
+            ],
+            request=request
         )
         transcription_text = transcription_response.text
         
+        store = transcription_store.get_store()
+        current_orders = None
         if current_user.organization_id:
-            org_id = current_user.organization_id
-            
-            if org_id in pending_transcriptions:
-                pending_transcriptions[org_id]["text"] += " " + transcription_text
-
-                pending_transcriptions[org_id]["last_updated"] = datetime.utcnow()
-                print(pending_transcriptions[org_id]["text"])
-                # print(f"Appended new transcription for organization {org_id}")
-            else:
-                pending_transcriptions[org_id] = {
-                    "text": transcription_text,
-                    "last_updated": datetime.utcnow()
-                }
-                # print(f"Created new transcription for organization {org_id}")
+            session_key = transcription_store.session_key(current_user.organization_id, current_user.id, conversation_id)
             
-            current_transcription = pending_transcriptions[org_id]["text"]
+            if incremental:
+                current_orders = await run_in_threadpool(store.get_orders, session_key)
+            current_transcription = await run_in_threadpool(store.append, session_key, transcription_text)
+            print(current_transcription)
         else:
+            session_key = None
             current_transcription = transcription_text
         
-        instruction = """
-                Your task:
-                - Analyze the entire conversation transcript to determine the final, confirmed list of products and their quantities.
-                - Maintain a running list of orders. If a product is mentioned multiple times, always use the quantity and variant from its *latest confirmed mention*.
-                - Update product quantities or variants if they are changed or clarified in later parts of the conversation. For example, if a user orders 1 cappuccino and then later says "no, I want 2 cappuccinos", update the quantity to 2.
-                - Include ONLY products present in the provided list. Exclude any item not in the list, even if it's mentioned.
-                - **CRITICAL**: If a product is explicitly and clearly canceled by the user (e.g., "I don't need cappuccino anymore", "remove the latte", "cancel the burger"), **it MUST be entirely excluded from the final JSON output**. Do NOT include canceled products, even with a quantity of zero or by reducing their quantity. They should simply not appear in the final list.
-                - The conversation may be in Uzbek, Russian, Tajik, or English. Match product names and sizes appropriately.
-                - Tajik translations: Small - Xutarak, Medium - Sredniy, Large - Kalun.
-                - Return only confirmed items. Do not assume anything not clearly confirmed.
-                - If no valid or confirmed products are mentioned throughout the *entire* conversation, or if all previously ordered items are canceled, return: []
-        """
-
-        if current_user.organization_id:
-            org_prompt = prompt_crud.get_prompt_by_organization(db, current_user.organization_id)
-            if org_prompt:
-                instruction = instruction + "\t" + org_prompt.prompt_text
-                
-        prompt = f"""
-            You are an expert assistant that extracts confirmed product orders from conversation text.
-
-            Here is a list of valid products you must match against:
-            {products_data}
-
-            Here is the conversation transcript:
-            {current_transcription}
-
-            {instruction}
-
-            Return a JSON list with no extra explanation, in this exact format:
-            [
-                {{"id": <product_id>, "quantity": <number>}},
-                ...
-            ]
-            """
-        # print(instruction)
+        conversation = prompt_builder.conversation_suffix(
+            transcription_text if incremental and session_key else current_transcription,
+            current_orders,
+            incremental=bool(incremental and session_key)
+        )
 
         # print(current_transcription, "-------\n")
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[prompt],
+        response = await context_cache.generate_content(
+            prefix,
+            [conversation],
             config={
                 "response_mime_type": "application/json",
                 "response_schema": list[Item],
-            }
+            },
+            request=request
         )
 
         print(response.text, "------ model response")
 
         orders: list[Item] = response.parsed
+        if session_key:
+            await run_in_threadpool(store.set_orders, session_key, [{"id": item.id, "quantity": item.quantity} for item in orders])
         orders_data = [{"item_id": dict(item)["id"], "quantity": dict(item)["quantity"]} for item in orders]
         # orders_data_for_bot = [{"item_id": dict(item)["id"], "quantity": dict(item)["quantity"]} for item in orders]
         for order in orders_data:
-            for product in products_data:
-                if product["id"] == order["item_id"]:
-                    order["label_for_ai"] = product["label_for_ai"]
-                    order["name"] = product["name"]
+            product = catalog.by_id.get(order["item_id"])
+            if product:
+                order["label_for_ai"] = product["label_for_ai"]
+                order["name"] = product["name"]
 
-        background_tasks.add_task(send_to_telegram, contents, filename, orders_data)
+        await run_in_threadpool(result_cache.store, cache_keys, orders_data)
+
+        telegram_notifier.get_notifier().notify_order(upload.hand_off(), filename, orders_data)
         return JSONResponse(
             status_code=200,
             content={
                 "success": orders_data,
+                "conversation_id": conversation_id,
                 "error": {} 
-            }
+            },
+            headers={result_cache.RESULT_CACHE_HEADER: "miss"}
         )
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"success": {}, "error": {"description": e.detail}})
+    except (gemini_client.GeminiTimeoutError, gemini_client.ClientDisconnectedError) as e:
+        return gemini_error_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -424,60 +337,109 @@ async def process_audio_file(background_tasks: BackgroundTasks, audio: UploadFil
                 "error": str(e)
             }
         )
+    finally:
+        if upload is not None:
+            await upload.release()
+            upload.close()
+
+    
+@router.get("/jobs/{job_id}", response_model=schemas.AudioJob)
+async def read_audio_job(job_id: str, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    job = audio_jobs.get_job(db, job_id)
+    if job is None or (not current_user.is_admin and job.user_id != current_user.id and
+                       (current_user.organization_id is None or current_user.organization_id != job.organization_id)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return schemas.AudioJob(
+        id=job.id,
+        status=job.status,
+        orders=json.loads(job.result) if job.result else None,
+        error=job.error,
+        attempts=job.attempts,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
 
-    
-@app.post("/orders/", response_model=schemas.Order)
-async def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+
+@router.post("/orders/", response_model=schemas.Order)
+async def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     if not current_user.organization_id:
         raise HTTPException(status_code=403, detail="User must belong to an organization to create orders")
     
-    if current_user.organization_id in pending_transcriptions:
-        del pending_transcriptions[current_user.organization_id]
-        print(f"Cleared pending transcriptions for organization {current_user.organization_id}")
+    transcription_store.get_store().clear(transcription_store.session_key(current_user.organization_id, current_user.id, order.conversation_id))
     
-    db_order = models.Order(total_price=0.0, organization_id=current_user.organization_id)
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    products = {product.id: product for product in auth_crud.get_products_by_ids(db, {item.item_id for item in order.items})}
     
-    total_price = 0.0
     for item in order.items:
-        product = auth_crud.get_product(db, item.item_id)
+        product = products.get(item.item_id)
         if not product:
-            db.delete(db_order)
-            db.commit()
             raise HTTPException(status_code=400, detail=f"Product with ID {item.item_id} not found")
         
         if product.organization_id != current_user.organization_id:
-            db.delete(db_order)
-            db.commit()
             raise HTTPException(status_code=403, detail=f"Product with ID {item.item_id} does not belong to your organization")
-        
-        db_item = models.OrderItem(
-            order_id=db_order.id,
-            item_id=item.item_id,
-            quantity=item.quantity,
-            price=product.price
-        )
-        db.add(db_item)
-        total_price += product.price * item.quantity
     
-    db_order.total_price = total_price
+    db_order = models.Order(total_price=0, organization_id=current_user.organization_id)
+    db.add(db_order)
+    db.flush()
+    
+    if order.items:
+        db.execute(insert(models.OrderItem), [
+            {
+                "order_id": db_order.id,
+                "item_id": item.item_id,
+                "quantity": item.quantity,
+                "price": products[item.item_id].price
+            }
+            for item in order.items
+        ])
+    crud.compute_order_totals(db, [db_order])
+    order_analytics.add_orders(db, [order_analytics.snapshot(
+        db_order, [(item.item_id, item.quantity, products[item.item_id].price) for item in order.items]
+    )])
+    
     db.commit()
     db.refresh(db_order)
     return db_order
 
-@app.get("/orders/", response_model=List[schemas.Order])
-async def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
-    if current_user.organization_id:
-        return db.query(models.Order).filter(models.Order.organization_id == current_user.organization_id).offset(skip).limit(limit).all()
-    if current_user.is_admin:
-        return db.query(models.Order).offset(skip).limit(limit).all()
-    return []
+@router.post("/orders/bulk")
+async def bulk_create_orders(request: Request, batch_size: int = Query(bulk_orders.BULK_ORDER_BATCH_SIZE, ge=1, le=10000), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    if not current_user.organization_id:
+        raise HTTPException(status_code=403, detail="User must belong to an organization to create orders")
+    
+    body = await bulk_orders.spool_request_body(request)
+    return StreamingResponse(
+        bulk_orders.stream_results(body, current_user.organization_id, batch_size),
+        media_type="application/x-ndjson"
+    )
 
-@app.get("/orders/{order_id}", response_model=schemas.Order)
-async def read_order(order_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
-    db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
+@router.get("/orders/export")
+async def export_orders(format: str = Query("csv", pattern="^(csv|ndjson|columnar|parquet)$"), start: Optional[date] = None, end: Optional[date] = None, organization_id: Optional[int] = None, current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    check_date_range(start, end)
+    organization_id = report_organization(current_user, organization_id)
+    if format == "parquet" and not order_export.parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server; use format=columnar")
+    
+    media_type, extension = order_export.EXPORT_FORMATS[format]
+    return StreamingResponse(
+        order_export.stream_export(format, organization_id, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{extension}"'}
+    )
+
+@router.get("/orders/", response_model=List[schemas.Order])
+async def read_orders(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    statement = select(models.Order).options(selectinload(models.Order.items))
+    if current_user.organization_id:
+        statement = statement.where(models.Order.organization_id == current_user.organization_id)
+    elif not current_user.is_admin:
+        return []
+    orders = await fetch_all(db, pagination.paginate(statement, pagination.keyset_columns(models.Order), skip, limit, cursor))
+    set_next_cursor(response, orders, models.Order, limit)
+    return orders
+
+@router.get("/orders/{order_id}", response_model=schemas.Order)
+async def read_order(order_id: int, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    db_order = await fetch_first(db, select(models.Order).options(selectinload(models.Order.items)).where(models.Order.id == order_id))
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -486,8 +448,8 @@ async def read_order(order_id: int, db: Session = Depends(get_db), current_user:
     
     return db_order
 
-@app.put("/orders/{order_id}", response_model=schemas.Order)
-async def update_order(order_id: int, order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.put("/orders/{order_id}", response_model=schemas.Order)
+async def update_order(order_id: int, order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -495,9 +457,10 @@ async def update_order(order_id: int, order: schemas.OrderCreate, db: Session =
     if not current_user.is_admin and (current_user.organization_id is None or current_user.organization_id != db_order.organization_id):
         raise HTTPException(status_code=403, detail="Access denied")
     
+    previous = order_analytics.load_snapshot(db, db_order)
     db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).delete()
     
-    total_price = 0.0
+    items = []
     for item_data in order.items:
         product = auth_crud.get_product(db, item_data.item_id)
         if not product:
@@ -515,18 +478,18 @@ async def update_order(order_id: int, order: schemas.OrderCreate, db: Session =
             price=item_price
         )
         db.add(db_item)
-        
-        item_total = item_price * item_data.quantity
-        total_price += item_total
+        items.append((item_data.item_id, item_data.quantity, item_price))
     
-    db_order.total_price = total_price
+    crud.compute_order_totals(db, [db_order])
+    order_analytics.remove_orders(db, [previous])
+    order_analytics.add_orders(db, [order_analytics.snapshot(db_order, items)])
     
     db.commit()
     db.refresh(db_order)
     return db_order
 
-@app.delete("/orders/{order_id}", response_model=bool)
-async def delete_order(order_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.delete("/orders/{order_id}", response_model=bool)
+async def delete_order(order_id: int, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -534,6 +497,7 @@ async def delete_order(order_id: int, db: Session = Depends(get_db), current_use
     if not current_user.is_admin and (current_user.organization_id is None or current_user.organization_id != db_order.organization_id):
         raise HTTPException(status_code=403, detail="Access denied")
     
+    order_analytics.remove_orders(db, [order_analytics.load_snapshot(db, db_order)])
     db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).delete()
     
     db.delete(db_order)
@@ -542,8 +506,39 @@ async def delete_order(order_id: int, db: Session = Depends(get_db), current_use
     return True
 
 
-@app.post("/organization-prompts/", response_model=schemas.OrganizationPrompt)
-async def create_organization_prompt(prompt: schemas.OrganizationPromptCreate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+def report_organization(current_user: auth_schemas.UserSummary, organization_id: Optional[int]) -> Optional[int]:
+    """Organization whose reports the user may see; admins without one pick any, or None for all."""
+    if current_user.organization_id:
+        return current_user.organization_id
+    if current_user.is_admin:
+        return organization_id
+    raise HTTPException(status_code=403, detail="User must belong to an organization to view reports")
+
+def check_date_range(start: Optional[date], end: Optional[date]):
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+@router.get("/analytics/sales", response_model=List[schemas.SalesPeriod])
+async def read_sales(start: Optional[date] = None, end: Optional[date] = None, granularity: str = Query("day", pattern="^(day|hour)$"), organization_id: Optional[int] = None, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    check_date_range(start, end)
+    statement = order_analytics.sales_statement(report_organization(current_user, organization_id), start, end, granularity)
+    return order_analytics.sales_rows(await fetch_rows(db, statement))
+
+@router.get("/analytics/top-products", response_model=List[schemas.ProductSales])
+async def read_top_products(start: Optional[date] = None, end: Optional[date] = None, limit: int = Query(10, ge=1, le=100), order_by: str = Query("revenue", pattern="^(revenue|quantity)$"), organization_id: Optional[int] = None, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    check_date_range(start, end)
+    statement = order_analytics.top_products_statement(report_organization(current_user, organization_id), start, end, limit, order_by)
+    return order_analytics.product_rows(await fetch_rows(db, statement))
+
+@router.get("/analytics/categories", response_model=List[schemas.CategorySales])
+async def read_category_sales(start: Optional[date] = None, end: Optional[date] = None, organization_id: Optional[int] = None, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    check_date_range(start, end)
+    statement = order_analytics.category_statement(report_organization(current_user, organization_id), start, end)
+    return order_analytics.product_rows(await fetch_rows(db, statement), key="category_id")
+
+
+@router.post("/organization-prompts/", response_model=schemas.OrganizationPrompt)
+async def create_organization_prompt(prompt: schemas.OrganizationPromptCreate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     if not current_user.is_admin:
         if current_user.organization_id is None:
             raise HTTPException(status_code=403, detail="You must belong to an organization to create prompts")
@@ -552,8 +547,8 @@ async def create_organization_prompt(prompt: schemas.OrganizationPromptCreate, d
     
     return prompt_crud.create_organization_prompt(db=db, prompt=prompt)
 
-@app.get("/organization-prompts/", response_model=List[schemas.OrganizationPrompt])
-async def read_organization_prompts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.get("/organization-prompts/", response_model=List[schemas.OrganizationPrompt])
+async def read_organization_prompts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     if current_user.is_admin:
         return prompt_crud.get_all_prompts(db, skip=skip, limit=limit)
     
@@ -563,8 +558,8 @@ async def read_organization_prompts(skip: int = 0, limit: int = 100, db: Session
     
     return []
 
-@app.get("/organization-prompts/{organization_id}", response_model=schemas.OrganizationPrompt)
-async def read_organization_prompt(organization_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.get("/organization-prompts/{organization_id}", response_model=schemas.OrganizationPrompt)
+async def read_organization_prompt(organization_id: int, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     if not current_user.is_admin and current_user.organization_id != organization_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -574,23 +569,23 @@ async def read_organization_prompt(organization_id: int, db: Session = Depends(g
     
     return prompt
 
-@app.put("/organization-prompts/{organization_id}", response_model=schemas.OrganizationPrompt)
-async def update_organization_prompt(organization_id: int, prompt: schemas.OrganizationPromptUpdate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.put("/organization-prompts/{organization_id}", response_model=schemas.OrganizationPrompt)
+async def update_organization_prompt(organization_id: int, prompt: schemas.OrganizationPromptUpdate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     if not current_user.is_admin and current_user.organization_id != organization_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
     return prompt_crud.update_organization_prompt(db=db, organization_id=organization_id, prompt_data=prompt)
 
-@app.delete("/organization-prompts/{organization_id}")
-async def delete_organization_prompt(organization_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.delete("/organization-prompts/{organization_id}")
+async def delete_organization_prompt(organization_id: int, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     if not current_user.is_admin and current_user.organization_id != organization_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
     return prompt_crud.delete_organization_prompt(db=db, organization_id=organization_id)
 
 
-@app.post("/categories/", response_model=schemas.Category)
-async def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.post("/categories/", response_model=schemas.Category)
+async def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     try:
         if not current_user.is_admin:
             if current_user.organization_id is None:
@@ -608,16 +603,19 @@ async def create_category(category: schemas.CategoryCreate, db: Session = Depend
         logging.error(f"Error creating category: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while creating the category: {str(e)}")
 
-@app.get("/categories/", response_model=List[schemas.Category])
-async def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.get("/categories/", response_model=List[schemas.Category])
+async def read_categories(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    statement = select(models.Category)
     if current_user.organization_id:
-        return category_crud.get_categories_by_organization(db, organization_id=current_user.organization_id, skip=skip, limit=limit)
-    if current_user.is_admin:
-        return category_crud.get_all_categories(db, skip=skip, limit=limit)
-    return []
-
-@app.get("/categories/{category_id}", response_model=schemas.Category)
-async def read_category(category_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+        statement = statement.where(models.Category.organization_id == current_user.organization_id)
+    elif not current_user.is_admin:
+        return []
+    categories = await fetch_all(db, pagination.paginate(statement, pagination.keyset_columns(models.Category), skip, limit, cursor))
+    set_next_cursor(response, categories, models.Category, limit)
+    return categories
+
+@router.get("/categories/{category_id}", response_model=schemas.Category)
+async def read_category(category_id: int, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     db_category = category_crud.get_category(db, category_id=category_id)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -625,8 +623,8 @@ async def read_category(category_id: int, db: Session = Depends(get_db), current
         raise HTTPException(status_code=403, detail="Access denied")
     return db_category
 
-@app.put("/categories/{category_id}", response_model=schemas.Category)
-async def update_category(category_id: int, category: schemas.CategoryCreate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.put("/categories/{category_id}", response_model=schemas.Category)
+async def update_category(category_id: int, category: schemas.CategoryCreate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     try:
         db_category = category_crud.get_category(db, category_id=category_id)
         if db_category is None:
@@ -651,8 +649,8 @@ async def update_category(category_id: int, category: schemas.CategoryCreate, db
         logging.error(f"Error updating category: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while updating the category: {str(e)}")
 
-@app.delete("/categories/{category_id}")
-async def delete_category(category_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.delete("/categories/{category_id}")
+async def delete_category(category_id: int, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     try:
         db_category = category_crud.get_category(db, category_id=category_id)
         if db_category is None:
@@ -671,40 +669,50 @@ async def delete_category(category_id: int, db: Session = Depends(get_db), curre
         logging.error(f"Error deleting category: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while deleting the category: {str(e)}")
 
-@app.post("/register/", response_model=auth_schemas.User)
+@router.post("/register/", response_model=auth_schemas.UserSummary)
 async def register_user(user: auth_schemas.UserCreate, db: Session = Depends(get_db)):
-    return auth_crud.create_user(db=db, user=user)
+    hashed_password = await password_hashing.hash_password(user.password)
+    return auth_crud.create_user(db=db, user=user, hashed_password=hashed_password)
 
-@app.post("/login/", response_model=auth_schemas.Token)
+@router.post("/login/", response_model=auth_schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(auth_models.User).filter(auth_models.User.username == form_data.username).first()
     
-    if not user or not user.verify_password(form_data.password):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await password_hashing.verify_and_update(form_data.password, user.hashed_password)
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if new_hash:
+        user = auth_crud.update_user(db, user.id, hashed_password=new_hash)
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=access_token_claims(user), expires_delta=access_token_expires
     )
     
     refresh_token, _ = create_refresh_token(db, user.id)
     
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
-@app.post("/refresh/", response_model=auth_schemas.Token)
+@router.post("/refresh/", response_model=auth_schemas.Token)
 async def refresh_access_token(refresh_request: auth_schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
-    if not is_valid_refresh_token(db, refresh_request.refresh_token):
+    rotated = rotate_refresh_token(db, refresh_request.refresh_token)
+    if not rotated:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = get_user_from_refresh_token(db, refresh_request.refresh_token)
+    refresh_token, user_id = rotated
+    user = auth_crud.get_user(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -714,12 +722,12 @@ async def refresh_access_token(refresh_request: auth_schemas.RefreshTokenRequest
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=access_token_claims(user), expires_delta=access_token_expires
     )
     
-    return {"access_token": access_token, "refresh_token": refresh_request.refresh_token, "token_type": "bearer"}
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
-@app.post("/logout/")
+@router.post("/logout/")
 async def logout(refresh_request: auth_schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
     success = revoke_refresh_token(db, refresh_request.refresh_token)
     if not success:
@@ -730,13 +738,19 @@ async def logout(refresh_request: auth_schemas.RefreshTokenRequest, db: Session
     
     return {"message": "Successfully logged out"}
 
-@app.get("/users/me/", response_model=auth_schemas.User)
-async def read_users_me(current_user: auth_models.User = Depends(get_current_user)):
+@router.get("/users/me/", response_model=auth_schemas.UserSummary)
+async def read_users_me(current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     return current_user
 
+@router.get("/users/me/sessions", response_model=List[auth_schemas.Session])
+async def read_user_sessions(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    sessions = auth_crud.get_user_sessions(db, current_user.id, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, sessions, auth_models.RefreshToken, limit)
+    return sessions
 
-@app.post("/products/", response_model=schemas.Product)
-async def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+
+@router.post("/products/", response_model=schemas.Product)
+async def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     try:
         if not current_user.is_admin:
             if current_user.organization_id is None:
@@ -754,25 +768,28 @@ async def create_product(product: schemas.ProductCreate, db: Session = Depends(g
         logging.error(f"Error creating product: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while creating the product: {str(e)}")
 
-@app.get("/products/", response_model=List[schemas.Product])
-async def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.get("/products/", response_model=List[schemas.Product])
+async def read_products(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    statement = select(models.Product)
     if current_user.organization_id:
-        return auth_crud.get_products_by_organization(db, organization_id=current_user.organization_id, skip=skip, limit=limit)
-    if current_user.is_admin:
-        return db.query(models.Product).offset(skip).limit(limit).all()
-    return []
-
-@app.get("/products/{product_id}", response_model=schemas.Product)
-async def read_product(product_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
-    db_product = auth_crud.get_product(db, product_id=product_id)
+        statement = statement.where(models.Product.organization_id == current_user.organization_id)
+    elif not current_user.is_admin:
+        return []
+    products = await fetch_all(db, pagination.paginate(statement, pagination.keyset_columns(models.Product), skip, limit, cursor))
+    set_next_cursor(response, products, models.Product, limit)
+    return products
+
+@router.get("/products/{product_id}", response_model=schemas.Product)
+async def read_product(product_id: int, db = Depends(get_read_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
+    db_product = await fetch_first(db, select(models.Product).where(models.Product.id == product_id))
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     if not current_user.is_admin and current_user.organization_id != db_product.organization_id:
         raise HTTPException(status_code=403, detail="Access denied")
     return db_product
 
-@app.put("/products/{product_id}", response_model=schemas.Product)
-async def update_product(product_id: int, product: schemas.ProductCreate, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.put("/products/{product_id}", response_model=schemas.Product)
+async def update_product(product_id: int, product: schemas.ProductCreate, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     try:
         db_product = auth_crud.get_product(db, product_id=product_id)
         if db_product is None:
@@ -797,8 +814,8 @@ async def update_product(product_id: int, product: schemas.ProductCreate, db: Se
         logging.error(f"Error updating product: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while updating the product: {str(e)}")
 
-@app.delete("/products/{product_id}")
-async def delete_product(product_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+@router.delete("/products/{product_id}")
+async def delete_product(product_id: int, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
     try:
         db_product = auth_crud.get_product(db, product_id=product_id)
         if db_product is None:
@@ -818,16 +835,35 @@ async def delete_product(product_id: int, db: Session = Depends(get_db), current
         raise HTTPException(status_code=500, detail=f"An error occurred while deleting the product: {str(e)}")
 
 # @app.put("/users/{user_id}/organization/{organization_id}", response_model=auth_schemas.User)
-# async def assign_user_to_organization(user_id: int, organization_id: int, db: Session = Depends(get_db), current_user: auth_models.User = Depends(get_current_user)):
+# async def assign_user_to_organization(user_id: int, organization_id: int, db: Session = Depends(get_db), current_user: auth_schemas.UserSummary = Depends(get_current_user)):
 #     if not current_user.is_admin:
 #         raise HTTPException(status_code=403, detail="Only admin users can assign users to organizations")
 #     return auth_crud.update_user_organization(db=db, user_id=user_id, organization_id=organization_id)
 
 
-@app.get("/")
+@router.get("/")
 async def main_page():
     return JSONResponse(status_code=200, content={"status": "test app is working!"})
 
 
+def create_app() -> FastAPI:
+    """Build the application. Nothing here touches the database or Gemini; run ``python setup_db.py init-db`` first."""
+    app = FastAPI(title="Order Automation API", root_path="", lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origin_regex=r"https?://.*",
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"]
+    )
+    app.add_middleware(audio_intake.UploadLimitMiddleware)
+    app.add_exception_handler(SQLAlchemyError, sqlalchemy_exception_handler)
+    app.include_router(router)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=6000, reload=True, forwarded_allow_ips="*")
\ No newline at end of file
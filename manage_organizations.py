@@ -60,9 +60,7 @@ def assign_user_to_organization(db: Session, user_id: int, organization_id: int)
         print(f"Organization with ID {organization_id} not found.")
         return
     
-    user.organization_id = organization_id
-    db.commit()
-    db.refresh(user)
+    user = auth_crud.update_user(db, user.id, organization_id=organization_id)
     print(f"User '{user.username}' (ID: {user.id}) assigned to organization '{org.name}' (ID: {org.id})")
 
 def remove_user_from_organization(db: Session, user_id: int):
@@ -76,9 +74,7 @@ def remove_user_from_organization(db: Session, user_id: int):
         return
     
     old_org_id = user.organization_id
-    user.organization_id = None
-    db.commit()
-    db.refresh(user)
+    user = auth_crud.update_user(db, user.id, organization_id=None)
     print(f"User '{user.username}' (ID: {user.id}) removed from organization (ID: {old_org_id})")
 
 def main():
@@ -0,0 +1,308 @@
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+
+def add_column(table, column, definition):
+    """Step that adds a column unless create_all already made it."""
+    def step(connection):
+        columns = [col["name"] for col in inspect(connection).get_columns(table)]
+        if column not in columns:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+    return step
+
+
+def create_audio_jobs_table(connection):
+    binary = "BYTEA" if connection.dialect.name == "postgresql" else "BLOB"
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS audio_jobs (
+            id VARCHAR(36) PRIMARY KEY,
+            organization_id INTEGER REFERENCES organizations (id),
+            user_id INTEGER NOT NULL,
+            status VARCHAR NOT NULL,
+            filename VARCHAR NOT NULL,
+            mime_type VARCHAR NOT NULL,
+            audio {binary},
+            cache_keys TEXT,
+            webhook_url VARCHAR,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            locked_by VARCHAR,
+            created_at TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """))
+
+
+def backfill_sales_rollups(connection):
+    import order_analytics
+
+    session = Session(bind=connection)
+    try:
+        order_analytics.rebuild(session)
+        session.flush()
+    finally:
+        session.close()
+
+
+MONEY_COLUMNS = [
+    ("products", "price", "NUMERIC(12, 2)"),
+    ("order_items", "price", "NUMERIC(12, 2)"),
+    ("orders", "total_price", "NUMERIC(12, 2)"),
+    ("sales_rollups", "revenue", "NUMERIC(14, 2)"),
+    ("product_sales_rollups", "revenue", "NUMERIC(14, 2)"),
+]
+
+
+def convert_money_columns(connection):
+    for table, column, definition in MONEY_COLUMNS:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {definition} USING ROUND({column}::numeric, 2)"
+            ))
+        else:
+            # SQLite cannot change a column type; rounding the stored values is enough for Numeric to read them back.
+            connection.execute(text(f"UPDATE {table} SET {column} = ROUND({column}, 2)"))
+
+
+KEYSET_TABLES = ["organizations", "categories", "products", "orders", "refresh_tokens"]
+
+
+def require_created_at(connection):
+    """Backfill missing created_at with the epoch (legacy rows are the oldest) and forbid NULL from now on."""
+    for table in KEYSET_TABLES:
+        connection.execute(text(f"UPDATE {table} SET created_at = :epoch WHERE created_at IS NULL"),
+                           {"epoch": datetime(1970, 1, 1)})
+        if connection.dialect.name == "postgresql":
+            connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL"))
+
+
+# Append-only: each entry is (version, description, steps). A step is a SQL
+# string or a callable taking the connection. Never edit a migration that has
+# shipped; add a new one instead.
+MIGRATIONS = [
+    (1, "Indexes for hot order, product, category and token queries", [
+        "CREATE INDEX IF NOT EXISTS ix_orders_organization_id_created_at_id ON orders (organization_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+        "CREATE INDEX IF NOT EXISTS ix_products_organization_id_created_at_id ON products (organization_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_categories_organization_id_created_at_id ON categories (organization_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_organizations_created_at_id ON organizations (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id)",
+    ]),
+    (2, "Table for pending transcriptions shared between workers", [
+        """
+        CREATE TABLE IF NOT EXISTS pending_transcriptions (
+            session_key VARCHAR PRIMARY KEY,
+            text TEXT NOT NULL,
+            last_updated TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_pending_transcriptions_last_updated ON pending_transcriptions (last_updated)",
+    ]),
+    (3, "Structured order state for pending transcriptions", [
+        add_column("pending_transcriptions", "orders", "TEXT"),
+    ]),
+    (4, "Index for paging a user's sessions", [
+        "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id_created_at_id ON refresh_tokens (user_id, created_at, id)",
+    ]),
+    (5, "Table for extraction results of repeated audio uploads", [
+        """
+        CREATE TABLE IF NOT EXISTS cached_results (
+            cache_key VARCHAR PRIMARY KEY,
+            orders TEXT NOT NULL,
+            created_at TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_cached_results_created_at ON cached_results (created_at)",
+    ]),
+    (6, "Durable queue for asynchronous audio extraction", [
+        create_audio_jobs_table,
+        "CREATE INDEX IF NOT EXISTS ix_audio_jobs_status_created_at ON audio_jobs (status, created_at)",
+    ]),
+    (7, "Hourly sales and daily product sales rollups for analytics", [
+        """
+        CREATE TABLE IF NOT EXISTS sales_rollups (
+            organization_id INTEGER NOT NULL REFERENCES organizations (id),
+            day DATE NOT NULL,
+            hour INTEGER NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            revenue FLOAT NOT NULL DEFAULT 0,
+            PRIMARY KEY (organization_id, day, hour)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS product_sales_rollups (
+            organization_id INTEGER NOT NULL REFERENCES organizations (id),
+            day DATE NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue FLOAT NOT NULL DEFAULT 0,
+            PRIMARY KEY (organization_id, day, product_id)
+        )
+        """,
+        backfill_sales_rollups,
+    ]),
+    (8, "Exact NUMERIC money columns and order totals recomputed from their items", [
+        convert_money_columns,
+        """
+        UPDATE orders SET total_price = (
+            SELECT ROUND(SUM(order_items.price * order_items.quantity), 2) FROM order_items WHERE order_items.order_id = orders.id
+        )
+        WHERE EXISTS (SELECT 1 FROM order_items WHERE order_items.order_id = orders.id)
+        """,
+        backfill_sales_rollups,
+    ]),
+    (9, "Non-null created_at on every table paged by (created_at, id)", [
+        require_created_at,
+        # Orders that had no created_at were skipped by the earlier backfills; count them now they have one.
+        backfill_sales_rollups,
+    ]),
+    (10, "Retry delay for failed audio jobs", [
+        add_column("audio_jobs", "available_at", "TIMESTAMP"),
+    ]),
+]
+
+# (name, table, query) for the statements behind the busiest endpoints.
+HOT_QUERIES = [
+    ("orders by organization", "orders",
+     "SELECT * FROM orders WHERE organization_id = 1 ORDER BY created_at, id LIMIT 100"),
+    ("order items by order", "order_items",
+     "SELECT * FROM order_items WHERE order_id IN (1, 2, 3)"),
+    ("products by organization", "products",
+     "SELECT * FROM products WHERE organization_id = 1 ORDER BY created_at, id LIMIT 100"),
+    ("categories by organization", "categories",
+     "SELECT * FROM categories WHERE organization_id = 1 ORDER BY created_at, id LIMIT 100"),
+    ("refresh tokens by user", "refresh_tokens",
+     "SELECT * FROM refresh_tokens WHERE user_id = 1 ORDER BY created_at, id LIMIT 100"),
+    ("refresh token lookup", "refresh_tokens",
+     "SELECT * FROM refresh_tokens WHERE token = 'token'"),
+    ("next queued audio job", "audio_jobs",
+     "SELECT id FROM audio_jobs WHERE status = 'queued' AND (available_at IS NULL OR available_at <= '2024-01-01') ORDER BY created_at LIMIT 1"),
+    ("sales by organization and day", "sales_rollups",
+     "SELECT * FROM sales_rollups WHERE organization_id = 1 AND day >= '2024-01-01'"),
+    ("product sales by organization and day", "product_sales_rollups",
+     "SELECT * FROM product_sales_rollups WHERE organization_id = 1 AND day >= '2024-01-01'"),
+    ("user by username", "users",
+     "SELECT * FROM users WHERE username = 'username'"),
+]
+
+
+def ensure_migrations_table(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    """))
+
+
+def get_applied_versions(connection):
+    return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(bind=engine):
+    with bind.begin() as connection:
+        ensure_migrations_table(connection)
+        applied = get_applied_versions(connection)
+
+    pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+    if not pending:
+        logger.info("Database schema is up to date.")
+        return []
+
+    for version, description, statements in pending:
+        logger.info(f"Applying migration {version}: {description}")
+        with bind.begin() as connection:
+            for statement in statements:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.execute(text(statement))
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:version, :description, :applied_at)"),
+                {"version": version, "description": description, "applied_at": datetime.utcnow()}
+            )
+    logger.info(f"Applied {len(pending)} migration(s).")
+    return [version for version, _, _ in pending]
+
+
+def migration_status(bind=engine):
+    with bind.begin() as connection:
+        ensure_migrations_table(connection)
+        applied = get_applied_versions(connection)
+    return [(version, description, version in applied) for version, description, _ in MIGRATIONS]
+
+
+def _postgres_seq_scans(plan, table):
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == table:
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(_postgres_seq_scans(child, table))
+    return found
+
+
+def check_query_plans(bind=engine):
+    """Return the hot queries whose plan falls back to a sequential scan of their table."""
+    failures = []
+    with bind.connect() as connection:
+        for name, table, query in HOT_QUERIES:
+            if bind.dialect.name == "postgresql":
+                transaction = connection.begin()
+                # Small tables make seq scans cheapest; disabling them shows whether an index exists at all.
+                connection.execute(text("SET LOCAL enable_seqscan = off"))
+                plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).scalar()
+                transaction.rollback()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                if _postgres_seq_scans(plan[0]["Plan"], table):
+                    failures.append((name, query))
+            elif bind.dialect.name == "sqlite":
+                details = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {query}"))]
+                if any(detail.startswith(f"SCAN {table}") and "USING" not in detail for detail in details):
+                    failures.append((name, query))
+            else:
+                raise RuntimeError(f"Query plan check is not supported for {bind.dialect.name}")
+    return failures
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage database schema migrations")
+    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
+    subparsers.add_parser("upgrade", help="Apply all pending migrations")
+    subparsers.add_parser("status", help="List migrations and whether they are applied")
+    subparsers.add_parser("check-plans", help="Fail if a hot query uses a sequential scan")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        run_migrations()
+    elif args.command == "status":
+        for version, description, applied in migration_status():
+            print(f"{version} | {'applied' if applied else 'pending'} | {description}")
+    elif args.command == "check-plans":
+        failures = check_query_plans()
+        for name, query in failures:
+            print(f"Sequential scan in '{name}': {query}")
+        if failures:
+            sys.exit(1)
+        print("All hot queries use indexes.")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
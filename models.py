@@ -1,15 +1,21 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime, Date, Boolean, Text, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
 
+# Exact to the cent; Float drifted when totals were summed and re-summed.
+Money = Numeric(12, 2)
+
 class Organization(Base):
     __tablename__ = "organizations"
+    __table_args__ = (
+        Index("ix_organizations_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     description = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     
     users = relationship("User", back_populates="organization")
     products = relationship("Product", back_populates="organization")
@@ -27,12 +33,15 @@ class Organization(Base):
 
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (
+        Index("ix_categories_organization_id_created_at_id", "organization_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String, nullable=True)
     organization_id = Column(Integer, ForeignKey("organizations.id"))
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     
     organization = relationship("Organization", back_populates="categories")
     products = relationship("Product", back_populates="category")
@@ -48,15 +57,18 @@ class Category(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_organization_id_created_at_id", "organization_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     organization_id = Column(Integer, ForeignKey("organizations.id"))
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     label_for_ai = Column(String)
-    price = Column(Float)
+    price = Column(Money)
     size = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     
     organization = relationship("Organization", back_populates="products")
     category = relationship("Category", back_populates="products")
@@ -67,7 +79,7 @@ class Product(Base):
             "name": self.name,
             "productName": self.name.replace('_', ' ').title(),
             "label_for_ai": self.label_for_ai,
-            "price": self.price,
+            "price": float(self.price) if self.price is not None else None,
             "size": self.size,
             "category_id": self.category_id
         }
@@ -75,10 +87,14 @@ class Product(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_organization_id_created_at_id", "organization_id", "created_at", "id"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    total_price = Column(Float, default=0.0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    total_price = Column(Money, default=0)
     organization_id = Column(Integer, ForeignKey("organizations.id"))
     
     items = relationship("OrderItem", back_populates="order")
@@ -88,7 +104,7 @@ class Order(Base):
         return {
             "id": self.id,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "total_price": self.total_price,
+            "total_price": float(self.total_price) if self.total_price is not None else None,
             "items": [item.to_dict() for item in self.items]
         }
 
@@ -96,10 +112,10 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     item_id = Column(Integer, index=True)
     quantity = Column(Integer)
-    price = Column(Float)
+    price = Column(Money)
     
     order = relationship("Order", back_populates="items")
     
@@ -108,7 +124,7 @@ class OrderItem(Base):
             "id": self.id,
             "item_id": self.item_id,
             "quantity": self.quantity,
-            "price": self.price
+            "price": float(self.price) if self.price is not None else None
         }
 
 class OrganizationPrompt(Base):
@@ -130,3 +146,68 @@ class OrganizationPrompt(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
+
+class PendingTranscription(Base):
+    __tablename__ = "pending_transcriptions"
+    
+    session_key = Column(String, primary_key=True)
+    text = Column(Text, nullable=False, default="")
+    orders = Column(Text, nullable=True)
+    last_updated = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+class CachedResult(Base):
+    __tablename__ = "cached_results"
+
+    cache_key = Column(String, primary_key=True)
+    orders = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+class AudioJob(Base):
+    __tablename__ = "audio_jobs"
+    __table_args__ = (
+        Index("ix_audio_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True)
+    user_id = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    filename = Column(String, nullable=False)
+    mime_type = Column(String, nullable=False)
+    # Cleared once the job finishes so the queue table stays small.
+    audio = Column(LargeBinary, nullable=True)
+    cache_keys = Column(Text, nullable=True)
+    webhook_url = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    locked_by = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Earliest time a queued retry may be claimed; NULL for a job that has not failed yet.
+    available_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SalesRollup(Base):
+    """Order count and revenue per organization and UTC hour, maintained as orders change."""
+    __tablename__ = "sales_rollups"
+
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class ProductSalesRollup(Base):
+    """Quantity and revenue per organization, UTC day and product."""
+    __tablename__ = "product_sales_rollups"
+
+    organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
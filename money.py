@@ -0,0 +1,21 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+
+def to_decimal(value) -> Optional[Decimal]:
+    """Round an amount from the API to whole cents."""
+    if value is None:
+        return None
+    # Through str() so 0.1 becomes Decimal("0.1") rather than its binary approximation.
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_cents(value) -> int:
+    return int(to_decimal(value).scaleb(2))
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
@@ -0,0 +1,207 @@
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, desc, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import auth_models  # noqa: F401 - registers the auth tables so the ORM mappers configure
+import money
+from database import SessionLocal
+from models import Category, Order, OrderItem, Product, ProductSalesRollup, SalesRollup
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 1000
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class OrderSnapshot(NamedTuple):
+    """What an order contributes to the rollups; kept so an update can subtract the old version."""
+    organization_id: Optional[int]
+    created_at: datetime
+    total_price: Decimal
+    items: List[Tuple[int, int, Decimal]]  # (product id, quantity, unit price)
+
+
+def snapshot(db_order: Order, items: Iterable) -> OrderSnapshot:
+    """``items`` are (product id, quantity, unit price) triples."""
+    return OrderSnapshot(db_order.organization_id, db_order.created_at, db_order.total_price or money.ZERO,
+                         [(item_id, quantity or 0, price or money.ZERO) for item_id, quantity, price in items])
+
+
+def load_snapshot(db: Session, db_order: Order) -> OrderSnapshot:
+    items = db.query(OrderItem.item_id, OrderItem.quantity, OrderItem.price).filter(OrderItem.order_id == db_order.id)
+    return snapshot(db_order, items.all())
+
+
+def _upsert(db: Session, table, keys: tuple, counters: tuple, rows: list):
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect not in _INSERTS:
+        raise RuntimeError(f"Order analytics does not support {dialect}")
+    statement = _INSERTS[dialect](table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c[key] for key in keys],
+        set_={counter: table.c[counter] + statement.excluded[counter] for counter in counters}
+    )
+    db.execute(statement, rows)
+
+
+def apply(db: Session, orders: Iterable[OrderSnapshot], sign: int = 1):
+    """Add (``sign=1``) or subtract (``sign=-1``) orders from the rollups in the caller's transaction.
+
+    Buckets are UTC, matching ``Order.created_at``. Orders without an organization are not counted.
+    """
+    sales = defaultdict(lambda: [0, money.ZERO])
+    products = defaultdict(lambda: [0, money.ZERO])
+    for order in orders:
+        if order.organization_id is None or order.created_at is None:
+            continue
+        day = order.created_at.date()
+        bucket = sales[(order.organization_id, day, order.created_at.hour)]
+        bucket[0] += sign
+        bucket[1] += sign * order.total_price
+        for product_id, quantity, price in order.items:
+            bucket = products[(order.organization_id, day, product_id)]
+            bucket[0] += sign * quantity
+            bucket[1] += sign * quantity * price
+
+    # Sorted so concurrent writers lock rollup rows in the same order and cannot deadlock.
+    _upsert(db, SalesRollup.__table__, ("organization_id", "day", "hour"), ("order_count", "revenue"), [
+        {"organization_id": org, "day": day, "hour": hour, "order_count": count, "revenue": revenue}
+        for (org, day, hour), (count, revenue) in sorted(sales.items())
+    ])
+    _upsert(db, ProductSalesRollup.__table__, ("organization_id", "day", "product_id"), ("quantity", "revenue"), [
+        {"organization_id": org, "day": day, "product_id": product_id, "quantity": quantity, "revenue": revenue}
+        for (org, day, product_id), (quantity, revenue) in sorted(products.items())
+    ])
+
+
+def add_orders(db: Session, orders: Iterable[OrderSnapshot]):
+    apply(db, orders, 1)
+
+
+def remove_orders(db: Session, orders: Iterable[OrderSnapshot]):
+    apply(db, orders, -1)
+
+
+def rebuild(db: Session, organization_id: Optional[int] = None) -> int:
+    """Recompute the rollups from orders and order_items. The caller commits."""
+    for model in (SalesRollup, ProductSalesRollup):
+        statement = delete(model)
+        if organization_id is not None:
+            statement = statement.where(model.organization_id == organization_id)
+        db.execute(statement)
+
+    query = select(Order.id, Order.organization_id, Order.created_at, Order.total_price).where(
+        Order.organization_id.isnot(None)
+    ).order_by(Order.id)
+    if organization_id is not None:
+        query = query.where(Order.organization_id == organization_id)
+
+    count = 0
+    last_id = 0
+    while True:
+        orders = db.execute(query.where(Order.id > last_id).limit(REBUILD_BATCH_SIZE)).all()
+        if not orders:
+            return count
+        items = defaultdict(list)
+        for order_id, item_id, quantity, price in db.execute(
+            select(OrderItem.order_id, OrderItem.item_id, OrderItem.quantity, OrderItem.price)
+            .where(OrderItem.order_id.in_([order.id for order in orders]))
+        ):
+            items[order_id].append((item_id, quantity, price))
+        add_orders(db, [snapshot(order, items[order.id]) for order in orders])
+        count += len(orders)
+        last_id = orders[-1].id
+
+
+def _in_range(statement, model, organization_id: Optional[int], start: Optional[date], end: Optional[date]):
+    if organization_id is not None:
+        statement = statement.where(model.organization_id == organization_id)
+    if start is not None:
+        statement = statement.where(model.day >= start)
+    if end is not None:
+        statement = statement.where(model.day <= end)
+    return statement
+
+
+def _money(value) -> float:
+    return float(value or 0)
+
+
+def sales_statement(organization_id: Optional[int], start: Optional[date], end: Optional[date], granularity: str = "day"):
+    columns = [SalesRollup.day, SalesRollup.hour] if granularity == "hour" else [SalesRollup.day]
+    statement = select(
+        *columns, func.sum(SalesRollup.order_count).label("order_count"), func.sum(SalesRollup.revenue).label("revenue")
+    ).group_by(*columns).having(func.sum(SalesRollup.order_count) > 0).order_by(*columns)
+    return _in_range(statement, SalesRollup, organization_id, start, end)
+
+
+def sales_rows(rows) -> list:
+    return [
+        {"day": row.day, "hour": getattr(row, "hour", None), "order_count": row.order_count, "revenue": _money(row.revenue)}
+        for row in rows
+    ]
+
+
+def top_products_statement(organization_id: Optional[int], start: Optional[date], end: Optional[date],
+                           limit: int = 10, order_by: str = "revenue"):
+    quantity = func.sum(ProductSalesRollup.quantity).label("quantity")
+    revenue = func.sum(ProductSalesRollup.revenue).label("revenue")
+    statement = select(ProductSalesRollup.product_id, Product.name, quantity, revenue).outerjoin(
+        Product, Product.id == ProductSalesRollup.product_id
+    ).group_by(ProductSalesRollup.product_id, Product.name).having(quantity > 0).order_by(
+        desc(quantity if order_by == "quantity" else revenue), ProductSalesRollup.product_id
+    ).limit(limit)
+    return _in_range(statement, ProductSalesRollup, organization_id, start, end)
+
+
+def category_statement(organization_id: Optional[int], start: Optional[date], end: Optional[date]):
+    """Sales per product category; products are attributed to their current category."""
+    quantity = func.sum(ProductSalesRollup.quantity).label("quantity")
+    revenue = func.sum(ProductSalesRollup.revenue).label("revenue")
+    statement = select(Category.id.label("category_id"), Category.name, quantity, revenue).select_from(
+        ProductSalesRollup
+    ).outerjoin(Product, Product.id == ProductSalesRollup.product_id).outerjoin(
+        Category, Category.id == Product.category_id
+    ).group_by(Category.id, Category.name).having(quantity > 0).order_by(desc(revenue))
+    return _in_range(statement, ProductSalesRollup, organization_id, start, end)
+
+
+def product_rows(rows, key: str = "product_id") -> list:
+    return [
+        {key: getattr(row, key), "name": row.name, "quantity": row.quantity, "revenue": _money(row.revenue)}
+        for row in rows
+    ]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Maintain the order analytics rollups")
+    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recompute the rollups from the orders tables")
+    rebuild_parser.add_argument("--organization-id", type=int, default=None, help="Only rebuild this organization")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        db = SessionLocal()
+        try:
+            count = rebuild(db, args.organization_id)
+            db.commit()
+            logger.info(f"Rebuilt analytics rollups from {count} order(s)")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
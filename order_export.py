@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import os
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Order, OrderItem, Product
+
+ORDER_EXPORT_BATCH_ROWS = int(os.getenv("ORDER_EXPORT_BATCH_ROWS", 1000))
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    # One JSON document holding a list of column-array batches, so field names are not repeated on every row.
+    "columnar": ("application/json", "json"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+COLUMNS = ("order_id", "created_at", "organization_id", "total_price", "item_id", "product_name", "quantity", "price")
+
+# pyarrow is optional and slow to import, so it is loaded on first use.
+pa = None
+pq = None
+_pyarrow_checked = False
+
+
+def _load_pyarrow():
+    global pa, pq, _pyarrow_checked
+    if not _pyarrow_checked:
+        _pyarrow_checked = True
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            pa, pq = pyarrow, pyarrow.parquet
+        except ImportError:
+            pa, pq = None, None
+    return pa
+
+
+def parquet_available() -> bool:
+    return _load_pyarrow() is not None
+
+
+def export_statement(organization_id: Optional[int], start: Optional[date], end: Optional[date]):
+    """One row per order item (or per order without items), oldest first, read through a server-side cursor."""
+    statement = select(
+        Order.id.label("order_id"), Order.created_at, Order.organization_id, Order.total_price,
+        OrderItem.item_id, Product.name.label("product_name"), OrderItem.quantity, OrderItem.price,
+    ).outerjoin(OrderItem, OrderItem.order_id == Order.id).outerjoin(
+        Product, Product.id == OrderItem.item_id
+    ).order_by(Order.created_at, Order.id, OrderItem.id)
+    if organization_id is not None:
+        statement = statement.where(Order.organization_id == organization_id)
+    if start is not None:
+        statement = statement.where(Order.created_at >= start)
+    if end is not None:
+        statement = statement.where(Order.created_at < end + timedelta(days=1))
+    return statement.execution_options(stream_results=True, yield_per=ORDER_EXPORT_BATCH_ROWS)
+
+
+def _json_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if value is not None and not isinstance(value, (int, str)):
+        return float(value)
+    return value
+
+
+def _csv(batches) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (row.order_id, row.created_at.isoformat() if row.created_at else None, *row[2:]) for row in rows
+        )
+        yield buffer.getvalue()
+
+
+def _ndjson(batches) -> Iterator[str]:
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(COLUMNS, map(_json_value, row)))) + "\n" for row in rows)
+
+
+def _columnar(batches) -> Iterator[str]:
+    """``{"batches": [{"rows": n, "columns": {name: [...]}}, ...]}``, written one batch at a time."""
+    separator = ""
+    yield '{"batches": ['
+    for rows in batches:
+        columns = {name: [_json_value(value) for value in values] for name, values in zip(COLUMNS, zip(*rows))}
+        yield separator + json.dumps({"rows": len(rows), "columns": columns})
+        separator = ", "
+    yield "]}"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that collects what the Parquet writer produces until the stream takes it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet(batches) -> Iterator[bytes]:
+    _load_pyarrow()
+    money = pa.decimal128(12, 2)
+    schema = pa.schema([
+        ("order_id", pa.int64()), ("created_at", pa.timestamp("us")), ("organization_id", pa.int64()),
+        ("total_price", money), ("item_id", pa.int64()), ("product_name", pa.string()),
+        ("quantity", pa.int64()), ("price", money),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        # Each batch becomes a row group, so memory stays bounded by ORDER_EXPORT_BATCH_ROWS.
+        for rows in batches:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for field, values in zip(schema, zip(*rows))], schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+_WRITERS = {"csv": _csv, "ndjson": _ndjson, "columnar": _columnar, "parquet": _parquet}
+
+
+def stream_export(export_format: str, organization_id: Optional[int], start: Optional[date], end: Optional[date]) -> Iterator:
+    db = SessionLocal()
+    try:
+        result = db.execute(export_statement(organization_id, start, end))
+        yield from _WRITERS[export_format](result.partitions())
+    finally:
+        db.close()
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from fastapi import Request
+from pydantic import BaseModel
+
+import context_cache
+
+
+class Item(BaseModel):
+    id: int
+    quantity: int
+
+
+async def extract_audio_orders(prefix, upload, request: Optional[Request] = None) -> list:
+    """Ask Gemini for the confirmed orders in an audio upload, as ``item_id``/``quantity`` dicts."""
+    response = await context_cache.generate_content(
+        prefix,
+        [await upload.gemini_part()],
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": list[Item],
+        },
+        request=request
+    )
+    orders: list[Item] = response.parsed
+    return [{"item_id": item.id, "quantity": item.quantity} for item in orders]
+
+
+def with_product_names(orders_data: list, catalog) -> list:
+    """Copies of ``orders_data`` with the product label and name added, for notifications."""
+    labelled = []
+    for order in orders_data:
+        order = dict(order)
+        product = catalog.by_id.get(order["item_id"])
+        if product:
+            order["label_for_ai"] = product["label_for_ai"]
+            order["name"] = product["name"]
+        labelled.append(order)
+    return labelled
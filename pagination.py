@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, and_, or_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def keyset_columns(model):
+    """Columns a model is paged on: oldest first (insertion order), with the primary key as tie-breaker."""
+    if hasattr(model, "created_at"):
+        return (model.created_at, model.id)
+    return (model.id,)
+
+
+def encode_cursor(row, columns) -> str:
+    values = []
+    for column in columns:
+        value = getattr(row, column.key)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match the listing")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _after(columns, values):
+    """Rows strictly after ``values`` in ascending ``columns`` order."""
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return or_(column > value, and_(column == value, _after(columns[1:], values[1:])))
+
+
+def paginate(query, columns, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Order ``query`` by ``columns`` and apply a cursor, falling back to offset paging.
+
+    Both modes use the same ascending order, which matches the insertion order
+    unordered offset queries returned before, so ``skip`` clients see the same pages.
+    """
+    query = query.order_by(*columns)
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns)))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def next_cursor(rows, columns, limit: int) -> Optional[str]:
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1], columns)
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import context_cache
+import gemini_client
+import prompt_crud
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CATALOG_TOKEN_BUDGET = int(os.getenv("PROMPT_CATALOG_TOKEN_BUDGET", 8000))
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", 1000))
+ORGANIZATION_PROMPT_TTL_SECONDS = int(os.getenv("ORGANIZATION_PROMPT_TTL_SECONDS", 300))
+PROMPT_COUNT_TOKENS = os.getenv("PROMPT_COUNT_TOKENS", "false").lower() == "true"
+
+AUDIO_RULES = """
+            Rules:
+            - Analyze the conversation and return only the final confirmed orders.
+            - Include ONLY products present in the list above.
+            - Exclude any item not in the list, even if it's mentioned.
+            - Do NOT include items that were canceled, changed, or rejected.
+            - The conversation may be in Uzbek, Russian, Tajik, or English. Match appropriately.
+            - Tajik translations: Small - Xutarak, Medium - Sredniy, Large - Kalun.
+            - If no valid items are confirmed, return: []
+            """
+
+CONVERSATION_RULES = """
+                Your task:
+                - Analyze the entire conversation transcript to determine the final, confirmed list of products and their quantities.
+                - Maintain a running list of orders. If a product is mentioned multiple times, always use the quantity and variant from its *latest confirmed mention*.
+                - Update product quantities or variants if they are changed or clarified in later parts of the conversation. For example, if a user orders 1 cappuccino and then later says "no, I want 2 cappuccinos", update the quantity to 2.
+                - Include ONLY products present in the provided list. Exclude any item not in the list, even if it's mentioned.
+                - **CRITICAL**: If a product is explicitly and clearly canceled by the user (e.g., "I don't need cappuccino anymore", "remove the latte", "cancel the burger"), **it MUST be entirely excluded from the final JSON output**. Do NOT include canceled products, even with a quantity of zero or by reducing their quantity. They should simply not appear in the final list.
+                - The conversation may be in Uzbek, Russian, Tajik, or English. Match product names and sizes appropriately.
+                - Tajik translations: Small - Xutarak, Medium - Sredniy, Large - Kalun.
+                - Return only confirmed items. Do not assume anything not clearly confirmed.
+                - If no valid or confirmed products are mentioned throughout the *entire* conversation, or if all previously ordered items are canceled, return: []
+        """
+
+INTRODUCTIONS = {
+    "audio": "You are an expert assistant that extracts confirmed product orders from conversation audio.",
+    "conversation": "You are an expert assistant that extracts confirmed product orders from conversation text.",
+}
+
+RULES = {
+    "audio": AUDIO_RULES,
+    "conversation": CONVERSATION_RULES,
+}
+
+OUTPUT_FORMATS = {
+    "audio": """Return a JSON list with no extra explanation, in this exact format:
+            [
+                {"id": 1, "quantity": 1},
+                {"id": 2, "quantity": 2}
+            ]""",
+    "conversation": """Return a JSON list with no extra explanation, in this exact format:
+            [
+                {"id": <product_id>, "quantity": <number>},
+                ...
+            ]""",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for Gemini)."""
+    return (len(text) + 3) // 4
+
+
+def render_catalog(products: list, token_budget: int = PROMPT_CATALOG_TOKEN_BUDGET) -> str:
+    """Render products one per line as ``id|label_for_ai|name``, dropping names when over budget."""
+    lines = [
+        f"{product['id']}|{product['label_for_ai']}"
+        + (f"|{product['name']}" if product["name"] and product["name"] != product["label_for_ai"] else "")
+        for product in products
+    ]
+    text = "id|label_for_ai|name\n" + "\n".join(lines)
+    if estimate_tokens(text) <= token_budget:
+        return text
+
+    text = "id|label_for_ai\n" + "\n".join(f"{product['id']}|{product['label_for_ai']}" for product in products)
+    if estimate_tokens(text) > token_budget:
+        logger.warning(f"Catalog of {len(products)} products needs ~{estimate_tokens(text)} tokens, over the {token_budget} budget")
+    return text
+
+
+class PromptPrefix:
+    def __init__(self, key: tuple, text: str, tokens: int):
+        self.key = key
+        self.text = text
+        self.tokens = tokens
+
+
+_prefixes = OrderedDict()
+_organization_prompts = {}
+_lock = threading.Lock()
+
+
+def get_organization_prompt(db: Session, organization_id: Optional[int]):
+    """Return ``(prompt_text, version)`` for an organization, cached for a few minutes."""
+    if not organization_id:
+        return "", None
+
+    with _lock:
+        cached = _organization_prompts.get(organization_id)
+    if cached and time.monotonic() - cached[2] < ORGANIZATION_PROMPT_TTL_SECONDS:
+        return cached[0], cached[1]
+
+    org_prompt = prompt_crud.get_prompt_by_organization(db, organization_id)
+    if org_prompt:
+        text, version = org_prompt.prompt_text, org_prompt.updated_at.isoformat() if org_prompt.updated_at else str(org_prompt.id)
+    else:
+        text, version = "", None
+    with _lock:
+        _organization_prompts[organization_id] = (text, version, time.monotonic())
+    return text, version
+
+
+def invalidate_organization_prompt(organization_id: int):
+    with _lock:
+        _organization_prompts.pop(organization_id, None)
+    context_cache.invalidate_organization(organization_id)
+
+
+def _build_prefix_text(kind: str, catalog, org_prompt_text: str) -> str:
+    instruction = RULES[kind]
+    if org_prompt_text:
+        instruction = instruction + "\t" + org_prompt_text
+    return f"""
+            {INTRODUCTIONS[kind]}
+
+            Here is a list of valid products you must match against:
+            {catalog.prompt_text}
+
+            {instruction}
+
+            {OUTPUT_FORMATS[kind]}
+            """
+
+
+async def get_prefix(db: Session, catalog, kind: str) -> PromptPrefix:
+    """Static part of the prompt for ``kind`` ("audio" or "conversation").
+
+    It only changes with the catalog or the organization prompt, so it is built
+    once per (organization, catalog version, prompt version).
+    """
+    org_prompt_text, prompt_version = get_organization_prompt(db, catalog.organization_id)
+    key = (catalog.organization_id, catalog.version, prompt_version, kind)
+
+    with _lock:
+        prefix = _prefixes.get(key)
+        if prefix is not None:
+            _prefixes.move_to_end(key)
+            return prefix
+
+    text = _build_prefix_text(kind, catalog, org_prompt_text)
+    tokens = await gemini_client.count_tokens(text) if PROMPT_COUNT_TOKENS else estimate_tokens(text)
+    logger.info(f"Built {kind} prompt prefix for organization {catalog.organization_id}: ~{tokens} tokens")
+    prefix = PromptPrefix(key, text, tokens)
+
+    with _lock:
+        _prefixes[key] = prefix
+        while len(_prefixes) > PROMPT_CACHE_SIZE:
+            _prefixes.popitem(last=False)
+    return prefix
+
+
+def conversation_suffix(transcript: str, current_orders: Optional[list] = None, incremental: bool = False) -> str:
+    if incremental:
+        # Only the new chunk and the order so far are sent, so the prompt stays flat as the conversation grows.
+        return f"""Here is the confirmed order so far:
+            {json.dumps(current_orders or [])}
+
+            Here is the newest part of the conversation. Apply it to the order above:
+            {transcript}"""
+    return f"""Here is the conversation transcript:
+            {transcript}"""
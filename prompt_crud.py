@@ -3,6 +3,7 @@ from fastapi import HTTPException
 from models import OrganizationPrompt
 from schemas import OrganizationPromptCreate, OrganizationPromptUpdate
 import auth_crud
+import prompt_builder
 
 def get_organization_prompt(db: Session, prompt_id: int):
     return db.query(OrganizationPrompt).filter(OrganizationPrompt.id == prompt_id).first()
@@ -30,6 +31,7 @@ def create_organization_prompt(db: Session, prompt: OrganizationPromptCreate):
     db.add(db_prompt)
     db.commit()
     db.refresh(db_prompt)
+    prompt_builder.invalidate_organization_prompt(db_prompt.organization_id)
     return db_prompt
 
 def update_organization_prompt(db: Session, organization_id: int, prompt_data: OrganizationPromptUpdate):
@@ -41,6 +43,7 @@ def update_organization_prompt(db: Session, organization_id: int, prompt_data: O
     
     db.commit()
     db.refresh(db_prompt)
+    prompt_builder.invalidate_organization_prompt(db_prompt.organization_id)
     return db_prompt
 
 def delete_organization_prompt(db: Session, organization_id: int):
@@ -50,4 +53,5 @@ def delete_organization_prompt(db: Session, organization_id: int):
     
     db.delete(db_prompt)
     db.commit()
+    prompt_builder.invalidate_organization_prompt(organization_id)
     return {"message": f"Prompt for organization {organization_id} deleted successfully"}
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import engine
+from models import CachedResult
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps results per worker; "database" adds the cached_results table as a shared second tier.
+RESULT_CACHE_STORE = os.getenv("RESULT_CACHE_STORE", "memory")
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1000))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", 86400))
+RESULT_CACHE_SWEEP_INTERVAL_SECONDS = int(os.getenv("RESULT_CACHE_SWEEP_INTERVAL_SECONDS", 300))
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+RESULT_CACHE_HEADER = "X-Result-Cache"
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def content_key(kind: str, audio_hash: str, prefix, conversation_id: Optional[str] = None) -> str:
+    """Key for an upload: the audio bytes plus everything that shapes the prompt."""
+    organization_id, catalog_version, prompt_version, _ = prefix.key
+    return _digest("content", kind, audio_hash, organization_id, catalog_version, prompt_version, conversation_id)
+
+
+def idempotency_key(kind: str, organization_id: Optional[int], user_id: int, key: str) -> str:
+    """Client-supplied keys are scoped to the user so they can never collide across accounts."""
+    return _digest("idempotency", kind, organization_id, user_id, key)
+
+
+class MemoryResultCache:
+    """Bounded LRU of recent results, local to the worker."""
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl_seconds: int = RESULT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] >= self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, orders: list):
+        with self._lock:
+            self._entries[key] = (orders, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DatabaseResultCache:
+    """Memory LRU in front of the cached_results table, so retries that land on another worker still hit."""
+
+    def __init__(self, bind=engine, ttl_seconds: int = RESULT_CACHE_TTL_SECONDS, memory: Optional[MemoryResultCache] = None):
+        self.bind = bind
+        self.ttl_seconds = ttl_seconds
+        self.memory = memory or MemoryResultCache(ttl_seconds=ttl_seconds)
+        self._last_sweep = 0.0
+
+        if bind.dialect.name == "postgresql":
+            self._insert = postgresql.insert
+        elif bind.dialect.name == "sqlite":
+            self._insert = sqlite.insert
+        else:
+            raise RuntimeError(f"Result cache does not support {bind.dialect.name}")
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+
+    def get(self, key: str) -> Optional[list]:
+        orders = self.memory.get(key)
+        if orders is not None:
+            return orders
+
+        table = CachedResult.__table__
+        with self.bind.connect() as connection:
+            stored = connection.execute(
+                select(table.c.orders).where(table.c.cache_key == key, table.c.created_at >= self._cutoff())
+            ).scalar()
+        if stored is None:
+            return None
+        orders = json.loads(stored)
+        self.memory.put(key, orders)
+        return orders
+
+    def put(self, key: str, orders: list):
+        self.memory.put(key, orders)
+
+        table = CachedResult.__table__
+        statement = self._insert(table).values(cache_key=key, orders=json.dumps(orders), created_at=datetime.utcnow())
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.cache_key],
+            set_={"orders": statement.excluded.orders, "created_at": statement.excluded.created_at}
+        )
+        with self.bind.begin() as connection:
+            connection.execute(statement)
+        self._maybe_sweep()
+
+    def clear(self):
+        self.memory.clear()
+        with self.bind.begin() as connection:
+            connection.execute(delete(CachedResult.__table__))
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < RESULT_CACHE_SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        with self.bind.begin() as connection:
+            expired = connection.execute(
+                delete(CachedResult.__table__).where(CachedResult.__table__.c.created_at < self._cutoff())
+            ).rowcount
+        if expired:
+            logger.info(f"Swept {expired} expired cached results")
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        if RESULT_CACHE_STORE == "database":
+            _cache = DatabaseResultCache()
+        elif RESULT_CACHE_STORE == "memory":
+            _cache = MemoryResultCache()
+        else:
+            raise RuntimeError(f"Unknown RESULT_CACHE_STORE '{RESULT_CACHE_STORE}', expected 'memory' or 'database'")
+    return _cache
+
+
+def lookup(keys: list) -> Optional[list]:
+    """Return the first cached result among ``keys``."""
+    cache = get_cache()
+    for key in keys:
+        if key:
+            orders = cache.get(key)
+            if orders is not None:
+                return orders
+    return None
+
+
+def store(keys: list, orders: list):
+    cache = get_cache()
+    for key in keys:
+        if key:
+            cache.put(key, orders)
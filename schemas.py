@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 
 class OrderItemBase(BaseModel):
     item_id: int
@@ -23,6 +23,7 @@ class OrderBase(BaseModel):
 
 class OrderCreate(OrderBase):
     items: List[OrderItemCreate] = []
+    conversation_id: Optional[str] = None
 
 class Order(OrderBase):
     id: int
@@ -111,3 +112,35 @@ class OrganizationPrompt(OrganizationPromptBase):
 
     class Config:
         orm_mode = True
+
+
+class AudioJob(BaseModel):
+    id: str
+    status: str
+    orders: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class SalesPeriod(BaseModel):
+    day: date
+    hour: Optional[int] = None
+    order_count: int
+    revenue: float
+
+
+class ProductSales(BaseModel):
+    product_id: int
+    name: Optional[str] = None
+    quantity: int
+    revenue: float
+
+
+class CategorySales(BaseModel):
+    category_id: Optional[int] = None
+    name: Optional[str] = None
+    quantity: int
+    revenue: float
@@ -1,54 +1,80 @@
-import os
+import argparse
 import sys
-import psycopg2
-from dotenv import load_dotenv
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from database import engine, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+
 logger = logging.getLogger(__name__)
 
 def setup_database():
-    load_dotenv()
-    
-    db_user = os.getenv("DB_USER", "postgres")
-    db_password = os.getenv("DB_PASSWORD", "password")
-    db_host = os.getenv("DB_HOST", "localhost")
-    db_port = os.getenv("DB_PORT", "5432")
-    db_name = os.getenv("DB_NAME", "order_automation")
-    
+    import psycopg2
+
+    db_user = DB_USER
+    db_password = DB_PASSWORD
+    db_host = DB_HOST
+    db_port = DB_PORT
+    db_name = DB_NAME
+
     logger.info(f"Setting up database {db_name} on {db_host}:{db_port}")
-    
+
     try:
         conn = psycopg2.connect(
             user=db_user,
             password=db_password,
             host=db_host,
             port=db_port,
-            database="postgres"  
+            database="postgres"
         )
         conn.autocommit = True
         cursor = conn.cursor()
-        
+
         cursor.execute(f"SELECT 1 FROM pg_database WHERE datname = '{db_name}'")
         exists = cursor.fetchone()
-        
+
         if not exists:
             logger.info(f"Creating database {db_name}")
             cursor.execute(f"CREATE DATABASE {db_name}")
             logger.info(f"Database {db_name} created successfully")
         else:
             logger.info(f"Database {db_name} already exists")
-        
+
         cursor.close()
         conn.close()
-        
+
         logger.info("Database setup completed successfully")
         return True
-        
+
     except Exception as e:
         logger.error(f"Error setting up database: {e}")
         return False
 
+def init_database():
+    """Create the database if needed, then the tables, then apply pending migrations."""
+    import models
+    import auth_models  # noqa: F401 - registers the auth tables on the shared metadata
+    from migrations import run_migrations
+
+    if engine.dialect.name == "postgresql" and not setup_database():
+        return False
+
+    logger.info("Creating tables...")
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    logger.info("Database initialized")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare the application database")
+    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
+    subparsers.add_parser("create-db", help="Create the PostgreSQL database if it does not exist (default)")
+    subparsers.add_parser("init-db", help="Create the database, all tables and apply pending migrations")
+    args = parser.parse_args()
+
+    if args.command == "init-db":
+        return init_database()
+    return setup_database()
+
 if __name__ == "__main__":
-    success = setup_database()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    success = main()
     sys.exit(0 if success else 1)
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+import httpx
+
+from database import BOT_TOKEN, CHAT_ID
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", 1000))
+TELEGRAM_TIMEOUT_SECONDS = float(os.getenv("TELEGRAM_TIMEOUT_SECONDS", 30))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 5))
+TELEGRAM_BACKOFF_SECONDS = float(os.getenv("TELEGRAM_BACKOFF_SECONDS", 1.0))
+# Telegram allows roughly one message per second per chat.
+TELEGRAM_CHAT_INTERVAL_SECONDS = float(os.getenv("TELEGRAM_CHAT_INTERVAL_SECONDS", 1.0))
+TELEGRAM_BATCH_SIZE = int(os.getenv("TELEGRAM_BATCH_SIZE", 5))
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class TelegramError(Exception):
+    pass
+
+
+def format_order_message(orders_data: list) -> str:
+    return f"🧾 New Order Extracted:\n\n{json.dumps(orders_data, indent=2, ensure_ascii=False)}"
+
+
+def batch_messages(messages: list) -> list:
+    """Join messages into as few texts as fit under Telegram's length limit."""
+    batches = []
+    for message in messages:
+        if batches and len(batches[-1]) + len(message) + 2 <= TELEGRAM_MESSAGE_LIMIT:
+            batches[-1] += "\n\n" + message
+        else:
+            batches.append(message[:TELEGRAM_MESSAGE_LIMIT])
+    return batches
+
+
+def _rewind(contents):
+    if hasattr(contents, "seek"):
+        contents.seek(0)
+    return contents
+
+
+def _close(contents):
+    if hasattr(contents, "close"):
+        contents.close()
+
+
+class TelegramNotifier:
+    """Sends order notifications from a bounded queue on one persistent HTTP client."""
+
+    def __init__(self, bot_token: str = BOT_TOKEN, chat_id: str = CHAT_ID, base_url: str = TELEGRAM_API_URL,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, queue_size: int = TELEGRAM_QUEUE_SIZE):
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.base_url = base_url.rstrip("/")
+        self.transport = transport
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._client = None
+        self._worker = None
+        self._next_send = {}
+
+    async def start(self):
+        if self._worker is not None:
+            return
+        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=TELEGRAM_TIMEOUT_SECONDS, transport=self.transport)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 5.0):
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} undelivered Telegram notifications on shutdown")
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        await self._client.aclose()
+        self._worker = None
+        self._client = None
+        # The queue is bound to this event loop; a later start() may run on another one.
+        while not self.queue.empty():
+            contents, _, _ = self.queue.get_nowait()
+            _close(contents)
+        self.queue = asyncio.Queue(maxsize=self.queue.maxsize)
+
+    def notify_order(self, contents, filename: str, orders_data: list) -> bool:
+        """Queue a notification. ``contents`` is audio bytes or an open file, which is closed once sent."""
+        try:
+            self.queue.put_nowait((contents, filename, format_order_message(orders_data)))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Telegram queue is full, dropping order notification")
+            _close(contents)
+            return False
+
+    async def _run(self):
+        while True:
+            jobs = [await self.queue.get()]
+            while len(jobs) < TELEGRAM_BATCH_SIZE and not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+            try:
+                await self._deliver(jobs)
+            except Exception as e:
+                logger.error(f"Telegram send error: {str(e)}")
+            finally:
+                for contents, _, _ in jobs:
+                    _close(contents)
+                    self.queue.task_done()
+
+    async def _deliver(self, jobs: list):
+        # A failed send is logged and skipped so it does not take the rest of the batch with it.
+        for contents, filename, _ in jobs:
+            if contents is not None:
+                try:
+                    await self._send("sendAudio", data={"chat_id": self.chat_id}, files=lambda: {"audio": (filename, _rewind(contents))})
+                except Exception as e:
+                    logger.error(f"Telegram send error for {filename}: {str(e)}")
+        for text in batch_messages([message for _, _, message in jobs]):
+            try:
+                await self._send("sendMessage", json={"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"})
+            except Exception as e:
+                logger.error(f"Telegram send error: {str(e)}")
+
+    async def _wait_for_chat(self):
+        delay = self._next_send.get(self.chat_id, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_send[self.chat_id] = time.monotonic() + TELEGRAM_CHAT_INTERVAL_SECONDS
+
+    async def _send(self, method: str, **kwargs):
+        for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+            await self._wait_for_chat()
+            retry_after = TELEGRAM_BACKOFF_SECONDS * 2 ** attempt
+            try:
+                # Files are passed as a factory so each retry re-reads them from the start.
+                request_kwargs = {**kwargs, "files": kwargs["files"]()} if callable(kwargs.get("files")) else kwargs
+                response = await self._client.post(f"/bot{self.bot_token}/{method}", **request_kwargs)
+                if response.status_code < 400:
+                    return response.json()
+                if response.status_code == 429:
+                    retry_after = max(retry_after, response.json().get("parameters", {}).get("retry_after", 0))
+                elif response.status_code < 500:
+                    raise TelegramError(f"{method} failed with {response.status_code}: {response.text}")
+                error = f"{method} failed with {response.status_code}"
+            except httpx.TransportError as e:
+                error = f"{method} failed: {str(e)}"
+
+            if attempt < TELEGRAM_MAX_RETRIES:
+                logger.warning(f"{error}, retrying in {retry_after:.1f}s")
+                await asyncio.sleep(retry_after)
+        raise TelegramError(error)
+
+
+_notifier = None
+
+
+def get_notifier() -> TelegramNotifier:
+    global _notifier
+    if _notifier is None:
+        _notifier = TelegramNotifier()
+    return _notifier
@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import tempfile
+import wave
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Configure before the application modules read their settings at import.
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.setdefault("GEMINI_FAKE", "true")
+os.environ.setdefault("FAKE_GEMINI_LATENCY_SECONDS", "0")
+os.environ.setdefault("AUDIO_JOB_WORKERS", "0")
+os.environ.setdefault("TOKEN_REAPER_INTERVAL_SECONDS", "0")
+
+import auth_models  # noqa: E402
+import database  # noqa: E402
+import fake_telegram  # noqa: E402
+import main  # noqa: E402
+import models  # noqa: E402
+import result_cache  # noqa: E402
+import telegram_notifier  # noqa: E402
+import user_cache  # noqa: E402
+from auth_utils import access_token_claims, create_access_token  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    models.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        models.Base.metadata.drop_all(bind=database.engine)
+        user_cache.clear()
+        result_cache.get_cache().clear()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    # Order notifications go to the in-process fake so shutdown does not wait on the real Bot API.
+    monkeypatch.setattr(telegram_notifier, "_notifier", telegram_notifier.TelegramNotifier(
+        base_url="http://telegram.test", transport=httpx.ASGITransport(app=fake_telegram.app)
+    ))
+    monkeypatch.setattr(telegram_notifier, "TELEGRAM_CHAT_INTERVAL_SECONDS", 0)
+    with TestClient(main.app) as test_client:
+        yield test_client
+    fake_telegram.reset()
+
+
+@pytest.fixture
+def organization(db):
+    organization = models.Organization(name="Test organization")
+    db.add(organization)
+    db.commit()
+    return organization
+
+
+@pytest.fixture
+def products(db, organization):
+    products = [
+        models.Product(name=f"product_{i}", label_for_ai=f"product {i}", price=1.5 + i, organization_id=organization.id)
+        for i in range(3)
+    ]
+    db.add_all(products)
+    db.commit()
+    return products
+
+
+def make_user(db, organization_id=None, username="user", is_admin=False):
+    user = auth_models.User(username=username, email=f"{username}@example.com", hashed_password="x",
+                            organization_id=organization_id, is_admin=is_admin)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def seed_orders(db, organization, products, count: int, items_per_order: int = 3):
+    for _ in range(count):
+        order = models.Order(organization_id=organization.id, total_price=0)
+        order.items = [
+            models.OrderItem(item_id=product.id, quantity=2, price=product.price)
+            for product in products[:items_per_order]
+        ]
+        db.add(order)
+    db.commit()
+
+
+def auth_headers(user) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(access_token_claims(user))}"}
+
+
+@pytest.fixture
+def user(db, organization):
+    return make_user(db, organization.id)
+
+
+@pytest.fixture
+def headers(user):
+    return auth_headers(user)
+
+
+def wav_bytes(seconds: float = 1.0) -> bytes:
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(8000)
+        writer.writeframes(b"\x00\x10" * int(8000 * seconds))
+    return output.getvalue()
@@ -0,0 +1,30 @@
+import database
+from conftest import seed_orders
+
+
+def test_read_endpoints_match_on_the_async_session(client, db, organization, products, headers, monkeypatch):
+    seed_orders(db, organization, products, 3)
+    paths = ["/orders/", "/products/", "/categories/", "/analytics/sales"]
+    blocking = {path: client.get(path, headers=headers).json() for path in paths}
+
+    opened = []
+
+    def recording_session():
+        opened.append(True)
+        return session_factory()
+
+    session_factory = database.AsyncSessionLocal
+    monkeypatch.setattr(database, "DB_ASYNC", True)
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setattr(database, "_async_sessionmaker", None)
+    monkeypatch.setattr(database, "AsyncSessionLocal", recording_session)
+    try:
+        for path in paths:
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200
+            assert response.json() == blocking[path]
+    finally:
+        client.portal.call(database.get_async_engine().dispose)
+
+    assert len(opened) == len(paths)
+    assert blocking["/orders/"] and blocking["/products/"]
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import audio_intake
+from conftest import wav_bytes
+
+BOUNDARY = "intake-test-boundary"
+
+
+class CountingFile(io.BytesIO):
+    def __init__(self, value):
+        super().__init__(value)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def read_upload(data: bytes, **limits):
+    body = CountingFile(data)
+    upload = asyncio.run(audio_intake.read_upload(UploadFile(file=body, filename="order.wav"), **limits))
+    return upload, body
+
+
+def test_small_upload_stays_in_memory():
+    audio = wav_bytes(0.5)
+
+    upload, _ = read_upload(audio)
+
+    assert upload.data == audio and upload.file is None
+    assert upload.size == len(audio)
+    assert upload.sha256 == hashlib.sha256(audio).hexdigest()
+    assert upload.mime_type in audio_intake.ALLOWED_AUDIO_TYPES
+
+
+def test_upload_over_the_inline_limit_is_spooled_to_disk():
+    audio = wav_bytes(10)
+
+    upload, body = read_upload(audio, inline_max_bytes=50 * 1024)
+
+    assert upload.data is None
+    assert upload.file.read() == audio
+    assert upload.sha256 == hashlib.sha256(audio).hexdigest()
+    assert body.reads > 1
+    upload.close()
+
+
+def test_non_audio_is_rejected_after_the_first_chunk():
+    with pytest.raises(HTTPException) as error:
+        read_upload(b"not audio at all " * 100000)
+
+    assert error.value.status_code == 400
+    assert "Invalid file type" in error.value.detail
+
+
+def test_empty_upload_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        read_upload(b"")
+
+    assert error.value.detail == "Please upload a file!"
+
+
+def test_reading_stops_once_the_size_limit_is_passed():
+    audio = wav_bytes(60)
+
+    with pytest.raises(HTTPException) as error:
+        body = CountingFile(audio)
+        asyncio.run(audio_intake.read_upload(UploadFile(file=body, filename="order.wav"), max_bytes=100 * 1024))
+
+    assert error.value.status_code == 413
+    assert body.reads * audio_intake.READ_CHUNK_SIZE < len(audio)
+
+
+def multipart(audio_size: int):
+    """A multipart /stt/ body holding a WAV file of ``audio_size`` bytes, produced in 1 MiB pieces."""
+    header = wav_bytes(0.1)
+    yield (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"audio\"; filename=\"order.wav\"\r\n"
+           f"Content-Type: audio/wav\r\n\r\n").encode() + header
+    remaining = audio_size - len(header)
+    while remaining > 0:
+        piece = min(remaining, 1024 * 1024)
+        yield b"\x00" * piece
+        remaining -= piece
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def post_audio(client, headers, body):
+    return client.post("/stt/", content=body, headers={**headers, "Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+
+
+def test_declared_length_over_the_limit_is_refused(client, headers):
+    body = b"".join(multipart(audio_intake.AUDIO_MAX_UPLOAD_BYTES + 128 * 1024))
+
+    response = post_audio(client, headers, body)
+
+    assert response.status_code == 413
+    assert response.json() == {"success": {}, "error": {"description": audio_intake.too_large_error().detail}}
+
+
+def test_chunked_body_over_the_limit_gets_the_endpoint_413(client, headers):
+    # Just over the file limit but inside the multipart allowance: the endpoint itself rejects it.
+    endpoint = post_audio(client, headers, b"".join(multipart(audio_intake.AUDIO_MAX_UPLOAD_BYTES + 1)))
+    # No Content-Length: the middleware cuts the body off while it is being read.
+    middleware = post_audio(client, headers, multipart(audio_intake.AUDIO_MAX_UPLOAD_BYTES + 128 * 1024))
+
+    assert endpoint.status_code == middleware.status_code == 413
+    assert middleware.json() == endpoint.json()
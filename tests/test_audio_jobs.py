@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import audio_intake
+import audio_jobs
+from models import AudioJob
+
+
+def queue_job(db, user) -> str:
+    upload = audio_intake.AudioUpload("order.wav", "audio/wav", 5, "0" * 64, data=b"audio")
+    return audio_jobs.enqueue(db, upload, user.organization_id, user.id, []).id
+
+
+def fail_once(job_id: str, monkeypatch):
+    async def broken_extract(db, job):
+        raise RuntimeError("Gemini is down")
+
+    worker = audio_jobs.AudioJobWorker(concurrency=0)
+    monkeypatch.setattr(worker, "_extract", broken_extract)
+    assert audio_jobs.claim_job(worker.worker_id) == job_id
+    asyncio.run(worker.process(job_id))
+
+
+def test_retry_delay_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(audio_jobs, "AUDIO_JOB_RETRY_BASE_SECONDS", 30)
+    monkeypatch.setattr(audio_jobs, "AUDIO_JOB_RETRY_MAX_SECONDS", 100)
+
+    assert [audio_jobs.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)] == [30, 60, 100, 100]
+
+
+def test_failed_job_is_not_claimed_again_until_its_delay_passes(db, user, monkeypatch):
+    job_id = queue_job(db, user)
+
+    before = datetime.utcnow()
+    fail_once(job_id, monkeypatch)
+
+    job = db.get(AudioJob, job_id)
+    assert job.status == audio_jobs.QUEUED and job.error == "Gemini is down"
+    assert job.available_at >= before + audio_jobs.retry_delay(1)
+    assert audio_jobs.claim_job("another-worker") is None
+
+    job.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert audio_jobs.claim_job("another-worker") == job_id
+
+
+def test_second_failure_waits_longer(db, user, monkeypatch):
+    job_id = queue_job(db, user)
+    fail_once(job_id, monkeypatch)
+    db.get(AudioJob, job_id).available_at = None
+    db.commit()
+
+    before = datetime.utcnow()
+    fail_once(job_id, monkeypatch)
+
+    db.expire_all()
+    job = db.get(AudioJob, job_id)
+    assert job.attempts == 2
+    assert job.available_at >= before + audio_jobs.retry_delay(2) > before + audio_jobs.retry_delay(1)
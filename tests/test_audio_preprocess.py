@@ -0,0 +1,139 @@
+import io
+import math
+import wave
+from array import array
+
+import pytest
+
+import audio_intake
+import audio_preprocess
+
+TONE_HZ = 440
+
+
+def make_wav(rate: int = 44100, channels: int = 2, width: int = 2, silence: float = 0.5, tone: float = 1.0,
+             amplitude: float = 0.5) -> bytes:
+    """``silence`` seconds of silence, a ``tone`` second sine, then silence again."""
+    scale = (1 << (8 * width - 1)) - 1
+    values = [0] * int(silence * rate)
+    values += [int(amplitude * scale * math.sin(2 * math.pi * TONE_HZ * i / rate)) for i in range(int(tone * rate))]
+    values += [0] * int(silence * rate)
+
+    if width == 1:
+        frames = bytes((value + 128) & 0xFF for value in values for _ in range(channels))
+    else:
+        frames = b"".join(value.to_bytes(width, "little", signed=True) * channels for value in values)
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(width)
+        writer.setframerate(rate)
+        writer.writeframes(frames)
+    return output.getvalue()
+
+
+def read_wav(data: bytes):
+    with wave.open(io.BytesIO(data), "rb") as reader:
+        params = reader.getparams()
+        samples = array("h", reader.readframes(params.nframes))
+    return params, [value / 32767 for value in samples]
+
+
+def zero_crossings(samples) -> int:
+    return sum(1 for previous, current in zip(samples, samples[1:]) if (previous < 0) != (current < 0))
+
+
+@pytest.fixture(params=["numpy", "pure"])
+def implementation(request, monkeypatch):
+    if request.param == "pure":
+        monkeypatch.setattr(audio_preprocess, "np", None)
+        monkeypatch.setattr(audio_preprocess, "_numpy_checked", True)
+    return request.param
+
+
+@pytest.mark.parametrize("width", [1, 2, 3, 4])
+def test_round_trip_downmixes_resamples_and_trims(implementation, width):
+    params, samples = read_wav(audio_preprocess.preprocess_audio(make_wav(width=width), "audio/wav"))
+
+    assert (params.nchannels, params.sampwidth, params.framerate) == (1, 2, audio_preprocess.AUDIO_TARGET_SAMPLE_RATE)
+    # One second of tone plus the silence padding on both sides.
+    expected = 1.0 + 2 * audio_preprocess.AUDIO_SILENCE_PAD_SECONDS
+    assert abs(len(samples) / params.framerate - expected) <= 2 * audio_preprocess.FRAME_SECONDS
+    assert max(samples) == pytest.approx(0.5, abs=0.03)
+    assert zero_crossings(samples) == pytest.approx(2 * TONE_HZ, rel=0.02)
+
+
+def test_numpy_and_pure_python_agree(monkeypatch):
+    audio = make_wav()
+    with_numpy = read_wav(audio_preprocess.preprocess_audio(audio, "audio/wav"))[1]
+    monkeypatch.setattr(audio_preprocess, "np", None)
+    monkeypatch.setattr(audio_preprocess, "_numpy_checked", True)
+    pure = read_wav(audio_preprocess.preprocess_audio(audio, "audio/wav"))[1]
+
+    assert len(with_numpy) == len(pure)
+    # The NumPy path low-pass filters before decimating, so allow a small difference.
+    assert max(abs(a - b) for a, b in zip(with_numpy, pure)) < 0.05
+
+
+def test_low_sample_rate_is_not_upsampled(implementation):
+    params, _ = read_wav(audio_preprocess.preprocess_audio(make_wav(rate=8000, channels=1), "audio/wav"))
+
+    assert params.framerate == 8000
+
+
+def test_silent_audio_is_kept_whole(implementation):
+    params, samples = read_wav(audio_preprocess.preprocess_audio(make_wav(rate=16000, channels=1, tone=0), "audio/wav"))
+
+    assert len(samples) == params.framerate
+
+
+class KeptOpen(io.BytesIO):
+    """aifc closes the file it wrote; keep the bytes readable afterwards."""
+
+    def close(self):
+        pass
+
+
+@pytest.mark.skipif(audio_preprocess.aifc is None, reason="aifc is not available")
+def test_aiff_is_decoded_big_endian(implementation):
+    rate = 16000
+    values = [int(0.5 * 32767 * math.sin(2 * math.pi * TONE_HZ * i / rate)) for i in range(rate)]
+    output = KeptOpen()
+    writer = audio_preprocess.aifc.open(output, "wb")
+    writer.setnchannels(1)
+    writer.setsampwidth(2)
+    writer.setframerate(rate)
+    writer.writeframes(b"".join(value.to_bytes(2, "big", signed=True) for value in values))
+    writer.close()
+
+    _, samples = read_wav(audio_preprocess.preprocess_audio(output.getvalue(), "audio/aiff"))
+
+    assert max(samples) == pytest.approx(0.5, abs=0.01)
+    assert zero_crossings(samples) == pytest.approx(2 * TONE_HZ, rel=0.02)
+
+
+def upload_of(data: bytes, mime_type: str = "audio/wav") -> audio_intake.AudioUpload:
+    return audio_intake.AudioUpload("order.wav", mime_type, len(data), "original-hash", data=data)
+
+
+def test_maybe_preprocess_replaces_the_upload_and_keeps_its_hash(monkeypatch):
+    monkeypatch.setattr(audio_preprocess, "AUDIO_PREPROCESS", True)
+    upload = upload_of(make_wav())
+
+    processed = audio_preprocess.maybe_preprocess(upload)
+
+    assert processed is not upload
+    assert processed.size < upload.size and processed.size == len(processed.data)
+    assert (processed.mime_type, processed.sha256) == ("audio/wav", "original-hash")
+
+
+@pytest.mark.parametrize("enabled, data, mime_type", [
+    (False, make_wav(), "audio/wav"),
+    (True, b"RIFF not really a wav", "audio/wav"),
+    (True, b"ID3 mp3 bytes", "audio/mpeg"),
+])
+def test_maybe_preprocess_passes_other_uploads_through(monkeypatch, enabled, data, mime_type):
+    monkeypatch.setattr(audio_preprocess, "AUDIO_PREPROCESS", enabled)
+    upload = upload_of(data, mime_type)
+
+    assert audio_preprocess.maybe_preprocess(upload) is upload
@@ -0,0 +1,89 @@
+import io
+import json
+
+import pytest
+
+import bulk_orders
+
+
+class CountingReader(io.StringIO):
+    def __init__(self, value):
+        super().__init__(value)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def test_malformed_array_element_stops_reading():
+    body = CountingReader('[{"items": []}, {"items": ]' + ', {"items": []}' * 100000 + "]")
+    parsed = []
+
+    with pytest.raises(ValueError):
+        for value in bulk_orders._iter_json_array(body):
+            parsed.append(value)
+
+    assert parsed == [{"items": []}]
+    assert body.reads == 1
+
+
+def test_oversized_array_element_stops_reading(monkeypatch):
+    monkeypatch.setattr(bulk_orders, "BULK_ORDER_MAX_ORDER_BYTES", 1000)
+    monkeypatch.setattr(bulk_orders, "READ_CHUNK_SIZE", 100)
+    body = CountingReader('[{"conversation_id": "' + "x" * 100000 + '"}]')
+
+    with pytest.raises(ValueError, match="larger than 1000 bytes"):
+        list(bulk_orders._iter_json_array(body))
+
+    assert body.reads < 20
+
+
+def test_values_split_across_reads_still_parse(monkeypatch):
+    monkeypatch.setattr(bulk_orders, "READ_CHUNK_SIZE", 3)
+    orders = [{"items": [{"item_id": 1, "quantity": 12345}], "conversation_id": "a \\u00e9 string", "total_price": -1.5e3}] * 5
+
+    assert list(bulk_orders._iter_json_array(io.StringIO(json.dumps(orders)))) == orders
+
+
+def test_bulk_body_over_limit_is_rejected(client, headers, monkeypatch):
+    monkeypatch.setattr(bulk_orders, "BULK_ORDER_MAX_BODY_BYTES", 100)
+
+    response = client.post("/orders/bulk", content=b"[" + b'{"items": []},' * 20 + b"{}]", headers=headers)
+
+    assert response.status_code == 413
+
+
+def test_bulk_stops_at_malformed_element(client, products, headers):
+    body = json.dumps([{"items": [{"item_id": products[0].id, "quantity": 2}]}])[:-1] + ', {"items": ], {"items": []}]'
+
+    response = client.post("/orders/bulk", content=body, headers=headers)
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.status_code == 200
+    assert lines[0]["index"] == 0 and lines[0]["total_price"] == "3.00"
+    assert lines[-1]["error"].startswith("Invalid request body")
+    assert len(lines) == 2
+
+
+def test_ndjson_line_over_limit_is_reported_without_buffering(monkeypatch):
+    monkeypatch.setattr(bulk_orders, "BULK_ORDER_MAX_ORDER_BYTES", 100)
+    body = io.BytesIO(b'{"items": []}\n' + b" " * 10000 + b'{"items": []}\n{"items": [{"item_id": 1, "quantity": 1}]}\n')
+
+    payloads = list(bulk_orders.iter_order_payloads(body))
+
+    assert payloads[0] == {"items": []}
+    assert isinstance(payloads[1], ValueError) and "longer than 100 bytes" in str(payloads[1])
+    assert payloads[2] == {"items": [{"item_id": 1, "quantity": 1}]}
+    assert len(payloads) == 3
+
+
+def test_bulk_reports_exact_totals_and_non_object_orders(client, products, headers):
+    body = json.dumps([{"items": [{"item_id": products[1].id, "quantity": 3}]}, [1, 2], 7])
+
+    response = client.post("/orders/bulk", content=body, headers=headers)
+
+    lines = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line["index"])
+    assert lines[0]["total_price"] == "7.50"
+    assert lines[1]["error"] == "Expected an order object, got list"
+    assert lines[2]["error"] == "Expected an order object, got int"
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from google.genai import errors
+
+import context_cache
+import gemini_client
+from prompt_builder import PromptPrefix
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    client = gemini_client.FakeGeminiClient(latency=0, response_text="ok")
+    monkeypatch.setattr(gemini_client, "_client", client)
+    monkeypatch.setattr(context_cache, "GEMINI_CONTEXT_CACHE", True)
+    monkeypatch.setattr(context_cache, "_context_cache", context_cache.ContextCache(min_tokens=100))
+    return client
+
+
+def make_prefix(organization_id: int = 1, catalog_version: str = "catalog-1", tokens: int = 2000) -> PromptPrefix:
+    return PromptPrefix((organization_id, catalog_version, "prompt-1", "audio"), f"menu {catalog_version}", tokens)
+
+
+def generate(prefix: PromptPrefix):
+    return context_cache.generate_content(prefix, ["audio"])
+
+
+def test_cache_is_created_once_and_reused(fake_gemini):
+    async def run():
+        prefix = make_prefix()
+        await generate(prefix)
+        await generate(prefix)
+
+    asyncio.run(run())
+
+    assert fake_gemini.aio.caches.created == 1
+    assert fake_gemini.aio.models.calls == 2
+
+
+def test_small_prefix_is_sent_inline(fake_gemini):
+    asyncio.run(generate(make_prefix(tokens=10)))
+
+    assert fake_gemini.aio.caches.created == 0
+    assert fake_gemini.aio.models.calls == 1
+
+
+def test_expired_cache_falls_back_inline_and_is_recreated(fake_gemini):
+    async def run():
+        prefix = make_prefix()
+        await generate(prefix)
+        fake_gemini.aio.caches.expire()
+        response = await generate(prefix)
+        assert response.text == "ok"
+        await generate(prefix)
+
+    asyncio.run(run())
+
+    # The call on the expired cache is repeated inline, then the next one creates a fresh cache.
+    assert fake_gemini.aio.models.calls == 4
+    assert fake_gemini.aio.caches.created == 2
+    assert len(fake_gemini.aio.caches.entries) == 1
+
+
+def test_new_catalog_version_replaces_and_deletes_the_old_cache(fake_gemini):
+    async def run():
+        await generate(make_prefix(catalog_version="catalog-1"))
+        await generate(make_prefix(catalog_version="catalog-2"))
+        await generate(make_prefix(organization_id=2))
+
+    asyncio.run(run())
+
+    assert fake_gemini.aio.caches.created == 3
+    assert fake_gemini.aio.caches.deleted == 1
+    assert len(fake_gemini.aio.caches.entries) == 2
+
+
+def test_invalidated_organization_gets_a_new_cache(fake_gemini):
+    async def run():
+        prefix = make_prefix()
+        await generate(prefix)
+        context_cache.invalidate_organization(1)
+        await generate(prefix)
+
+    asyncio.run(run())
+
+    assert fake_gemini.aio.caches.created == 2
+    assert fake_gemini.aio.caches.deleted == 1
+
+
+def client_error(code: int, message: str, status: str) -> errors.ClientError:
+    return errors.ClientError(code, {"error": {"code": code, "message": message, "status": status}})
+
+
+@pytest.mark.parametrize("error, missing", [
+    (client_error(404, "CachedContent not found", "NOT_FOUND"), True),
+    (client_error(403, "Permission denied on resource cachedContents/abc", "PERMISSION_DENIED"), True),
+    (client_error(403, "CachedContent access denied", "PERMISSION_DENIED"), True),
+    (client_error(403, "API key not valid", "PERMISSION_DENIED"), False),
+    (client_error(429, "Quota exceeded for cached content storage", "RESOURCE_EXHAUSTED"), False),
+    (client_error(400, "cached_content and system_instruction cannot both be set", "INVALID_ARGUMENT"), False),
+])
+def test_only_missing_caches_are_treated_as_gone(error, missing):
+    assert context_cache._is_missing_cache(error, "cachedContents/abc") is missing
@@ -0,0 +1,69 @@
+import json
+
+import order_analytics
+from models import ProductSalesRollup, SalesRollup
+
+
+def rollup_rows(db):
+    db.expire_all()
+    sales = {(row.organization_id, row.day, row.hour): (row.order_count, row.revenue)
+             for row in db.query(SalesRollup) if row.order_count}
+    products = {(row.organization_id, row.day, row.product_id): (row.quantity, row.revenue)
+                for row in db.query(ProductSalesRollup) if row.quantity}
+    return sales, products
+
+
+def assert_matches_rebuild(db):
+    incremental = rollup_rows(db)
+    order_analytics.rebuild(db)
+    db.commit()
+    assert rollup_rows(db) == incremental
+    return incremental
+
+
+def create_order(client, headers, items):
+    response = client.post("/orders/", headers=headers, json={"items": [
+        {"item_id": product.id, "quantity": quantity} for product, quantity in items
+    ]})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_rollups_match_a_rebuild_after_create_update_and_delete(client, db, products, headers):
+    first = create_order(client, headers, [(products[0], 2), (products[1], 1)])
+    second = create_order(client, headers, [(products[2], 3)])
+    create_order(client, headers, [(products[0], 1)])
+    sales, product_sales = assert_matches_rebuild(db)
+    assert sum(count for count, _ in sales.values()) == 3
+    assert sum(quantity for quantity, _ in product_sales.values()) == 7
+
+    response = client.put(f"/orders/{first}", headers=headers, json={"items": [{"item_id": products[2].id, "quantity": 5}]})
+    assert response.status_code == 200
+    assert_matches_rebuild(db)
+
+    assert client.delete(f"/orders/{second}", headers=headers).status_code == 200
+    sales, product_sales = assert_matches_rebuild(db)
+    assert sum(count for count, _ in sales.values()) == 2
+    assert {key[2]: quantity for key, (quantity, _) in product_sales.items()} == {products[0].id: 1, products[2].id: 5}
+
+
+def test_bulk_orders_are_rolled_up(client, db, products, headers):
+    body = json.dumps([{"items": [{"item_id": products[i % 3].id, "quantity": i + 1}]} for i in range(7)])
+
+    response = client.post("/orders/bulk", params={"batch_size": 3}, headers=headers, content=body)
+
+    assert response.status_code == 200
+    sales, _ = assert_matches_rebuild(db)
+    assert sum(count for count, _ in sales.values()) == 7
+
+
+def test_sales_report_reads_the_rollups(client, db, products, headers):
+    create_order(client, headers, [(products[0], 2)])
+    create_order(client, headers, [(products[1], 1)])
+
+    sales = client.get("/analytics/sales", headers=headers).json()
+    top = client.get("/analytics/top-products", headers=headers).json()
+
+    assert [day["order_count"] for day in sales] == [2]
+    assert sales[0]["revenue"] == float(products[0].price * 2 + products[1].price)
+    assert [product["product_id"] for product in top] == [products[0].id, products[1].id]
@@ -0,0 +1,24 @@
+import order_export
+from conftest import seed_orders
+
+
+def test_columnar_export_is_one_json_document(client, db, organization, products, headers, monkeypatch):
+    monkeypatch.setattr(order_export, "ORDER_EXPORT_BATCH_ROWS", 4)
+    seed_orders(db, organization, products, 3)
+
+    response = client.get("/orders/export", params={"format": "columnar"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["content-disposition"] == 'attachment; filename="orders.json"'
+    batches = response.json()["batches"]
+    assert len(batches) > 1
+    assert sum(batch["rows"] for batch in batches) == 9
+    assert all(set(batch["columns"]) == set(order_export.COLUMNS) for batch in batches)
+
+
+def test_columnar_export_without_orders_is_valid_json(client, db, headers):
+    response = client.get("/orders/export", params={"format": "columnar"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"batches": []}
@@ -0,0 +1,33 @@
+from conftest import seed_orders
+from database import engine
+from query_counter import QueryCounter, assert_max_queries
+
+
+def count_listing_queries(client, headers) -> int:
+    with QueryCounter(engine) as counter:
+        response = client.get("/orders/", params={"limit": 100}, headers=headers)
+    assert response.status_code == 200
+    return counter.count
+
+
+def test_order_listing_runs_at_most_three_queries(client, db, organization, products, headers):
+    seed_orders(db, organization, products, 20)
+
+    with assert_max_queries(engine, 3):
+        response = client.get("/orders/", params={"limit": 100}, headers=headers)
+
+    assert response.status_code == 200
+    assert len(response.json()) == 20
+    assert all(len(order["items"]) == 3 for order in response.json())
+
+
+def test_order_listing_query_count_does_not_grow_with_orders(client, db, organization, products, headers):
+    # The first request also loads the user into the user cache.
+    count_listing_queries(client, headers)
+    seed_orders(db, organization, products, 5)
+    few = count_listing_queries(client, headers)
+
+    seed_orders(db, organization, products, 45)
+    many = count_listing_queries(client, headers)
+
+    assert few == many
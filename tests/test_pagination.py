@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import migrations
+import models
+import order_analytics
+import pagination
+
+
+def seed_orders(db, organization, count: int):
+    started = datetime(2026, 1, 1)
+    orders = [models.Order(organization_id=organization.id, total_price=0, created_at=started + timedelta(minutes=i))
+              for i in range(count)]
+    db.add_all(orders)
+    db.commit()
+    return [order.id for order in orders]
+
+
+def test_offset_mode_keeps_insertion_order(client, db, organization, headers):
+    ids = seed_orders(db, organization, 5)
+
+    response = client.get("/orders/", params={"skip": 1, "limit": 3}, headers=headers)
+
+    assert [order["id"] for order in response.json()] == ids[1:4]
+
+
+def test_cursor_pages_cover_every_order_once(client, db, organization, headers):
+    ids = seed_orders(db, organization, 7)
+
+    seen, cursor = [], None
+    while True:
+        response = client.get("/orders/", params={"limit": 3, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        seen += [order["id"] for order in response.json()]
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+
+    assert seen == ids
+
+
+def test_migration_backfills_null_created_at():
+    legacy = create_engine("sqlite://")
+    with legacy.begin() as connection:
+        for table in migrations.KEYSET_TABLES:
+            connection.exec_driver_sql(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, created_at TIMESTAMP)")
+            connection.exec_driver_sql(f"INSERT INTO {table} (id, created_at) VALUES (1, NULL), (2, '2026-01-01 00:00:00')")
+
+        migrations.require_created_at(connection)
+
+        for table in migrations.KEYSET_TABLES:
+            rows = connection.exec_driver_sql(f"SELECT created_at FROM {table} ORDER BY id").scalars().all()
+            assert rows[0].startswith("1970-01-01 00:00:00") and rows[1] == "2026-01-01 00:00:00"
+
+
+def test_migrations_count_legacy_orders_without_created_at_in_rollups():
+    legacy = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=legacy)
+    with legacy.begin() as connection:
+        # The baseline orders table allowed NULL created_at.
+        connection.exec_driver_sql("DROP TABLE orders")
+        connection.exec_driver_sql(
+            "CREATE TABLE orders (id INTEGER PRIMARY KEY, created_at DATETIME, total_price FLOAT, "
+            "organization_id INTEGER REFERENCES organizations (id))"
+        )
+        connection.exec_driver_sql("INSERT INTO organizations (id, name, created_at) VALUES (1, 'legacy', '2026-01-01 00:00:00')")
+        connection.exec_driver_sql("INSERT INTO products (id, name, price, organization_id, created_at) VALUES (1, 'tea', 2.5, 1, '2026-01-01 00:00:00')")
+        connection.exec_driver_sql("INSERT INTO orders (id, created_at, total_price, organization_id) VALUES (1, NULL, 5, 1)")
+        connection.exec_driver_sql("INSERT INTO order_items (id, order_id, item_id, quantity, price) VALUES (1, 1, 1, 2, 2.5)")
+
+    migrations.run_migrations(legacy)
+
+    session = Session(bind=legacy)
+    try:
+        db_order = session.get(models.Order, 1)
+        assert db_order.created_at == datetime(1970, 1, 1)
+        order_analytics.remove_orders(session, [order_analytics.load_snapshot(session, db_order)])
+        session.flush()
+
+        assert [(row.order_count, row.revenue) for row in session.query(models.SalesRollup)] == [(0, 0)]
+        assert [(row.quantity, row.revenue) for row in session.query(models.ProductSalesRollup)] == [(0, 0)]
+    finally:
+        session.close()
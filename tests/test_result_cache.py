@@ -0,0 +1,93 @@
+import time
+
+from sqlalchemy import update
+
+import database
+import gemini_client
+import result_cache
+from conftest import wav_bytes
+from models import CachedResult
+from prompt_builder import PromptPrefix
+
+
+def summarize(client, headers, audio: bytes, **extra_headers):
+    return client.post("/summarize_order_from_audio/", headers={**headers, **extra_headers},
+                       files={"audio": ("order.wav", audio, "audio/wav")})
+
+
+def test_repeated_upload_is_served_from_the_cache(client, headers, products):
+    models = gemini_client.get_client().aio.models
+    audio = wav_bytes(0.5)
+
+    first = summarize(client, headers, audio)
+    calls = models.calls
+    second = summarize(client, headers, audio)
+
+    assert first.headers[result_cache.RESULT_CACHE_HEADER] == "miss"
+    assert second.headers[result_cache.RESULT_CACHE_HEADER] == "hit"
+    assert second.json()["success"] == first.json()["success"]
+    assert models.calls == calls
+
+
+def test_different_audio_misses(client, headers, products):
+    summarize(client, headers, wav_bytes(0.5))
+
+    response = summarize(client, headers, wav_bytes(0.6))
+
+    assert response.headers[result_cache.RESULT_CACHE_HEADER] == "miss"
+
+
+def test_idempotency_key_hits_for_a_retried_upload(client, headers, products):
+    key = {result_cache.IDEMPOTENCY_KEY_HEADER: "retry-1"}
+    summarize(client, headers, wav_bytes(0.5), **key)
+
+    response = summarize(client, headers, wav_bytes(0.7), **key)
+
+    assert response.headers[result_cache.RESULT_CACHE_HEADER] == "hit"
+
+
+def test_content_key_changes_with_everything_that_shapes_the_prompt():
+    prefix = PromptPrefix((1, "catalog-1", "prompt-1", "audio"), "", 0)
+    key = result_cache.content_key("audio", "hash", prefix)
+
+    assert result_cache.content_key("audio", "hash", PromptPrefix((1, "catalog-1", "prompt-1", "audio"), "", 0)) == key
+    assert len({
+        key,
+        result_cache.content_key("conversation", "hash", prefix),
+        result_cache.content_key("audio", "other-hash", prefix),
+        result_cache.content_key("audio", "hash", PromptPrefix((2, "catalog-1", "prompt-1", "audio"), "", 0)),
+        result_cache.content_key("audio", "hash", PromptPrefix((1, "catalog-2", "prompt-1", "audio"), "", 0)),
+        result_cache.content_key("audio", "hash", PromptPrefix((1, "catalog-1", "prompt-2", "audio"), "", 0)),
+        result_cache.content_key("audio", "hash", prefix, "conversation-1"),
+    }) == 7
+
+
+def test_idempotency_keys_are_scoped_to_the_user():
+    assert result_cache.idempotency_key("audio", 1, 7, "key") != result_cache.idempotency_key("audio", 1, 8, "key")
+
+
+def test_memory_cache_evicts_least_recently_used_and_expired(monkeypatch):
+    cache = result_cache.MemoryResultCache(max_size=2, ttl_seconds=60)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1] and cache.get("c") == [3]
+
+    now = time.monotonic()
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now + 61)
+    assert cache.get("a") is None
+
+
+def test_database_cache_is_shared_between_workers_until_it_expires(db):
+    result_cache.DatabaseResultCache(bind=database.engine).put("key", [{"id": 1, "quantity": 2}])
+    other_worker = result_cache.DatabaseResultCache(bind=database.engine)
+
+    assert other_worker.get("key") == [{"id": 1, "quantity": 2}]
+    assert other_worker.get("missing") is None
+
+    db.execute(update(CachedResult).values(created_at=CachedResult.created_at - result_cache.timedelta(days=30)))
+    db.commit()
+    assert result_cache.DatabaseResultCache(bind=database.engine).get("key") is None
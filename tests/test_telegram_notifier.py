@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import tempfile
+
+import httpx
+import pytest
+
+import fake_telegram
+import telegram_notifier
+from conftest import wav_bytes
+from telegram_notifier import TelegramNotifier
+
+
+@pytest.fixture(autouse=True)
+def fake_api(monkeypatch):
+    fake_telegram.reset()
+    monkeypatch.setattr(telegram_notifier, "TELEGRAM_CHAT_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(telegram_notifier, "TELEGRAM_BACKOFF_SECONDS", 0.01)
+    yield fake_telegram.received
+    fake_telegram.reset()
+
+
+def make_notifier(bot_token: str = "token") -> TelegramNotifier:
+    return TelegramNotifier(bot_token=bot_token, chat_id="42", base_url="http://telegram.test",
+                            transport=httpx.ASGITransport(app=fake_telegram.app))
+
+
+async def deliver(notifier: TelegramNotifier, notifications: list):
+    """Queue everything before the worker runs, then wait for the queue to drain."""
+    for contents, filename, orders in notifications:
+        assert notifier.notify_order(contents, filename, orders)
+    await notifier.start()
+    await notifier.stop()
+
+
+def test_fake_api_is_reachable_with_an_async_client():
+    async def call():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_telegram.app), base_url="http://telegram.test") as client:
+            return await client.post("/bottoken/sendMessage", json={"chat_id": "42", "text": "hi"})
+
+    assert asyncio.run(call()).json()["ok"] is True
+
+
+def test_throttled_message_is_retried_after_retry_after(fake_api, monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def record_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(telegram_notifier.asyncio, "sleep", record_sleep)
+    fake_telegram.throttle_next = 1
+
+    asyncio.run(deliver(make_notifier(), [(None, "order.wav", [{"item_id": 1, "quantity": 2}])]))
+
+    assert [entry.get("throttled", False) for entry in fake_api] == [True, False]
+    assert fake_api[1]["method"] == "sendMessage"
+    assert fake_telegram.FAKE_TELEGRAM_RETRY_AFTER in delays
+
+
+def test_queued_messages_for_a_chat_are_batched_and_spaced(fake_api, monkeypatch):
+    interval = 0.2
+    monkeypatch.setattr(telegram_notifier, "TELEGRAM_CHAT_INTERVAL_SECONDS", interval)
+    notifications = [(f"audio-{i}".encode(), f"order-{i}.wav", [{"item_id": i, "quantity": 1}]) for i in range(3)]
+
+    asyncio.run(deliver(make_notifier(), notifications))
+
+    methods = [entry["method"] for entry in fake_api]
+    assert methods == ["sendAudio", "sendAudio", "sendAudio", "sendMessage"]
+    # One message carries all three orders.
+    assert fake_api[-1]["payload"]["text"].count("New Order Extracted") == 3
+    # Every send to the chat waits out the interval since the previous one (less a little transport jitter).
+    gaps = [later["at"] - earlier["at"] for earlier, later in zip(fake_api, fake_api[1:])]
+    assert all(gap >= interval - 0.02 for gap in gaps), gaps
+
+
+def test_one_failed_audio_does_not_drop_the_rest_of_the_batch(fake_api, caplog):
+    broken = tempfile.TemporaryFile()
+    broken.close()
+    notifications = [
+        (b"audio-0", "order-0.wav", [{"item_id": 0, "quantity": 1}]),
+        (broken, "broken.wav", [{"item_id": 1, "quantity": 1}]),
+        (b"audio-2", "order-2.wav", [{"item_id": 2, "quantity": 1}]),
+    ]
+
+    with caplog.at_level(logging.ERROR, logger="telegram_notifier"):
+        asyncio.run(deliver(make_notifier(), notifications))
+
+    assert [entry["payload"].get("audio") for entry in fake_api if entry["method"] == "sendAudio"] == ["order-0.wav", "order-2.wav"]
+    assert fake_api[-1]["method"] == "sendMessage"
+    assert fake_api[-1]["payload"]["text"].count("New Order Extracted") == 3
+    assert "broken.wav" in caplog.text
+
+
+def test_sent_files_are_closed(fake_api):
+    audio = tempfile.TemporaryFile()
+    audio.write(b"audio")
+
+    asyncio.run(deliver(make_notifier(), [(audio, "order.wav", [])]))
+
+    assert fake_api[0]["payload"]["audio"] == "order.wav"
+    assert audio.closed
+
+
+def test_send_failure_is_logged_and_file_closed(fake_api, caplog):
+    audio = tempfile.TemporaryFile()
+
+    with caplog.at_level(logging.ERROR, logger="telegram_notifier"):
+        asyncio.run(deliver(make_notifier(fake_telegram.INVALID_TOKEN), [(audio, "order.wav", [])]))
+
+    assert fake_api[0]["rejected"]
+    assert "Telegram send error" in caplog.text
+    assert audio.closed
+
+
+def test_send_failure_does_not_fail_the_request(db, user, headers, products, monkeypatch, caplog):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setattr(telegram_notifier, "_notifier", make_notifier(fake_telegram.INVALID_TOKEN))
+    with caplog.at_level(logging.ERROR, logger="telegram_notifier"):
+        with TestClient(main.app) as client:
+            response = client.post("/summarize_order_from_audio/", headers=headers,
+                                   files={"audio": ("order.wav", wav_bytes(), "audio/wav")})
+            assert response.status_code == 200
+
+    assert fake_telegram.received and fake_telegram.received[0]["rejected"]
+    assert "Telegram send error" in caplog.text
@@ -0,0 +1,32 @@
+import transcription_store
+
+
+def test_conversation_id_cannot_name_a_colleagues_default_session():
+    colleague = transcription_store.session_key(1, 7)
+
+    assert transcription_store.session_key(1, 8, "user-7") != colleague
+    assert transcription_store.session_key(1, 8, "u:7") != colleague
+    assert transcription_store.session_key(1, 8, "7") != colleague
+
+
+def test_sessions_are_scoped_by_organization_and_user():
+    keys = {
+        transcription_store.session_key(1, 7),
+        transcription_store.session_key(1, 8),
+        transcription_store.session_key(2, 7),
+        transcription_store.session_key(1, 7, "table-4"),
+        transcription_store.session_key(2, 7, "table-4"),
+    }
+
+    assert len(keys) == 5
+    assert transcription_store.session_key(1, 7, "table-4") == transcription_store.session_key(1, 8, "table-4")
+
+
+def test_colleague_transcript_is_not_readable_through_a_conversation_id():
+    store = transcription_store.MemoryTranscriptionStore()
+    store.append(transcription_store.session_key(1, 7), "two lattes")
+
+    combined = store.append(transcription_store.session_key(1, 8, "user-7"), "one tea")
+
+    assert combined == "one tea"
+    assert store.get(transcription_store.session_key(1, 7)) == "two lattes"
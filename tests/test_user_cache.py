@@ -0,0 +1,32 @@
+import auth_crud
+from conftest import auth_headers, make_user
+
+
+def test_admin_change_is_visible_on_next_request(client, db, organization):
+    user = make_user(db, organization.id)
+    headers = auth_headers(user)
+    assert client.get("/users/me/", headers=headers).json()["is_admin"] is False
+
+    auth_crud.update_user(db, user.id, is_admin=True)
+
+    assert client.get("/users/me/", headers=headers).json()["is_admin"] is True
+
+
+def test_organization_change_is_visible_on_next_request(client, db, organization):
+    user = make_user(db)
+    headers = auth_headers(user)
+    assert client.get("/users/me/", headers=headers).json()["organization_id"] is None
+
+    auth_crud.update_user_organization(db, user.id, organization.id)
+
+    assert client.get("/users/me/", headers=headers).json()["organization_id"] == organization.id
+
+
+def test_any_user_update_drops_the_cached_summary(client, db, organization):
+    user = make_user(db, organization.id)
+    headers = auth_headers(user)
+    client.get("/users/me/", headers=headers)
+
+    auth_crud.update_user(db, user.id, email="changed@example.com")
+
+    assert client.get("/users/me/", headers=headers).json()["email"] == "changed@example.com"
@@ -0,0 +1,94 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+import audio_jobs
+from conftest import wav_bytes
+
+PUBLIC_ADDRESS = "93.184.216.34"
+
+
+def resolves_to(monkeypatch, address: str):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+    monkeypatch.setattr(audio_jobs.socket, "getaddrinfo", getaddrinfo)
+
+
+def submit(client, headers, webhook_url: str):
+    return client.post("/summarize_order_from_audio/", params={"async": "true"}, headers=headers,
+                       data={"webhook_url": webhook_url}, files={"audio": ("order.wav", wav_bytes(), "audio/wav")})
+
+
+@pytest.mark.parametrize("webhook_url", [
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.10/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+    "ftp://example.com/hook",
+])
+def test_internal_webhook_urls_are_rejected(client, headers, products, webhook_url):
+    response = submit(client, headers, webhook_url)
+
+    assert response.status_code == 400
+    assert "webhook_url" in response.json()["error"]["description"]
+
+
+def test_hostname_resolving_to_a_private_address_is_rejected(client, headers, products, monkeypatch):
+    resolves_to(monkeypatch, "10.1.2.3")
+
+    assert submit(client, headers, "https://hooks.example.com/order").status_code == 400
+
+
+def test_public_webhook_url_is_accepted(client, headers, products, monkeypatch):
+    resolves_to(monkeypatch, PUBLIC_ADDRESS)
+
+    assert submit(client, headers, "https://hooks.example.com/order").status_code == 202
+
+
+def send(url: str):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await audio_jobs.send_webhook(client, url, {"job_id": "job", "status": "done"})
+
+    return asyncio.run(run()), requests
+
+
+def test_webhook_is_sent_to_the_vetted_address(monkeypatch):
+    resolves_to(monkeypatch, PUBLIC_ADDRESS)
+
+    delivered, requests = send("https://hooks.example.com/order")
+
+    assert delivered
+    assert requests[0].url.host == PUBLIC_ADDRESS
+    assert requests[0].headers["Host"] == "hooks.example.com"
+
+
+def test_webhook_is_not_sent_when_dns_rebinds_to_a_private_address(monkeypatch):
+    # Passed validation when the job was queued; by delivery the name points inside the network.
+    resolves_to(monkeypatch, "127.0.0.1")
+
+    delivered, requests = send("https://hooks.example.com/order")
+
+    assert not delivered
+    assert requests == []
+
+
+def test_allowlist_admits_listed_internal_hosts_only(monkeypatch):
+    monkeypatch.setattr(audio_jobs, "AUDIO_JOB_WEBHOOK_ALLOWED_HOSTS", {"hooks.internal"})
+    resolves_to(monkeypatch, "10.0.0.7")
+
+    assert audio_jobs.resolve_webhook_url("http://hooks.internal/order")[0].host == "10.0.0.7"
+    with pytest.raises(audio_jobs.UnsafeWebhookUrl):
+        audio_jobs.resolve_webhook_url("http://hooks.example.com/order")
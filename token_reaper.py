@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+import auth_crud
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REAPER_INTERVAL_SECONDS = int(os.getenv("TOKEN_REAPER_INTERVAL_SECONDS", 3600))
+TOKEN_REAPER_BATCH_SIZE = int(os.getenv("TOKEN_REAPER_BATCH_SIZE", 1000))
+
+_task = None
+
+
+def reap_tokens() -> int:
+    db = SessionLocal()
+    try:
+        return auth_crud.clean_expired_tokens(db, batch_size=TOKEN_REAPER_BATCH_SIZE)
+    finally:
+        db.close()
+
+
+async def _run():
+    while True:
+        try:
+            deleted = await run_in_threadpool(reap_tokens)
+            if deleted:
+                logger.info(f"Deleted {deleted} expired or revoked refresh tokens")
+        except Exception as e:
+            logger.error(f"Error cleaning refresh tokens: {str(e)}")
+        await asyncio.sleep(TOKEN_REAPER_INTERVAL_SECONDS)
+
+
+def start():
+    global _task
+    if _task is None and TOKEN_REAPER_INTERVAL_SECONDS > 0:
+        _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
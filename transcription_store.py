@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, create_engine, delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import engine
+from models import PendingTranscription
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_STORE = os.getenv("TRANSCRIPTION_STORE", "memory")
+TRANSCRIPTION_STORE_URL = os.getenv("TRANSCRIPTION_STORE_URL", None)
+TRANSCRIPTION_TTL_SECONDS = int(os.getenv("TRANSCRIPTION_TTL_SECONDS", 1800))
+TRANSCRIPTION_MAX_SESSIONS = int(os.getenv("TRANSCRIPTION_MAX_SESSIONS", 10000))
+TRANSCRIPTION_MAX_CHARS = int(os.getenv("TRANSCRIPTION_MAX_CHARS", 20000))
+TRANSCRIPTION_SWEEP_INTERVAL_SECONDS = int(os.getenv("TRANSCRIPTION_SWEEP_INTERVAL_SECONDS", 60))
+
+
+def session_key(organization_id: int, user_id: int, conversation_id: Optional[str] = None) -> str:
+    """Conversations default to one per cashier so colleagues never share a transcript.
+
+    Client-chosen conversation IDs live in their own namespace, so none of them can name a cashier's default session.
+    """
+    if conversation_id:
+        return f"{organization_id}:c:{conversation_id}"
+    return f"{organization_id}:u:{user_id}"
+
+
+class MemoryTranscriptionStore:
+    """Process-local store; fine for a single worker."""
+
+    def __init__(self, ttl_seconds: int = TRANSCRIPTION_TTL_SECONDS, max_sessions: int = TRANSCRIPTION_MAX_SESSIONS,
+                 max_chars: int = TRANSCRIPTION_MAX_CHARS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        while self._sessions:
+            key, (_, _, last_updated) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_updated < self.ttl_seconds:
+                break
+            del self._sessions[key]
+
+    def append(self, key: str, text: str) -> str:
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            current = self._sessions.pop(key, None)
+            combined = current[0] + " " + text if current else text
+            combined = combined[-self.max_chars:].lstrip()
+            self._sessions[key] = (combined, current[1] if current else None, now)
+            self._evict(now)
+            return combined
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            self._evict(time.monotonic())
+            session = self._sessions.get(key)
+            return session[0] if session else None
+
+    def get_orders(self, key: str) -> Optional[list]:
+        with self._lock:
+            self._evict(time.monotonic())
+            session = self._sessions.get(key)
+            return session[1] if session else None
+
+    def set_orders(self, key: str, orders: list):
+        with self._lock:
+            session = self._sessions.get(key)
+            if session:
+                self._sessions[key] = (session[0], orders, session[2])
+
+    def clear(self, key: str):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+
+class DatabaseTranscriptionStore:
+    """Stores sessions in the pending_transcriptions table so every worker sees the same text.
+
+    Appends are a single upsert, which both PostgreSQL and SQLite apply atomically.
+    """
+
+    def __init__(self, bind=engine, ttl_seconds: int = TRANSCRIPTION_TTL_SECONDS,
+                 max_sessions: int = TRANSCRIPTION_MAX_SESSIONS, max_chars: int = TRANSCRIPTION_MAX_CHARS):
+        self.bind = bind
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self._last_sweep = 0.0
+
+        if bind.dialect.name == "postgresql":
+            self._insert = postgresql.insert
+        elif bind.dialect.name == "sqlite":
+            self._insert = sqlite.insert
+        else:
+            raise RuntimeError(f"Transcription store does not support {bind.dialect.name}")
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+
+    def append(self, key: str, text: str) -> str:
+        table = PendingTranscription.__table__
+        statement = self._insert(table).values(session_key=key, text=text, last_updated=datetime.utcnow())
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.session_key],
+            set_={
+                "text": case(
+                    (table.c.last_updated < self._cutoff(), statement.excluded.text),
+                    else_=table.c.text + " " + statement.excluded.text
+                ),
+                "orders": case((table.c.last_updated < self._cutoff(), None), else_=table.c.orders),
+                "last_updated": statement.excluded.last_updated,
+            }
+        ).returning(table.c.text)
+
+        with self.bind.begin() as connection:
+            combined = connection.execute(statement).scalar_one()
+            if len(combined) > self.max_chars:
+                combined = combined[-self.max_chars:].lstrip()
+                connection.execute(update(table).where(table.c.session_key == key).values(text=combined))
+
+        self._maybe_sweep()
+        return combined
+
+    def get(self, key: str) -> Optional[str]:
+        table = PendingTranscription.__table__
+        with self.bind.connect() as connection:
+            return connection.execute(
+                select(table.c.text).where(table.c.session_key == key, table.c.last_updated >= self._cutoff())
+            ).scalar()
+
+    def get_orders(self, key: str) -> Optional[list]:
+        table = PendingTranscription.__table__
+        with self.bind.connect() as connection:
+            orders = connection.execute(
+                select(table.c.orders).where(table.c.session_key == key, table.c.last_updated >= self._cutoff())
+            ).scalar()
+        return json.loads(orders) if orders else None
+
+    def set_orders(self, key: str, orders: list):
+        table = PendingTranscription.__table__
+        with self.bind.begin() as connection:
+            connection.execute(update(table).where(table.c.session_key == key).values(orders=json.dumps(orders)))
+
+    def clear(self, key: str):
+        table = PendingTranscription.__table__
+        with self.bind.begin() as connection:
+            connection.execute(delete(table).where(table.c.session_key == key))
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < TRANSCRIPTION_SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        self.sweep()
+
+    def sweep(self):
+        """Delete expired sessions and the oldest ones beyond ``max_sessions``."""
+        table = PendingTranscription.__table__
+        overflow = select(table.c.session_key).order_by(table.c.last_updated.desc()).offset(self.max_sessions)
+        with self.bind.begin() as connection:
+            expired = connection.execute(delete(table).where(table.c.last_updated < self._cutoff())).rowcount
+            evicted = connection.execute(delete(table).where(table.c.session_key.in_(overflow))).rowcount
+        if expired or evicted:
+            logger.info(f"Swept {expired} expired and {evicted} excess pending transcriptions")
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if TRANSCRIPTION_STORE == "database":
+            bind = engine
+            if TRANSCRIPTION_STORE_URL:
+                bind = create_engine(TRANSCRIPTION_STORE_URL)
+                PendingTranscription.__table__.create(bind, checkfirst=True)
+            _store = DatabaseTranscriptionStore(bind)
+        elif TRANSCRIPTION_STORE == "memory":
+            _store = MemoryTranscriptionStore()
+        else:
+            raise RuntimeError(f"Unknown TRANSCRIPTION_STORE '{TRANSCRIPTION_STORE}', expected 'memory' or 'database'")
+    return _store
@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from auth_schemas import UserSummary
+
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+
+# Per-process cache of authenticated users keyed by username. Changes made by
+# other processes (e.g. manage_organizations.py) show up once the TTL expires.
+_users = OrderedDict()
+_usernames_by_id = {}
+_lock = threading.Lock()
+
+
+def get(username: str) -> Optional[UserSummary]:
+    with _lock:
+        entry = _users.get(username)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at < time.monotonic():
+            _remove(username)
+            return None
+        _users.move_to_end(username)
+        return user
+
+
+def put(user: UserSummary):
+    with _lock:
+        _remove(user.username)
+        _users[user.username] = (user, time.monotonic() + USER_CACHE_TTL_SECONDS)
+        _usernames_by_id[user.id] = user.username
+        while len(_users) > USER_CACHE_MAX_SIZE:
+            _remove(next(iter(_users)))
+
+
+def invalidate(user_id: int):
+    with _lock:
+        username = _usernames_by_id.get(user_id)
+        if username is not None:
+            _remove(username)
+
+
+def clear():
+    with _lock:
+        _users.clear()
+        _usernames_by_id.clear()
+
+
+def _remove(username: str):
+    entry = _users.pop(username, None)
+    if entry is not None:
+        _usernames_by_id.pop(entry[0].id, None)